@@ -1,18 +1,210 @@
-
 import lazy_loader
 
 
 __getattr__, __dir__, __all__ = lazy_loader.attach(
     __name__,
     submodules={
+        'arenas',
+        'background',
+        'checkpoint',
+        'localization',
+        'locations',
+        'manifest',
+        'occupancy',
+        'pipeline',
+        'plotting',
+        'profiling',
         'rdp_client',
+        'scheduler',
+        'shared',
+        'synthetic',
+        'trajectories',
+        'video',
     },
     submod_attrs={
+        'arenas': [
+            'NO_ARENA',
+            'OVERLAP',
+            'assign_arenas',
+            'find_mask_file',
+            'linear_arena_polygons',
+            'load_arena_masks',
+            'load_arena_polygons',
+            'load_json_masks',
+            'masks_to_labels',
+            'rasterize_arenas',
+            'save_arena_masks',
+            'select_largest',
+            'y_arena_polygons',
+        ],
+        'background': [
+            'N_BINS',
+            'count_dtype',
+            'count_values',
+            'frames_fit',
+            'histogram_rank',
+            'streaming_median',
+        ],
+        'checkpoint': [
+            'checkpoint_dir',
+            'load_shard',
+            'remove_stale_checkpoints',
+            'save_shard',
+            'shard_file',
+        ],
+        'localization': [
+            'ANT_SIZE',
+            'BLURRED_LOCALIZERS',
+            'BLUR_SIZE',
+            'LOCALIZATION_MODES',
+            'LOCALIZERS',
+            'allocate_buffers',
+            'arena_moments',
+            'arena_rois',
+            'blob_localizer',
+            'blur_mask',
+            'components_localizer',
+            'find_candidates',
+            'foreground_mask',
+            'get_ant_locations',
+            'get_ant_moments',
+            'gray_moments',
+            'make_frame_locator',
+            'make_localizer',
+            'moments_to_positions',
+            'prepare_background',
+            'threshold_mask',
+            'to_gray',
+        ],
+        'locations': [
+            'LOCATION_FORMATS',
+            'check_location_format',
+            'find_locations_file',
+            'load_locations',
+            'locations_table',
+            'save_locations',
+        ],
+        'manifest': [
+            'FULL_HASH_LIMIT',
+            'SAMPLE_SIZE',
+            'file_digest',
+            'invalidate_stage',
+            'is_up_to_date',
+            'load_manifest',
+            'record_stage',
+            'stage_key',
+        ],
+        'occupancy': [
+            'filled_histograms',
+            'load_occupancy',
+            'occupancy_bins',
+            'occupancy_histogram',
+            'save_occupancy',
+            'speed_histogram',
+        ],
+        'pipeline': [
+            'format_pipeline_stats',
+            'merge_pipeline_stats',
+            'run_pipeline',
+        ],
+        'plotting': [
+            'arena_color',
+            'make_cmap',
+            'plot_occupancy',
+            'plot_trajectories',
+            'rasterize_trajectories',
+        ],
+        'profiling': [
+            'PROFILE_STAGES',
+            'cprofile_worker',
+            'format_profile',
+            'make_cprofiler',
+            'make_stopwatch',
+            'merge_cprofile_dumps',
+            'merge_profiles',
+            'peak_rss',
+            'save_profile',
+        ],
         'rdp_client': [
             'unlock_and_unzip_file',
             'zip_and_lock_folder',
         ],
+        'scheduler': [
+            'make_task',
+            'run_task_graph',
+        ],
+        'shared': [
+            'create_shared_array',
+            'make_shared_dir',
+            'open_shared_array',
+            'remove_shared_dir',
+        ],
+        'synthetic': [
+            'arena_graph',
+            'illumination_gains',
+            'localization_error',
+            'render_frame',
+            'simulate_trajectory',
+        ],
+        'trajectories': [
+            'fill_gaps',
+            'project_to_axis',
+        ],
+        'video': [
+            'PREFETCH_BYTES',
+            'advise_read_ahead',
+            'concatenate_videos',
+            'file_keyframe_indices',
+            'find_segments',
+            'grab_numbers',
+            'grab_range',
+            'keyframe_indices',
+            'open_video',
+            'plan_chunks',
+            'prefetch_videos',
+            'read_frame_numbers',
+            'read_frames',
+            'sample_frame_numbers',
+            'video_info',
+        ],
     },
 )
 
-__all__ = ['rdp_client', 'unlock_and_unzip_file', 'zip_and_lock_folder']
+__all__ = ['ANT_SIZE', 'BLURRED_LOCALIZERS', 'BLUR_SIZE', 'FULL_HASH_LIMIT',
+           'LOCALIZATION_MODES', 'LOCALIZERS', 'LOCATION_FORMATS', 'NO_ARENA',
+           'N_BINS', 'OVERLAP', 'PREFETCH_BYTES', 'PROFILE_STAGES',
+           'SAMPLE_SIZE', 'advise_read_ahead', 'allocate_buffers',
+           'arena_color', 'arena_graph', 'arena_moments', 'arena_rois',
+           'arenas', 'assign_arenas', 'background', 'blob_localizer',
+           'blur_mask', 'check_location_format', 'checkpoint',
+           'checkpoint_dir', 'components_localizer', 'concatenate_videos',
+           'count_dtype', 'count_values', 'cprofile_worker',
+           'create_shared_array', 'file_digest', 'file_keyframe_indices',
+           'fill_gaps', 'filled_histograms', 'find_candidates',
+           'find_locations_file', 'find_mask_file', 'find_segments',
+           'foreground_mask', 'format_pipeline_stats', 'format_profile',
+           'frames_fit', 'get_ant_locations', 'get_ant_moments',
+           'grab_numbers', 'grab_range', 'gray_moments', 'histogram_rank',
+           'illumination_gains', 'invalidate_stage', 'is_up_to_date',
+           'keyframe_indices', 'linear_arena_polygons', 'load_arena_masks',
+           'load_arena_polygons', 'load_json_masks', 'load_locations',
+           'load_manifest', 'load_occupancy', 'load_shard', 'localization',
+           'localization_error', 'locations', 'locations_table', 'make_cmap',
+           'make_cprofiler', 'make_frame_locator', 'make_localizer',
+           'make_shared_dir', 'make_stopwatch', 'make_task', 'manifest',
+           'masks_to_labels', 'merge_cprofile_dumps', 'merge_pipeline_stats',
+           'merge_profiles', 'moments_to_positions', 'occupancy',
+           'occupancy_bins', 'occupancy_histogram', 'open_shared_array',
+           'open_video', 'peak_rss', 'pipeline', 'plan_chunks',
+           'plot_occupancy', 'plot_trajectories', 'plotting',
+           'prefetch_videos', 'prepare_background', 'profiling',
+           'project_to_axis', 'rasterize_arenas', 'rasterize_trajectories',
+           'rdp_client', 'read_frame_numbers', 'read_frames', 'record_stage',
+           'remove_shared_dir', 'remove_stale_checkpoints', 'render_frame',
+           'run_pipeline', 'run_task_graph', 'sample_frame_numbers',
+           'save_arena_masks', 'save_locations', 'save_occupancy',
+           'save_profile', 'save_shard', 'scheduler', 'select_largest',
+           'shard_file', 'shared', 'simulate_trajectory', 'speed_histogram',
+           'stage_key', 'streaming_median', 'synthetic', 'threshold_mask',
+           'to_gray', 'trajectories', 'unlock_and_unzip_file', 'video',
+           'video_info', 'y_arena_polygons', 'zip_and_lock_folder']
@@ -0,0 +1,158 @@
+import numpy as np
+import json
+import os
+import cv2
+
+# label values used in the arena label image (arena i is stored as i+1)
+NO_ARENA = 0
+OVERLAP = -1
+
+# build a compact label image from a sequence of binary arena masks (one HxW mask per arena)
+def masks_to_labels(masks):
+    labels = None
+    for i, mask in enumerate(masks):
+        inside = np.asarray(mask) > 0
+        if labels is None:
+            labels = np.zeros(inside.shape, dtype=np.int16)
+        # pixels already claimed by another arena are shared
+        shared = inside & (labels != NO_ARENA)
+        labels[inside & (labels == NO_ARENA)] = i + 1
+        labels[shared] = OVERLAP
+    return labels
+
+# get the polygons of a y-maze arena: one pentagon per arm (rectangle from the endpoint to the centroid + the centroid)
+def y_arena_polygons(endpoints, width):
+    centroid = np.mean(endpoints, axis=0)
+    polygons = []
+    for endpoint in endpoints:
+        # get the angle of the line joining the endpoint and the centroid
+        angle = np.arctan2(centroid[1]-endpoint[1], centroid[0]-endpoint[0])
+        # get the x and y offsets perpendicular to the arm
+        x_offset = width//2 * np.cos(angle + np.pi/2)
+        y_offset = width//2 * np.sin(angle + np.pi/2)
+        polygons.append([
+            (int(endpoint[0]+x_offset), int(endpoint[1]+y_offset)),
+            (int(endpoint[0]-x_offset), int(endpoint[1]-y_offset)),
+            (int(centroid[0]-x_offset), int(centroid[1]-y_offset)),
+            (int(centroid[0]), int(centroid[1])),
+            (int(centroid[0]+x_offset), int(centroid[1]+y_offset)),
+        ])
+    return polygons
+
+# get the polygon of a linear arena: a rectangle of the given width around the line joining the two endpoints
+def linear_arena_polygons(endpoints, width):
+    (x1, y1), (x2, y2) = endpoints[0], endpoints[1]
+    # get the angle of the line joining the endpoints
+    angle = np.arctan2(y2-y1, x2-x1)
+    # get the x and y offsets perpendicular to the line
+    x_offset = width//2 * np.cos(angle + np.pi/2)
+    y_offset = width//2 * np.sin(angle + np.pi/2)
+    return [[
+        (int(x1+x_offset), int(y1+y_offset)),
+        (int(x1-x_offset), int(y1-y_offset)),
+        (int(x2-x_offset), int(y2-y_offset)),
+        (int(x2+x_offset), int(y2+y_offset)),
+    ]]
+
+# rasterize the polygons of every arena straight into a label image, filling each arena only within its bounding box
+def rasterize_arenas(polygons, shape):
+    labels = np.zeros(shape, dtype=np.int16)
+    for i, arena_polygons in enumerate(polygons):
+        arena_polygons = [np.asarray(polygon, dtype=np.int32).reshape(-1, 2) for polygon in arena_polygons]
+        vertices = np.concatenate(arena_polygons)
+        # get the bounding box of the arena clipped to the image
+        x0, y0 = np.maximum(vertices.min(axis=0), 0)
+        x1, y1 = np.minimum(vertices.max(axis=0) + 1, (shape[1], shape[0]))
+        if x1 <= x0 or y1 <= y0:
+            continue
+        # scanline fill all the polygons of the arena into a tile the size of the bounding box
+        tile = np.zeros((y1-y0, x1-x0), dtype=np.uint8)
+        # (one call per polygon, a single call would xor the overlapping arms)
+        for polygon in arena_polygons:
+            cv2.fillPoly(tile, [polygon - (x0, y0)], 1)
+        inside = tile > 0
+        # pixels already claimed by another arena are shared
+        region = labels[y0:y1, x0:x1]
+        shared = inside & (region != NO_ARENA)
+        region[inside & (region == NO_ARENA)] = i + 1
+        region[shared] = OVERLAP
+    return labels
+
+# load the legacy json mask dump ({"arena_1": HxW list, ...}) one arena at a time into a label image
+def load_json_masks(mask_file):
+    with open(mask_file) as f:
+        masks = json.load(f)
+    n_arenas = len(masks)
+    labels = masks_to_labels(np.asarray(masks.pop(key), dtype=np.uint8) for key in list(masks.keys()))
+    return labels, n_arenas
+
+# save the arena label image and the polygons it was drawn from as a compressed npz file
+# (the label image is piecewise constant so zlib brings it down to a few kB)
+def save_arena_masks(mask_file, labels, polygons):
+    arrays = {'labels': np.asarray(labels, dtype=np.int16), 'n_arenas': np.array(len(polygons))}
+    # polygons is a list with one (n_polygons, n_vertices, 2) array per arena
+    for i, arena_polygons in enumerate(polygons):
+        arrays['arena_{}_polygons'.format(i+1)] = np.asarray(arena_polygons, dtype=np.int32)
+    np.savez_compressed(mask_file, **arrays)
+
+# load the arena label image and number of arenas from either the npz format or the legacy json dump
+def load_arena_masks(mask_file):
+    if mask_file.endswith('.json'):
+        return load_json_masks(mask_file)
+    with np.load(mask_file) as data:
+        labels = data['labels']
+        n_arenas = int(data['n_arenas'])
+    return labels, n_arenas
+
+# load the polygons of every arena from the npz format
+def load_arena_polygons(mask_file):
+    with np.load(mask_file) as data:
+        n_arenas = int(data['n_arenas'])
+        polygons = [data['arena_{}_polygons'.format(i+1)] for i in range(n_arenas)]
+    return polygons
+
+# find the mask file for a given prefix, preferring the npz format over the legacy json dump
+def find_mask_file(prefix):
+    for extension in ['.npz', '.json']:
+        if os.path.exists(prefix + '_masks' + extension):
+            return prefix + '_masks' + extension
+    raise FileNotFoundError('No mask file found for {}'.format(prefix))
+
+# find the arena of each (x,y) point; points can have any leading shape, e.g. (n_points, 2) or (n_frames, n_points, 2)
+def assign_arenas(points, labels):
+    points = np.asarray(points, dtype=np.float64)
+    x, y = points[..., 0], points[..., 1]
+    # points outside the image or nan get no arena
+    valid = np.isfinite(x) & np.isfinite(y) & (x >= 0) & (y >= 0) & (x < labels.shape[1]) & (y < labels.shape[0])
+    xi = np.where(valid, x, 0).astype(np.intp)
+    yi = np.where(valid, y, 0).astype(np.intp)
+    arena_ids = labels[yi, xi]
+    arena_ids[~valid] = NO_ARENA
+    return arena_ids
+
+# keep the largest point in every arena; returns (n_arenas, 2) positions or (n_frames, n_arenas, 2) if frame ids are given
+def select_largest(points, sizes, arena_ids, n_arenas, frame_ids=None, n_frames=None):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    sizes = np.asarray(sizes).ravel()
+    arena_ids = np.asarray(arena_ids).ravel()
+    batched = frame_ids is not None
+    if batched:
+        frame_ids = np.asarray(frame_ids, dtype=np.intp).ravel()
+        if n_frames is None:
+            n_frames = int(frame_ids.max()) + 1 if frame_ids.size > 0 else 0
+    else:
+        frame_ids = np.zeros(arena_ids.shape, dtype=np.intp)
+        n_frames = 1
+    pos = np.full((n_frames * n_arenas, 2), np.nan)
+    # ignore points outside the arenas or in shared pixels
+    keep = arena_ids > 0
+    if keep.any():
+        group = frame_ids[keep] * n_arenas + arena_ids[keep] - 1
+        index = np.flatnonzero(keep)
+        # sort by group, then size, then earliest point so the last of every group is the winner
+        order = np.lexsort((-index, sizes[keep], group))
+        group = group[order]
+        last = np.flatnonzero(np.append(group[1:] != group[:-1], True))
+        pos[group[last]] = points[index[order[last]]]
+    pos = pos.reshape(n_frames, n_arenas, 2)
+    return pos if batched else pos[0]
@@ -0,0 +1,89 @@
+import numpy as np
+
+# number of bins of the coarse (high 4 bits) and fine (low 4 bits) histograms of the 8 bit gray levels
+N_BINS = 16
+
+# get the smallest unsigned dtype that can count up to n_frames
+def count_dtype(n_frames):
+    for dtype in [np.uint8, np.uint16, np.uint32]:
+        if n_frames <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+# check if n_frames frames of a shape fit in memory_mb megabytes
+def frames_fit(shape, n_frames, memory_mb=1024):
+    return n_frames * shape[0] * shape[1] <= memory_mb * 1024**2
+
+# get the bin holding the value at sorted position rank of every pixel and the rank of that value inside the bin
+# from the cumulative counts (N_BINS, n_pixels) of the histograms
+def histogram_rank(cumulative, rank):
+    # the bin is the number of bins whose cumulative count is at most rank
+    bins = (cumulative <= rank).sum(axis=0)
+    below = np.where(bins > 0, cumulative[np.maximum(bins-1, 0), np.arange(cumulative.shape[1])], 0)
+    return bins, rank - below
+
+# add a frame of values (n_pixels,) in [0, N_BINS) to the histograms (N_BINS, n_pixels), values outside are not counted
+def count_values(histogram, values):
+    for level in range(N_BINS):
+        histogram[level] += values == level
+
+# get the exact per pixel median of a stream of grayscale uint8 frames in bounded memory
+# read_frames() returns an iterator over the frames and must give the same frames every time it is called
+# n_frames is an upper bound of the number of frames; if they fit in memory_mb the frames are read once and the median
+# is np.median, otherwise it takes two passes over the frames: the first counts the coarse histograms of the high 4 bits
+# to find the bins of the two middle values, the second counts the fine histograms of the low 4 bits inside them
+# returns the (height, width) float64 median, like np.median(frames, axis=0), and the number of frames
+# (None and 0 if there are no frames)
+def streaming_median(read_frames, shape, n_frames, memory_mb=1024, verbose=True):
+    height, width = shape
+    n_pixels = height * width
+    def frames():
+        for count, frame in enumerate(read_frames()):
+            assert frame.shape == tuple(shape) and frame.dtype == np.uint8, 'Frames must be {} uint8 images'.format(tuple(shape))
+            assert count < n_frames, 'More than {} frames'.format(n_frames)
+            yield frame
+    if frames_fit(shape, n_frames, memory_mb):
+        if verbose:
+            print('Computing the median of up to {} frames in memory'.format(n_frames))
+        stack = np.empty((n_frames, height, width), dtype=np.uint8)
+        count = 0
+        for frame in frames():
+            stack[count] = frame
+            count += 1
+        if count == 0:
+            return None, 0
+        return np.median(stack[:count], axis=0, overwrite_input=True), count
+    dtype = count_dtype(n_frames)
+    assert 2 * N_BINS * n_pixels * np.dtype(dtype).itemsize <= memory_mb * 1024**2, 'Memory budget of {}MB is too small for the histograms of {} pixels'.format(memory_mb, n_pixels)
+    if verbose:
+        print('Computing the median of up to {} frames with two passes of {} bin histograms'.format(n_frames, N_BINS))
+    # first pass: the coarse histograms of the high 4 bits
+    histogram = np.zeros((N_BINS, n_pixels), dtype=dtype)
+    count = 0
+    for frame in frames():
+        count_values(histogram, frame.ravel() >> 4)
+        count += 1
+    if count == 0:
+        return None, 0
+    # as np.median, the mean of the two middle values for an even count
+    cumulative = np.cumsum(histogram, axis=0, dtype=dtype)
+    lower_bin, lower_rank = histogram_rank(cumulative, (count-1)//2)
+    upper_bin, upper_rank = histogram_rank(cumulative, count//2)
+    lower_base = (lower_bin * N_BINS).astype(np.uint8)
+    upper_base = (upper_bin * N_BINS).astype(np.uint8)
+    # second pass: the fine histograms of the values in the bin of the lower middle value; when the upper middle value
+    # is in the next bin it is the smallest value of that bin
+    # (the uint8 difference to the base of a bin wraps around to at least N_BINS for the values outside of it)
+    histogram[:] = 0
+    upper_offset = np.full(n_pixels, 255, dtype=np.uint8)
+    n_second = 0
+    for frame in frames():
+        values = frame.ravel()
+        count_values(histogram, values - lower_base)
+        np.minimum(upper_offset, values - upper_base, out=upper_offset)
+        n_second += 1
+    assert n_second == count, 'The frames of the second pass differ from the first ({} and {} frames)'.format(count, n_second)
+    cumulative = np.cumsum(histogram, axis=0, dtype=dtype)
+    lower = lower_base + histogram_rank(cumulative, lower_rank)[0]
+    upper = np.where(upper_bin == lower_bin, lower_base + histogram_rank(cumulative, upper_rank)[0], upper_base + upper_offset.astype(np.int64))
+    return ((lower + upper) / 2).reshape(shape), count
@@ -0,0 +1,39 @@
+import numpy as np
+import os
+import glob
+import shutil
+
+# get the checkpoint directory of a stage run; the key (e.g. the manifest stage key) makes sure that shards of a run
+# with other inputs or parameters are never reused
+def checkpoint_dir(prefix, key):
+    return '{}_shards_{}'.format(prefix, key[:12])
+
+# remove the checkpoint directories of other runs with the same prefix (stale shards of changed inputs or parameters)
+def remove_stale_checkpoints(prefix, key):
+    for directory in glob.glob('{}_shards_*'.format(prefix)):
+        if directory != checkpoint_dir(prefix, key):
+            print('Removing stale checkpoint {}'.format(directory))
+            shutil.rmtree(directory, ignore_errors=True)
+
+# get the shard file of the chunk [start_frame, end_frame)
+def shard_file(directory, start_frame, end_frame):
+    return os.path.join(directory, 'chunk_{:09d}_{:09d}.npz'.format(start_frame, end_frame))
+
+# save the arrays of a finished chunk (compressed, the histograms are mostly zeros); the shard is written to a
+# temporary file and renamed so that a run killed while writing never leaves a partial shard behind
+def save_shard(path, **arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(path + '.tmp', path)
+
+# load the arrays of a shard, None if the chunk has not been saved (or the shard cannot be read)
+def load_shard(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as shard:
+            return {key: shard[key] for key in shard.files}
+    except (OSError, ValueError, EOFError) as e:
+        print('Shard {} cannot be read ({}), recomputing it'.format(path, e))
+        return None
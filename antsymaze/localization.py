@@ -0,0 +1,246 @@
+import numpy as np
+import cv2
+from scipy import ndimage
+from antsymaze.arenas import assign_arenas, select_largest
+from antsymaze.profiling import make_stopwatch
+
+# size of the gaussian blur applied to the foreground mask before localization
+BLUR_SIZE = 55
+
+# largest extent of an ant in pixels; an ant in an arena can reach this far out of the arena bounding box
+ANT_SIZE = 30
+
+# precompute the per-pixel threshold from the grayscale background once per camera
+# a pixel is foreground if (frame - background) > cut_off, i.e. frame > background + cut_off
+def prepare_background(background, cut_off=-50):
+    if background.ndim == 3:
+        background = cv2.cvtColor(background, cv2.COLOR_BGR2GRAY)
+    return background.astype(np.int16) + cut_off
+
+# preallocate the per-frame buffers so frames can be processed without new full-frame temporaries
+def allocate_buffers(shape):
+    return {
+        'gray': np.empty(shape, dtype=np.uint8),
+        'mask': np.empty(shape, dtype=np.uint8),
+        'blur': np.empty(shape, dtype=np.uint8),
+    }
+
+# convert a BGR (or grayscale) frame into the gray buffer
+def to_gray(frame, buffers):
+    gray = buffers['gray']
+    if frame.ndim == 3:
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+    else:
+        gray[...] = frame
+    return gray
+
+# threshold a grayscale frame against the background into a 0/255 foreground mask
+def threshold_mask(gray, threshold, buffers):
+    mask = buffers['mask']
+    # write the comparison straight into the mask buffer (bool and uint8 share the same layout) and scale to 0/255
+    np.greater(gray, threshold, out=mask.view(np.bool_))
+    np.multiply(mask, 255, out=mask)
+    return mask
+
+# threshold a BGR (or grayscale) frame against the background into a 0/255 foreground mask
+def foreground_mask(frame, threshold, buffers):
+    return threshold_mask(to_gray(frame, buffers), threshold, buffers)
+
+# blur the foreground mask into the blur buffer
+def blur_mask(mask, buffers):
+    return cv2.GaussianBlur(mask, (BLUR_SIZE,BLUR_SIZE), 0, dst=buffers['blur'])
+
+# create a blob detector localizer; the detector is configured once and reused for every frame
+# params are cv2.SimpleBlobDetector_Params attributes (e.g. minArea=50, filterByArea=True), the rest keep the opencv defaults
+def blob_localizer(**params):
+    detector_params = cv2.SimpleBlobDetector_Params()
+    for key, value in params.items():
+        assert hasattr(detector_params, key), 'Blob detector parameter {} is not valid'.format(key)
+        setattr(detector_params, key, value)
+    detector = cv2.SimpleBlobDetector_create(detector_params)
+    def locate(image, buffers):
+        keypoints = detector.detect(image)
+        # convert to numpy array and get the positions and sizes
+        keypoints = np.array([[kp.pt[0], kp.pt[1], kp.size] for kp in keypoints]).reshape(-1, 3)
+        return keypoints[:,:2], keypoints[:,2]
+    return locate
+
+# create a connected components localizer that returns the centroids and pixel areas of the dark components
+# it runs on the unblurred foreground mask: the heavy blur of the blob detector washes small ants out above the binarization level
+def components_localizer(min_area=25, connectivity=8):
+    def locate(image, buffers):
+        if 'binary' not in buffers:
+            buffers['binary'] = np.empty(image.shape, dtype=np.uint8)
+            buffers['components'] = np.empty(image.shape, dtype=np.int32)
+        # the ants are dark (0) in the foreground mask
+        binary = cv2.threshold(image, 127, 255, cv2.THRESH_BINARY_INV, dst=buffers['binary'])[1]
+        _, _, stats, centroids = cv2.connectedComponentsWithStats(binary, buffers['components'], connectivity=connectivity)
+        # drop the background component and the components that are too small
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = areas >= min_area
+        return centroids[1:][keep], areas[keep]
+    return locate
+
+# available localization engines
+LOCALIZERS = {
+    'blob': blob_localizer,
+    'components': components_localizer,
+}
+
+# localizers that run on the blurred foreground mask, the others run on the foreground mask itself
+BLURRED_LOCALIZERS = ['blob']
+
+# create a localizer by name
+def make_localizer(method='blob', **params):
+    assert method in LOCALIZERS, 'Localizer {} is not valid, choose from {}'.format(method, list(LOCALIZERS.keys()))
+    return LOCALIZERS[method](**params)
+
+# find the candidate ants (positions and sizes) in a frame with a localizer
+# blur is False for the localizers that run on the foreground mask itself (see BLURRED_LOCALIZERS)
+def find_candidates(frame, threshold, buffers, localizer, blur=True):
+    # get the only ant mask
+    only_ants = foreground_mask(frame, threshold, buffers)
+    # apply a gaussian blur
+    if blur:
+        only_ants = blur_mask(only_ants, buffers)
+    return localizer(only_ants, buffers)
+
+# make a function that combines the entire process given a frame and a background threshold
+def get_ant_locations(frame, threshold, arena_labels, N_ARENAS, buffers=None, localizer=None, blur=True):
+    if buffers is None:
+        buffers = allocate_buffers(threshold.shape)
+    if localizer is None:
+        localizer = make_localizer('blob')
+    points, sizes = find_candidates(frame, threshold, buffers, localizer, blur)
+    # find the arena of every candidate and keep the largest candidate per arena
+    arena_ids = assign_arenas(points, arena_labels)
+    pos = select_largest(points, sizes, arena_ids, N_ARENAS)
+    return pos
+
+# get the foreground pixel count and the sums of the x and y coordinates of the foreground pixels of every arena
+def arena_moments(frame, threshold, arena_labels, N_ARENAS, buffers):
+    return gray_moments(to_gray(frame, buffers), threshold, arena_labels, N_ARENAS, buffers)
+
+# get the arena moments of a grayscale frame
+def gray_moments(gray, threshold, arena_labels, N_ARENAS, buffers):
+    # the ants are the pixels that are not brighter than background + cut_off
+    ants = buffers['mask'].view(np.bool_)
+    np.less_equal(gray, threshold, out=ants)
+    index = np.flatnonzero(ants)
+    # get the arena of every foreground pixel (no arena and shared pixels go to bin 0)
+    arena_ids = arena_labels.reshape(-1)[index]
+    arena_ids[arena_ids < 0] = 0
+    # accumulate the pixel count and the first moments per arena in one pass each
+    counts = np.bincount(arena_ids, minlength=N_ARENAS+1)[1:]
+    sum_x = np.bincount(arena_ids, weights=index % gray.shape[1], minlength=N_ARENAS+1)[1:]
+    sum_y = np.bincount(arena_ids, weights=index // gray.shape[1], minlength=N_ARENAS+1)[1:]
+    return counts, sum_x, sum_y
+
+# turn the arena moments into centroids; arenas with fewer than min_area foreground pixels are reported as nan
+def moments_to_positions(counts, sum_x, sum_y, min_area=25):
+    pos = np.full((len(counts), 2), np.nan)
+    found = counts >= max(min_area, 1)
+    pos[found, 0] = sum_x[found] / counts[found]
+    pos[found, 1] = sum_y[found] / counts[found]
+    return pos
+
+# locate one ant per arena from the moments of the foreground pixels of each arena (no blur or blob detection)
+def get_ant_moments(frame, threshold, arena_labels, N_ARENAS, buffers=None, min_area=25):
+    if buffers is None:
+        buffers = allocate_buffers(threshold.shape)
+    counts, sum_x, sum_y = arena_moments(frame, threshold, arena_labels, N_ARENAS, buffers)
+    return moments_to_positions(counts, sum_x, sum_y, min_area)
+
+# all localization modes: the localizers that run on the blurred mask plus the per-arena moments mode
+LOCALIZATION_MODES = list(LOCALIZERS.keys()) + ['moments']
+
+# get the bounding boxes (y0, y1, x0, x1) of the arenas padded by margin pixels, merged into a few disjoint strips
+# (boxes whose rows overlap are merged: a few wide strips are much cheaper to blur than many small tiles)
+def arena_rois(arena_labels, margin=0):
+    boxes = []
+    for box in ndimage.find_objects(np.maximum(arena_labels, 0)):
+        if box is None:
+            continue
+        boxes.append([max(box[0].start-margin, 0), min(box[0].stop+margin, arena_labels.shape[0]),
+                      max(box[1].start-margin, 0), min(box[1].stop+margin, arena_labels.shape[1])])
+    # merge boxes that share rows until all strips are disjoint
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i+1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[1] and b[0] < a[1]:
+                    boxes[i] = [min(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])]
+                    boxes.pop(j)
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(int(v) for v in box) for box in sorted(boxes)]
+
+# create a function that locates the ants in a frame; buffers and localizer are created once and reused for every frame
+# with crop=True only the (padded) bounding boxes of the arenas are processed and coordinates are mapped back to the full frame
+# if a profile dictionary is given, the time and calls of every stage are added to it (see antsymaze.profiling)
+# localizer_params are passed on to the localizer (e.g. the blob detector parameters)
+def make_frame_locator(mode, threshold, arena_labels, N_ARENAS, min_area=25, crop=True, profile=None, localizer_params=None):
+    assert mode in LOCALIZATION_MODES, 'Localization mode {} is not valid, choose from {}'.format(mode, LOCALIZATION_MODES)
+    localizer_params = {} if localizer_params is None else localizer_params
+    blur = mode in BLURRED_LOCALIZERS
+    if crop:
+        # pad by the ant size so the ants on the edge of an arena box are not cut, plus half the blur for the blurred
+        # localizers so the blurred mask around the ants is the same as on the full frame
+        rois = arena_rois(arena_labels, margin=ANT_SIZE + (BLUR_SIZE//2 if blur else 0))
+    else:
+        rois = [(0, threshold.shape[0], 0, threshold.shape[1])]
+    # crop the threshold and labels once and allocate buffers for every roi
+    tiles = []
+    for y0, y1, x0, x1 in rois:
+        tiles.append((y0, y1, x0, x1,
+                      np.ascontiguousarray(threshold[y0:y1, x0:x1]),
+                      np.ascontiguousarray(arena_labels[y0:y1, x0:x1]),
+                      allocate_buffers((y1-y0, x1-x0))))
+    lap = make_stopwatch(profile)
+    if mode == 'moments':
+        def locate_frame(frame):
+            lap(None)
+            counts, sum_x, sum_y = np.zeros(N_ARENAS, dtype=np.int64), np.zeros(N_ARENAS), np.zeros(N_ARENAS)
+            for y0, y1, x0, x1, tile_threshold, tile_labels, buffers in tiles:
+                gray = to_gray(frame[y0:y1, x0:x1], buffers)
+                lap('color')
+                tile_counts, tile_x, tile_y = gray_moments(gray, tile_threshold, tile_labels, N_ARENAS, buffers)
+                counts += tile_counts
+                sum_x += tile_x + x0*tile_counts
+                sum_y += tile_y + y0*tile_counts
+                lap('localization')
+            pos = moments_to_positions(counts, sum_x, sum_y, min_area)
+            lap('assignment')
+            return pos
+        return locate_frame
+    if mode == 'components':
+        localizer = make_localizer(mode, **dict({'min_area': min_area}, **localizer_params))
+    else:
+        localizer = make_localizer(mode, **localizer_params)
+    def locate_frame(frame):
+        lap(None)
+        points, sizes = [], []
+        for y0, y1, x0, x1, tile_threshold, tile_labels, buffers in tiles:
+            # the steps of find_candidates, timed one by one
+            gray = to_gray(frame[y0:y1, x0:x1], buffers)
+            lap('color')
+            mask = threshold_mask(gray, tile_threshold, buffers)
+            lap('threshold')
+            if blur:
+                mask = blur_mask(mask, buffers)
+                lap('blur')
+            tile_points, tile_sizes = localizer(mask, buffers)
+            points.append(tile_points + (x0, y0))
+            sizes.append(tile_sizes)
+            lap('localization')
+        points, sizes = np.concatenate(points), np.concatenate(sizes)
+        # find the arena of every candidate and keep the largest candidate per arena
+        arena_ids = assign_arenas(points, arena_labels)
+        pos = select_largest(points, sizes, arena_ids, N_ARENAS)
+        lap('assignment')
+        return pos
+    return locate_frame
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import json
+import os
+
+# available output formats for the ant locations: the wide text table and the compressed columnar files
+LOCATION_FORMATS = ['csv', 'parquet', 'npz']
+
+# check if an output format can be written or read (parquet needs pyarrow, the optional parquet extra of the package)
+def check_location_format(output_format):
+    assert output_format in LOCATION_FORMATS, 'Output format {} is not valid, choose from {}'.format(output_format, LOCATION_FORMATS)
+    if output_format == 'parquet':
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('Parquet files need pyarrow (poetry install -E parquet or pip install pyarrow), or use the npz format')
+
+# make the wide table of the ant locations: frame, time, x and y of every arena, then the per arena flags
+# coordinates are float32 and the frame index int32 (unless overridden); valid marks detections and interpolated marks filled samples
+def locations_table(frames, timestamps, positions, valid=None, interpolated=None, frame_dtype=np.int32, coordinate_dtype=np.float32):
+    N_ARENAS = positions.shape[1]
+    columns = {'frame': np.asarray(frames, dtype=frame_dtype), 'time': np.asarray(timestamps, dtype=np.float64)}
+    for i in range(N_ARENAS):
+        columns['arena_{}_x'.format(i+1)] = positions[:,i,0].astype(coordinate_dtype)
+    for i in range(N_ARENAS):
+        columns['arena_{}_y'.format(i+1)] = positions[:,i,1].astype(coordinate_dtype)
+    if valid is not None:
+        for i in range(N_ARENAS):
+            columns['arena_{}_valid'.format(i+1)] = valid[:,i].astype(np.uint8)
+    if interpolated is not None:
+        for i in range(N_ARENAS):
+            columns['arena_{}_interpolated'.format(i+1)] = interpolated[:,i].astype(np.uint8)
+    return pd.DataFrame(columns)
+
+# save the ant locations to prefix + the extension of the format and return the file name
+# the csv has the original columns (frame, then the x and then the y of every arena, as float64 text), with
+# csv_extra_columns the time and interpolated columns are added; parquet and npz are compressed and carry the time,
+# the validity and interpolation flags and the run metadata (a json serializable dictionary)
+def save_locations(prefix, output_format, frames, timestamps, positions, valid=None, interpolated=None, metadata=None, csv_extra_columns=False):
+    check_location_format(output_format)
+    metadata = {} if metadata is None else metadata
+    path = prefix + '.' + output_format
+    if output_format == 'csv':
+        data = locations_table(frames, timestamps, positions, interpolated=interpolated if csv_extra_columns else None,
+                               frame_dtype=np.float64, coordinate_dtype=np.float64)
+        if not csv_extra_columns:
+            data = data.drop(columns='time')
+        data.to_csv(path, index=False)
+    elif output_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(locations_table(frames, timestamps, positions, valid, interpolated), preserve_index=False)
+        # keep the run metadata in the footer next to the pandas schema
+        table = table.replace_schema_metadata(dict(table.schema.metadata, antsymaze=json.dumps(metadata, default=str)))
+        pq.write_table(table, path, compression='zstd')
+    else:
+        arrays = {
+            'frame': np.asarray(frames, dtype=np.int32),
+            'time': np.asarray(timestamps, dtype=np.float64),
+            'positions': positions.astype(np.float32),
+            'metadata': np.array(json.dumps(metadata, default=str)),
+        }
+        if valid is not None:
+            arrays['valid'] = valid.astype(np.bool_)
+        if interpolated is not None:
+            arrays['interpolated'] = interpolated.astype(np.bool_)
+        np.savez_compressed(path, **arrays)
+    return path
+
+# find the ant locations file of a prefix, preferring the columnar formats (raises FileNotFoundError if there is none)
+# detection removes the files of the formats it did not write, so only the files of the last run are found
+def find_locations_file(prefix):
+    for output_format in ['parquet', 'npz', 'csv']:
+        if os.path.exists(prefix + '.' + output_format):
+            return prefix + '.' + output_format
+    raise FileNotFoundError('No ant locations file found for {}'.format(prefix))
+
+# load an ant locations file as the wide table (frame, time, positions and flags; a csv only has the columns it was
+# saved with) and the run metadata (empty for a csv)
+def load_locations(path):
+    if path.endswith('.parquet'):
+        check_location_format('parquet')
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        metadata = table.schema.metadata or {}
+        return table.to_pandas(), json.loads(metadata.get(b'antsymaze', b'{}'))
+    elif path.endswith('.npz'):
+        with np.load(path) as data:
+            return (locations_table(data['frame'], data['time'], data['positions'],
+                                    data['valid'] if 'valid' in data.files else None,
+                                    data['interpolated'] if 'interpolated' in data.files else None),
+                    json.loads(str(data['metadata'])))
+    return pd.read_csv(path), {}
@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+
+# files up to this size are hashed completely, larger files (the videos) are hashed from their size and samples
+FULL_HASH_LIMIT = 64*1024*1024
+# size of every sample of a large file
+SAMPLE_SIZE = 1024*1024
+
+# get a content hash of a file; large files are hashed from their size and the bytes at the start, middle and end
+# so that multi-GB videos are fingerprinted in milliseconds
+def file_digest(path):
+    digest = hashlib.sha1()
+    size = os.path.getsize(path)
+    digest.update(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= FULL_HASH_LIMIT:
+            for block in iter(lambda: f.read(SAMPLE_SIZE), b''):
+                digest.update(block)
+        else:
+            for offset in [0, size//2 - SAMPLE_SIZE//2, size - SAMPLE_SIZE]:
+                f.seek(offset)
+                digest.update(f.read(SAMPLE_SIZE))
+    return digest.hexdigest()
+
+# get the key of a stage run from the hashes of its input files and its parameters (anything json serializable)
+def stage_key(input_files, params):
+    content = {
+        'inputs': [[os.path.basename(path), file_digest(path)] for path in input_files],
+        'params': params,
+    }
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+# load a manifest ({stage: {'key': key, 'outputs': [file names], 'params': params}}), empty if there is none
+def load_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file) as f:
+            return json.load(f)
+    except ValueError:
+        print('Manifest {} is not valid, ignoring it'.format(manifest_file))
+        return {}
+
+# check if a stage was already run with the same key and all its outputs (next to the manifest) still exist
+def is_up_to_date(manifest_file, stage, key):
+    entry = load_manifest(manifest_file).get(stage)
+    if entry is None or entry['key'] != key:
+        return False
+    output_dir = os.path.dirname(manifest_file)
+    return all(os.path.exists(os.path.join(output_dir, output)) for output in entry['outputs'])
+
+# record a finished stage run in the manifest (written to a temporary file and renamed so it is never half written)
+def record_stage(manifest_file, stage, key, output_files, params=None):
+    manifest = load_manifest(manifest_file)
+    manifest[stage] = {
+        'key': key,
+        'outputs': [os.path.basename(path) for path in output_files],
+        'params': params,
+    }
+    with open(manifest_file + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True, default=str)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+# remove a stage from the manifest (e.g. before its outputs are rewritten)
+def invalidate_stage(manifest_file, stage):
+    manifest = load_manifest(manifest_file)
+    if stage in manifest:
+        del manifest[stage]
+        with open(manifest_file + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=4, sort_keys=True, default=str)
+        os.replace(manifest_file + '.tmp', manifest_file)
@@ -0,0 +1,73 @@
+import numpy as np
+
+# get the (rows, columns) of the occupancy histogram of a frame: n_bins rows and as many square bins across
+def occupancy_bins(frame_shape, n_bins):
+    return n_bins, int(n_bins*frame_shape[1]/frame_shape[0])
+
+# bin values in [0, extent] into n equal bins like np.histogram (the right edge goes into the last bin)
+# returns the bin indices and a mask of the values inside the range
+def _bin_index(values, extent, n):
+    index = np.floor(values*(n/extent)).astype(np.int64)
+    np.minimum(index, n-1, out=index)
+    inside = (values >= 0) & (values <= extent)
+    return index, inside
+
+# count the positions ((samples, arenas, 2) x/y, nan if not detected) of every arena on the occupancy grid
+# returns an (arenas, rows, columns) histogram, the same counts as np.histogram2d(y, x) over the frame per arena
+def occupancy_histogram(positions, frame_shape, n_bins):
+    positions = np.asarray(positions, dtype=np.float64)
+    N_ARENAS = positions.shape[1]
+    rows, columns = occupancy_bins(frame_shape, n_bins)
+    x, y = positions[...,0], positions[...,1]
+    arena_ids = np.broadcast_to(np.arange(N_ARENAS), x.shape)
+    found = ~(np.isnan(x) | np.isnan(y))
+    x_index, x_inside = _bin_index(np.where(found, x, -1), frame_shape[1], columns)
+    y_index, y_inside = _bin_index(np.where(found, y, -1), frame_shape[0], rows)
+    keep = found & x_inside & y_inside
+    # one bincount over the flat (arena, row, column) index
+    flat = (arena_ids[keep]*rows + y_index[keep])*columns + x_index[keep]
+    return np.bincount(flat, minlength=N_ARENAS*rows*columns).reshape(N_ARENAS, rows, columns)
+
+# count the speeds (pixels per second) between consecutive samples of every arena into the bins given by speed_edges
+# pairs with a missing detection are skipped, pairs (a (samples-1, arenas) mask) limits the count to the given pairs
+# returns an (arenas, bins) histogram
+def speed_histogram(positions, timestamps, speed_edges, pairs=None):
+    N_ARENAS = positions.shape[1]
+    counts = np.zeros((N_ARENAS, len(speed_edges)-1), dtype=np.int64)
+    if len(positions) < 2:
+        return counts
+    dt = np.diff(np.asarray(timestamps, dtype=np.float64))
+    speed = np.linalg.norm(np.diff(np.asarray(positions, dtype=np.float64), axis=0), axis=2)/dt[:,None]
+    for i in range(N_ARENAS):
+        valid = np.isfinite(speed[:,i]) & (dt > 0)
+        if pairs is not None:
+            valid &= pairs[:,i]
+        counts[i] = np.histogram(speed[valid,i], bins=speed_edges)[0]
+    return counts
+
+# count what filling the gaps of a trajectory adds to its histograms: the occupancy of the filled samples and the
+# speeds of the pairs with a filled sample; filled is the (samples, arenas) mask of fill_gaps
+# added to the histograms of the detections, this gives the histograms of the filled trajectory
+def filled_histograms(positions, timestamps, filled, frame_shape, n_bins, speed_edges=None):
+    positions = np.asarray(positions, dtype=np.float64)
+    occupancy = occupancy_histogram(np.where(filled[...,None], positions, np.nan), frame_shape, n_bins)
+    if speed_edges is None:
+        return occupancy, None
+    return occupancy, speed_histogram(positions, timestamps, speed_edges, pairs=filled[1:] | filled[:-1])
+
+# save the merged histograms with their bin edges
+def save_occupancy(path, occupancy, frame_shape, speed=None, speed_edges=None):
+    arrays = {
+        'occupancy': occupancy,
+        'x_edges': np.linspace(0, frame_shape[1], occupancy.shape[2]+1),
+        'y_edges': np.linspace(0, frame_shape[0], occupancy.shape[1]+1),
+    }
+    if speed is not None:
+        arrays['speed'] = speed
+        arrays['speed_edges'] = speed_edges
+    np.savez_compressed(path, **arrays)
+
+# load the histograms of save_occupancy as a dictionary of arrays
+def load_occupancy(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
@@ -0,0 +1,119 @@
+import threading
+import queue
+import time
+
+# run a decode -> compute pipeline inside one process
+# one thread pulls (frame index, timestamp, frame) items from the frames iterator into a bounded queue and n_workers
+# threads process them with their own function from make_worker (so every thread can own its buffers);
+# OpenCV releases the GIL while decoding and filtering so the stages overlap
+# returns the results in input order, the frame indices and timestamps, and the per-stage timing statistics
+def run_pipeline(frames, make_worker, n_workers=1, queue_depth=8, progress=None):
+    frame_queue = queue.Queue(maxsize=queue_depth)
+    results = {}
+    errors = []
+    lock = threading.Lock()
+    stats = {
+        'decode_time': 0.0,       # time spent producing frames
+        'decode_wait': 0.0,       # time the decoder was blocked on a full queue
+        'compute_time': 0.0,      # time spent processing frames (summed over the compute threads)
+        'compute_wait': 0.0,      # time the compute threads were blocked on an empty queue
+        'queue_depth_sum': 0,
+        'queue_depth_max': 0,
+        'n_frames': 0,
+    }
+
+    def decode():
+        try:
+            iterator = iter(frames)
+            sequence = 0
+            while not errors:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                decoded = time.perf_counter()
+                frame_queue.put((sequence,) + tuple(item))
+                stats['decode_time'] += decoded - start
+                stats['decode_wait'] += time.perf_counter() - decoded
+                sequence += 1
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # tell every compute thread to stop
+            for _ in range(n_workers):
+                frame_queue.put(None)
+
+    def compute():
+        try:
+            worker = make_worker()
+        except Exception as e:
+            errors.append(e)
+        # keep draining the queue until the end, even after an error, so the decoder is never blocked forever
+        while True:
+            start = time.perf_counter()
+            item = frame_queue.get()
+            got = time.perf_counter()
+            if item is None:
+                break
+            if errors:
+                continue
+            depth = frame_queue.qsize()
+            sequence, frame_no, timestamp, frame = item
+            try:
+                result = worker(frame)
+            except Exception as e:
+                errors.append(e)
+                continue
+            done = time.perf_counter()
+            with lock:
+                results[sequence] = (frame_no, timestamp, result)
+                stats['compute_wait'] += got - start
+                stats['compute_time'] += done - got
+                stats['queue_depth_sum'] += depth
+                stats['queue_depth_max'] = max(stats['queue_depth_max'], depth)
+                stats['n_frames'] += 1
+                if progress is not None:
+                    progress(stats['n_frames'])
+
+    start_time = time.perf_counter()
+    threads = [threading.Thread(target=decode, daemon=True)] + [threading.Thread(target=compute, daemon=True) for _ in range(n_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    stats['wall_time'] = time.perf_counter() - start_time
+    stats['queue_depth_mean'] = stats['queue_depth_sum']/max(stats['n_frames'], 1)
+    stats['fps'] = stats['n_frames']/max(stats['wall_time'], 1e-9)
+    # put the results back in frame order
+    ordered = [results[i] for i in sorted(results.keys())]
+    frame_no = [item[0] for item in ordered]
+    timestamps = [item[1] for item in ordered]
+    outputs = [item[2] for item in ordered]
+    return outputs, frame_no, timestamps, stats
+
+# merge the pipeline statistics of several workers or chunks (times and frame counts add up, depths are averaged per frame)
+# wall_time overrides the wall time of the merged run (default: the slowest of the merged runs)
+def merge_pipeline_stats(all_stats, wall_time=None):
+    merged = {key: 0.0 for key in ['decode_time', 'decode_wait', 'compute_time', 'compute_wait', 'queue_depth_sum', 'wall_time', 'n_frames']}
+    merged['queue_depth_max'] = 0
+    for stats in all_stats:
+        for key in merged.keys():
+            # the workers run side by side so the wall time is the slowest one
+            if key in ['queue_depth_max', 'wall_time']:
+                merged[key] = max(merged[key], stats[key])
+            else:
+                merged[key] += stats[key]
+    if wall_time is not None:
+        merged['wall_time'] = wall_time
+    merged['queue_depth_mean'] = merged['queue_depth_sum']/max(merged['n_frames'], 1)
+    merged['fps'] = merged['n_frames']/max(merged['wall_time'], 1e-9)
+    return merged
+
+# format the pipeline statistics for printing
+def format_pipeline_stats(stats):
+    return 'Frames: {}, FPS: {:.1f}, decode: {:.1f}s (blocked {:.1f}s), compute: {:.1f}s (starved {:.1f}s), queue depth: mean {:.1f} / max {}'.format(
+        int(stats['n_frames']), stats['fps'], stats['decode_time'], stats['decode_wait'],
+        stats['compute_time'], stats['compute_wait'], stats['queue_depth_mean'], int(stats['queue_depth_max']))
@@ -0,0 +1,82 @@
+import numpy as np
+import cv2
+import matplotlib.pyplot as plt
+from matplotlib.colors import ListedColormap
+
+# make a colormap with a linear gradient from black to a color
+def make_cmap(color):
+    # get the color RGB values
+    r,g,b,_ = color
+    # create a linear gradient from black to the color
+    cmap = np.array([np.linspace(0,r,256), np.linspace(0,g,256), np.linspace(0,b,256)]).T
+    return ListedColormap(cmap)
+
+# get the color of an arena
+def arena_color(arena_id, N_ARENAS):
+    return plt.cm.rainbow(arena_id/N_ARENAS)
+
+# rasterize the trajectories ((samples, arenas, 2), nan if missing) onto an RGB image of the frame
+# every pixel gets the color of the mean time of the samples on it (black to the arena color, like the old scatter
+# colored by time) and is blended over the image like stacked markers with the given alpha (1-(1-alpha)^count)
+# marker_size is the diameter of the marker drawn for every sample, in pixels
+def rasterize_trajectories(image, positions, times, alpha=0.3, marker_size=3):
+    image = image.astype(np.float32)/255
+    height, width = image.shape[:2]
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (marker_size, marker_size))
+    for arena_id in range(positions.shape[1]):
+        x, y = positions[:,arena_id,0], positions[:,arena_id,1]
+        found = ~(np.isnan(x) | np.isnan(y))
+        if found.sum() == 0:
+            continue
+        # accumulate the sample counts and times of every pixel in one pass
+        index = np.clip(np.round(y[found]).astype(np.int64), 0, height-1)*width + np.clip(np.round(x[found]).astype(np.int64), 0, width-1)
+        t = np.asarray(times, dtype=np.float64)[found]
+        t = (t - t.min())/max(t.max() - t.min(), 1e-9)
+        counts = np.bincount(index, minlength=height*width).reshape(height, width).astype(np.float32)
+        mean_time = (np.bincount(index, weights=t, minlength=height*width).reshape(height, width)/np.maximum(counts, 1)).astype(np.float32)
+        # grow every sample to the marker size
+        counts = cv2.dilate(counts, kernel)
+        mean_time = cv2.dilate(mean_time, kernel)
+        # blend the arena colors over the image
+        colors = make_cmap(arena_color(arena_id, positions.shape[1]))(mean_time)[...,:3].astype(np.float32)
+        opacity = (1 - (1-alpha)**counts)[...,None]
+        image = image*(1-opacity) + colors*opacity
+    return (np.clip(image, 0, 1)*255).astype(np.uint8)
+
+# plot the trajectories of every arena over the background with the points of interest
+def plot_trajectories(path, background, positions, times, pois):
+    N_ARENAS = positions.shape[1]
+    fig, ax = plt.subplots(1,1,figsize=(10,10))
+    plt.imshow(rasterize_trajectories(background, positions, times))
+    for arena_id in range(N_ARENAS):
+        # plot the POIs
+        points = np.array(pois["arena_{}_original".format(arena_id+1)])
+        plt.scatter(points[:,0], points[:,1], s=100, c='k', marker='x')
+    # hide the axes
+    ax.get_xaxis().set_visible(False)
+    ax.get_yaxis().set_visible(False)
+    plt.savefig(path, bbox_inches='tight', pad_inches=0)
+    plt.close()
+
+# plot the log occupancy histogram of every arena over the downscaled background with the points of interest
+def plot_occupancy(path, background, occupancy, pois):
+    N_ARENAS, n_bins, n_columns = occupancy.shape
+    background_small = cv2.resize(background, (n_columns, n_bins))
+    plt.imshow(background_small)
+    for arena_id in range(N_ARENAS):
+        # skip the arenas without detections
+        if occupancy[arena_id].sum()==0:
+            continue
+        # log transform the histogram
+        H = np.log(occupancy[arena_id]+1)
+        # plot the 2d histogram (make 0 values transparent)
+        masked_array = np.ma.masked_where(H == 0, H)
+        plt.imshow(masked_array, cmap=make_cmap(arena_color(arena_id, N_ARENAS)), interpolation='nearest', vmin=0, vmax=H[H>0].max(), alpha=0.5)
+        # plot the POIs
+        points = np.array(pois["arena_{}_original".format(arena_id+1)])
+        plt.scatter(points[:,0]*n_bins/background.shape[0], points[:,1]*n_bins/background.shape[0], s=100, c='k', marker='x')
+    # hide the axes
+    plt.gca().get_xaxis().set_visible(False)
+    plt.gca().get_yaxis().set_visible(False)
+    plt.savefig(path, bbox_inches='tight', pad_inches=0)
+    plt.close()
@@ -0,0 +1,95 @@
+import cProfile
+import glob
+import json
+import os
+import pstats
+import sys
+import time
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+# stages of the detection hot path in the order they run
+PROFILE_STAGES = ['decode', 'color', 'threshold', 'blur', 'localization', 'assignment', 'io']
+
+# make a function lap(stage) that adds the time since the previous lap to profile[stage] = [seconds, calls]
+# with profile None it does nothing, so the instrumented code costs one call per stage when profiling is off
+def make_stopwatch(profile):
+    if profile is None:
+        return lambda stage: None
+    last = [time.perf_counter()]
+    def lap(stage):
+        now = time.perf_counter()
+        if stage is not None:
+            entry = profile.setdefault(stage, [0.0, 0])
+            entry[0] += now - last[0]
+            entry[1] += 1
+        last[0] = now
+    return lap
+
+# add the stage times and calls of several profiles into one
+def merge_profiles(profiles):
+    merged = {}
+    for profile in profiles:
+        for stage, (seconds, calls) in profile.items():
+            entry = merged.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += calls
+    return merged
+
+# get the peak resident memory of this process in MB
+def peak_rss():
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kB, macOS bytes
+    return peak/1024**2 if sys.platform == 'darwin' else peak/1024
+
+# wrap a worker function so that its calls are recorded by a cProfile profiler
+# cProfile only sees the thread that enabled it and from python 3.12 only one profiler can be active per process,
+# so only one thread of a process may run a profiled worker
+def cprofile_worker(worker, profiler):
+    def profiled(*args):
+        profiler.enable()
+        try:
+            return worker(*args)
+        finally:
+            profiler.disable()
+    return profiled
+
+# make a new cProfile profiler
+def make_cprofiler():
+    return cProfile.Profile()
+
+# merge the cProfile dumps (*.prof) of a directory into one file
+def merge_cprofile_dumps(dump_dir, path):
+    dumps = sorted(glob.glob(os.path.join(dump_dir, '*.prof')))
+    if len(dumps) == 0:
+        return None
+    stats = pstats.Stats(dumps[0])
+    for dump in dumps[1:]:
+        stats.add(dump)
+    stats.dump_stats(path)
+    return path
+
+# save a run profile ({'workers': {worker: {'profile': {stage: [seconds, calls]}, ...}}, 'total': {...}, ...}) as json
+# and the per stage table (worker, stage, seconds, calls, ms per call) as csv
+def save_profile(prefix, run_profile):
+    with open(prefix + '.json', 'w') as f:
+        json.dump(run_profile, f, indent=4, default=str)
+    with open(prefix + '.csv', 'w') as f:
+        f.write('worker,stage,seconds,calls,ms_per_call\n')
+        rows = [(worker, entry['profile']) for worker, entry in run_profile['workers'].items()] + [('total', run_profile['total'])]
+        for worker, profile in rows:
+            for stage in PROFILE_STAGES + sorted(set(profile.keys()) - set(PROFILE_STAGES)):
+                if stage in profile:
+                    seconds, calls = profile[stage]
+                    f.write('{},{},{:.6f},{},{:.4f}\n'.format(worker, stage, seconds, calls, 1000*seconds/max(calls, 1)))
+
+# format the share of the time of every stage of a profile for printing
+def format_profile(profile):
+    total = sum(seconds for seconds, _ in profile.values())
+    return ', '.join('{}: {:.1f}s ({:.0f}%)'.format(stage, profile[stage][0], 100*profile[stage][0]/max(total, 1e-9))
+                     for stage in PROFILE_STAGES + sorted(set(profile.keys()) - set(PROFILE_STAGES)) if stage in profile)
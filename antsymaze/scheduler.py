@@ -0,0 +1,70 @@
+import os
+import subprocess
+import time
+
+# make a task for run_task_graph: a command run as a subprocess, the cpu cores and io slots it holds while
+# running, and the names of the tasks it depends on; check is an optional function called when the task becomes
+# ready that returns None to run it or a reason to skip it
+def make_task(command, cpu=1, io=0, deps=(), check=None):
+    return {'command': [str(c) for c in command], 'cpu': cpu, 'io': io, 'deps': list(deps), 'check': check}
+
+# run a dependency graph of subprocess tasks ({name: task}) with at most cpu_budget cores and io_budget io slots in use
+# tasks that become ready are started in the order of the tasks dictionary (put the later stages first to finish
+# each camera as early as possible); a failed task only skips the tasks that depend on it
+# the output of every task goes to log_dir/<name>.log; returns {name: status} with status done/failed/skipped
+def run_task_graph(tasks, cpu_budget, io_budget=1, log_dir=None, poll_interval=0.5, verbose=True):
+    if log_dir is not None and not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    status = {name: 'pending' for name in tasks.keys()}
+    running = {}
+    start_times = {}
+    cpu_used, io_used = 0, 0
+    start_time = time.time()
+
+    def report(message):
+        if verbose:
+            print('[{:8.1f}s] {}'.format(time.time()-start_time, message), flush=True)
+
+    while any(state in ['pending', 'running'] for state in status.values()):
+        # check the running tasks
+        for name in list(running.keys()):
+            process, log_file = running[name]
+            if process.poll() is None:
+                continue
+            if log_file is not None:
+                log_file.close()
+            del running[name]
+            cpu_used -= min(tasks[name]['cpu'], cpu_budget)
+            io_used -= min(tasks[name]['io'], io_budget)
+            status[name] = 'done' if process.returncode == 0 else 'failed'
+            report('{} {} in {:.1f}s{}'.format(name, status[name], time.time()-start_times[name],
+                                                '' if process.returncode == 0 else ' (exit code {})'.format(process.returncode)))
+        # skip the tasks that depend on a task that did not finish
+        for name, task in tasks.items():
+            if status[name] == 'pending' and any(status[dep] in ['failed', 'skipped'] for dep in task['deps']):
+                status[name] = 'skipped'
+                report('{} skipped (a dependency did not finish)'.format(name))
+        # start the ready tasks that fit in the budgets (a task bigger than a budget runs when it has it to itself)
+        for name, task in tasks.items():
+            if status[name] != 'pending' or any(status[dep] != 'done' for dep in task['deps']):
+                continue
+            cpu, io = min(task['cpu'], cpu_budget), min(task['io'], io_budget)
+            if cpu_used + cpu > cpu_budget or io_used + io > io_budget:
+                continue
+            if task['check'] is not None:
+                reason = task['check']()
+                if reason is not None:
+                    status[name] = 'skipped'
+                    report('{} skipped ({})'.format(name, reason))
+                    continue
+            log_file = open(os.path.join(log_dir, name + '.log'), 'w') if log_dir is not None else None
+            process = subprocess.Popen(task['command'], stdout=log_file, stderr=subprocess.STDOUT)
+            running[name] = (process, log_file)
+            start_times[name] = time.time()
+            cpu_used += cpu
+            io_used += io
+            status[name] = 'running'
+            report('{} started (cpu {}/{}, io {}/{})'.format(name, cpu_used, cpu_budget, io_used, io_budget))
+        time.sleep(poll_interval if running else 0)
+    report('all tasks finished')
+    return status
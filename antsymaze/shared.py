@@ -0,0 +1,38 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+
+# arrays opened by this process, so every worker process maps each shared array only once
+_opened = {}
+
+# make a temporary directory for shared arrays, in RAM (/dev/shm) when available
+def make_shared_dir(prefix='antsymaze_'):
+    return tempfile.mkdtemp(prefix=prefix, dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+# remove a directory of shared arrays
+def remove_shared_dir(shared_dir):
+    _opened.clear()
+    shutil.rmtree(shared_dir, ignore_errors=True)
+
+# create a file-backed array that worker processes can map without copying
+# returns the array and a small spec (path, shape, dtype) that can be sent to the workers instead of the data
+def create_shared_array(shared_dir, name, shape, dtype, fill_value=None, data=None):
+    path = os.path.join(shared_dir, name + '.npy')
+    array = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+    if data is not None:
+        array[...] = data
+    elif fill_value is not None:
+        array.fill(fill_value)
+    array.flush()
+    return array, {'path': path, 'shape': tuple(shape), 'dtype': np.dtype(dtype).str}
+
+# map a shared array from its spec, read-only unless writable is set
+def open_shared_array(spec, writable=False):
+    key = (spec['path'], writable)
+    # forget the arrays of other (e.g. previous cameras') shared directories so their memory can be released
+    for other in [other for other in _opened.keys() if os.path.dirname(other[0]) != os.path.dirname(spec['path'])]:
+        del _opened[other]
+    if key not in _opened:
+        _opened[key] = np.load(spec['path'], mmap_mode='r+' if writable else 'r')
+    return _opened[key]
@@ -0,0 +1,98 @@
+import numpy as np
+import cv2
+
+# get the waypoint graph of an arena from its endpoints (as written by the mask designers):
+# a Y arena (three endpoints) is three arms joined at the centroid, a linear arena is a single segment
+# returns the node positions (endpoints, then the centroid for a Y arena) and the neighbours of every node
+def arena_graph(endpoints):
+    endpoints = np.asarray(endpoints, dtype=np.float64)
+    if len(endpoints) == 2:
+        return endpoints, [[1], [0]]
+    centroid = endpoints.mean(axis=0)
+    n = len(endpoints)
+    return np.vstack([endpoints, centroid]), [[n] for _ in range(n)] + [list(range(n))]
+
+# simulate an ant walking along the graph of an arena for n_frames frames
+# the ant walks from node to node at about speed pixels per frame (varying from step to step), never turns back at the
+# centroid of a Y arena, and pauses at the ends with probability pause_probability for up to max_pause frames
+# width jitters the path sideways within the arena; returns the (n_frames, 2) positions and (n_frames,) headings
+def simulate_trajectory(endpoints, n_frames, speed=2.0, width=0, pause_probability=0.3, max_pause=60, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    nodes, neighbours = arena_graph(endpoints)
+    n_ends = len(endpoints)
+    positions = np.empty((n_frames, 2))
+    headings = np.zeros(n_frames)
+    previous = current = int(rng.integers(n_ends))
+    position = nodes[current].copy()
+    offset = 0.0
+    frame = 0
+    while frame < n_frames:
+        # choose the next node, never back to the previous one at a junction
+        options = [node for node in neighbours[current] if node != previous or len(neighbours[current]) == 1]
+        target = int(rng.choice(options))
+        # keep a sideways offset along the whole segment so the ant does not always walk the centre line
+        offset = np.clip(offset + rng.normal(0, width/8), -width/4, width/4) if width > 0 else 0.0
+        direction = nodes[target] - nodes[current]
+        length = np.linalg.norm(direction)
+        normal = np.array([-direction[1], direction[0]])/max(length, 1e-9)
+        travelled = 0.0
+        while travelled < length and frame < n_frames:
+            travelled = min(travelled + max(rng.normal(speed, speed/4), 0), length)
+            # fade the offset out at the nodes so the segments join up
+            fade = np.sin(np.pi*travelled/max(length, 1e-9))
+            position = nodes[current] + direction*travelled/max(length, 1e-9) + normal*offset*fade
+            positions[frame] = position
+            headings[frame] = np.arctan2(direction[1], direction[0])
+            frame += 1
+        previous, current = current, target
+        # pause at the end of an arm
+        if current < n_ends and rng.random() < pause_probability:
+            pause = min(int(rng.integers(1, max_pause+1)), n_frames - frame)
+            positions[frame:frame+pause] = position
+            headings[frame:frame+pause] = headings[frame-1]
+            frame += pause
+    return positions, headings
+
+# render one frame: the background scaled by gain (illumination drift), the ants drawn as dark ellipses
+# (length x width pixels, oriented along their heading, with subpixel centres) and gaussian sensor noise
+# background is grayscale, returns a BGR uint8 frame
+def render_frame(background, positions, headings, gain=1.0, ant_size=(12, 6), ant_intensity=30, noise=3.0, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    frame = background.astype(np.float32)*gain
+    shift = 4
+    for (x, y), heading in zip(positions, headings):
+        if np.isnan(x) or np.isnan(y):
+            continue
+        cv2.ellipse(frame, (int(round(x*2**shift)), int(round(y*2**shift))), (int(ant_size[0]/2*2**shift), int(ant_size[1]/2*2**shift)),
+                    np.degrees(heading), 0, 360, float(ant_intensity), -1, cv2.LINE_AA, shift)
+    if noise > 0:
+        frame += rng.normal(0, noise, frame.shape).astype(np.float32)
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+# get the illumination gain of every frame: a slow sinusoidal drift of the given amplitude and period plus flicker
+def illumination_gains(n_frames, amplitude=0.05, period=3000, flicker=0.005, rng=None):
+    rng = np.random.default_rng() if rng is None else rng
+    t = np.arange(n_frames)
+    return 1 + amplitude*np.sin(2*np.pi*t/period + rng.uniform(0, 2*np.pi)) + rng.normal(0, flicker, n_frames)
+
+# compare detected positions with the ground truth on the frames they share
+# returns the per arena detection rate (detected / frames) and the mean, median and 95th percentile error in pixels
+def localization_error(truth_frames, truth_positions, frames, positions):
+    common, truth_index, index = np.intersect1d(truth_frames, frames, return_indices=True)
+    errors = np.linalg.norm(positions[index] - truth_positions[truth_index], axis=2)
+    results = {'n_frames': len(common), 'arenas': []}
+    for i in range(errors.shape[1]):
+        valid = ~np.isnan(errors[:,i])
+        arena_errors = errors[valid,i]
+        results['arenas'].append({
+            'detection_rate': float(valid.mean()) if len(valid) > 0 else float('nan'),
+            'mean_error': float(arena_errors.mean()) if len(arena_errors) > 0 else float('nan'),
+            'median_error': float(np.median(arena_errors)) if len(arena_errors) > 0 else float('nan'),
+            'p95_error': float(np.percentile(arena_errors, 95)) if len(arena_errors) > 0 else float('nan'),
+        })
+    all_errors = errors[~np.isnan(errors)]
+    results['detection_rate'] = float((~np.isnan(errors)).mean()) if errors.size > 0 else float('nan')
+    results['mean_error'] = float(all_errors.mean()) if len(all_errors) > 0 else float('nan')
+    results['median_error'] = float(np.median(all_errors)) if len(all_errors) > 0 else float('nan')
+    return results
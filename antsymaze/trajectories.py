@@ -0,0 +1,43 @@
+import numpy as np
+
+# fill nan values in trajectories with linear interpolation between the last valid value and the next valid value
+# pos can have any shape with time along the first axis, e.g. (n_frames, n_arenas, 2); every other column is filled independently
+# values before the first/after the last valid value are filled with the first/last valid value
+# gaps longer than max_gap samples are left as nan (default: fill all gaps)
+# returns the filled array and a boolean array of the same shape marking the interpolated values
+def fill_gaps(pos, max_gap=None):
+    pos = np.asarray(pos, dtype=np.float64)
+    # nothing to fill (e.g. no frame was decoded)
+    if pos.shape[0] == 0:
+        return pos.copy(), np.zeros(pos.shape, dtype=bool)
+    x = pos.reshape(pos.shape[0], -1)
+    n = x.shape[0]
+    valid = ~np.isnan(x)
+    index = np.arange(n)[:, None]
+    # index of the previous and next valid value for every sample (-1/n if there is none)
+    prev_valid = np.maximum.accumulate(np.where(valid, index, -1), axis=0)
+    next_valid = np.minimum.accumulate(np.where(valid, index, n)[::-1], axis=0)[::-1]
+    has_prev = prev_valid >= 0
+    has_next = next_valid < n
+    fill = ~valid & (has_prev | has_next)
+    if max_gap is not None:
+        # the length of the gap each missing sample belongs to (edge gaps run to -1/n)
+        gap_length = next_valid - prev_valid - 1
+        fill &= gap_length <= max_gap
+    # gather the values on either side of the gap (edges fall back to the only side available)
+    column = np.broadcast_to(np.arange(x.shape[1]), x.shape)
+    left = np.where(has_prev, prev_valid, next_valid)
+    right = np.where(has_next, next_valid, prev_valid)
+    left_value = x[np.clip(left, 0, n-1), column]
+    right_value = x[np.clip(right, 0, n-1), column]
+    # linear interpolation weight of the right value
+    weight = np.divide(index - left, right - left, out=np.zeros(x.shape), where=right != left)
+    filled = np.where(fill, left_value + weight * (right_value - left_value), x)
+    return filled.reshape(pos.shape), fill.reshape(pos.shape)
+
+# project positions onto the proximal -> distal axis of an arena, 0 at proximal and 1 at distal
+# x and y can be scalars or arrays of any shape (same as the analysis notebook's version, but without the angles)
+def project_to_axis(distal, proximal, x, y):
+    axis_x, axis_y = distal[0]-proximal[0], distal[1]-proximal[1]
+    # dot product with the axis, normalized by the squared arena length
+    return ((np.asarray(x)-proximal[0])*axis_x + (np.asarray(y)-proximal[1])*axis_y) / (axis_x**2 + axis_y**2)
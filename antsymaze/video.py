@@ -0,0 +1,262 @@
+import os
+import json
+import cv2
+import numpy as np
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# bytes at the start of the next segment the kernel is asked to read ahead while the current segment is decoded
+PREFETCH_BYTES = 64*1024**2
+
+# a video is either the path of a video file or a virtual video made of segment files played one after the other
+# (see concatenate_videos), with global frame indices running across the segments
+
+# find the video segments of a camera directory (cam_N/1_48/), sorted by their number, without the last one
+# (the one still being recorded)
+def find_segments(cam_dir):
+    files = [file for file in os.listdir(cam_dir) if file.endswith('.mp4')]
+    files = sorted(files, key=lambda x: int(x.split('_')[-1].split('.')[0]))
+    return [os.path.join(cam_dir, file) for file in files[:-1]]
+
+# make a virtual video of segment files: the files, the global index of the first frame of every segment (and the
+# total number of frames), the time of the first frame of every segment, the frame rate and the frame size
+# it is a plain dict so it can be handed to worker processes
+def concatenate_videos(video_files):
+    assert len(video_files) > 0, 'No video files to concatenate'
+    offsets, start_times, shapes, rates = [0], [0.0], [], []
+    for video_file in video_files:
+        cap = cv2.VideoCapture(video_file)
+        assert cap.isOpened(), 'Video file {} cannot be opened'.format(video_file)
+        n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        shapes.append((int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))))
+        rates.append(fps)
+        cap.release()
+        offsets.append(offsets[-1] + n_frames)
+        start_times.append(start_times[-1] + (n_frames/fps if fps > 0 else 0.0))
+    assert len(set(shapes)) == 1, 'Video segments have different frame sizes'
+    return {'files': list(video_files), 'offsets': offsets, 'start_times': start_times[:-1], 'fps': rates[0], 'shape': shapes[0]}
+
+# get the number of frames, the frame rate and the frame size (height, width) of a video
+def video_info(video):
+    if isinstance(video, dict):
+        return video['offsets'][-1], video['fps'], tuple(video['shape'])
+    cap = cv2.VideoCapture(video)
+    info = (int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), cap.get(cv2.CAP_PROP_FPS),
+            (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))))
+    cap.release()
+    return info
+
+# open a video file for decoding from seek_frame
+def open_video(video_file, seek_frame=0):
+    cap = cv2.VideoCapture(video_file)
+    if seek_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, seek_frame)
+    return cap
+
+# ask the kernel to read the start of a file ahead (where posix_fadvise is available)
+def advise_read_ahead(video_file):
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(video_file, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, PREFETCH_BYTES, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+# open the (video file, seek frame) segments one after the other and yield the opened captures
+# the next segment is read ahead and opened in a thread while the current one is decoded
+# the caller releases the captures it gets, the ones opened ahead but not taken are released here
+def prefetch_videos(segments):
+    if len(segments) == 0:
+        return
+    def prefetch(video_file, seek_frame):
+        advise_read_ahead(video_file)
+        return open_video(video_file, seek_frame)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(prefetch, *segments[0])
+        try:
+            for i in range(len(segments)):
+                cap = future.result()
+                future = executor.submit(prefetch, *segments[i+1]) if i+1 < len(segments) else None
+                yield cap
+        finally:
+            if future is not None:
+                future.result().release()
+
+# grab the frames of an opened video from position (the index of the next frame) and yield (frame index, timestamp
+# in s, frame) for every step-th frame in [start_frame, end_frame); skipped frames are only grabbed
+def grab_range(cap, position, start_frame, end_frame, step=1):
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    # grab through to the start of the range
+    for frame_no in range(position, start_frame):
+        if not cap.grab():
+            return
+    for frame_no in range(start_frame, end_frame):
+        if not cap.grab():
+            break
+        if (frame_no - start_frame) % step != 0:
+            continue
+        ret, frame = cap.retrieve()
+        # check if the frame is valid
+        if not ret or frame is None:
+            continue
+        # use the container timestamp when there is one, otherwise the nominal frame rate
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC)/1000
+        if timestamp <= 0 and frame_no > 0 and fps > 0:
+            timestamp = frame_no/fps
+        yield frame_no, timestamp, frame
+
+# read every step-th frame in [start_frame, end_frame) of a video and yield (frame index, timestamp in s, frame)
+# skipped frames are only grabbed (demuxed/decoded without the conversion to a BGR image)
+# seek_frame (<= start_frame, e.g. the keyframe before start_frame) is where decoding starts (default: start_frame)
+# for a virtual video the segments without a frame in the range are never opened, as every segment starts on a keyframe
+def read_frames(video, start_frame=0, end_frame=None, step=1, seek_frame=None):
+    n_frames = video_info(video)[0]
+    end_frame = n_frames if end_frame is None else min(end_frame, n_frames)
+    seek_frame = start_frame if seek_frame is None else min(seek_frame, start_frame)
+    if not isinstance(video, dict):
+        cap = open_video(video, seek_frame)
+        try:
+            yield from grab_range(cap, seek_frame, start_frame, end_frame, step)
+        finally:
+            # release the video
+            cap.release()
+        return
+    offsets, start_times = video['offsets'], video['start_times']
+    segments = []
+    for i, video_file in enumerate(video['files']):
+        # the first frame of the range on the step grid in this segment
+        first_frame = max(start_frame, offsets[i])
+        first_frame = start_frame + -(-(first_frame - start_frame) // step) * step
+        last_frame = min(end_frame, offsets[i+1])
+        if first_frame < last_frame:
+            local_seek = max(seek_frame, offsets[i]) - offsets[i]
+            segments.append((i, local_seek, first_frame - offsets[i], last_frame - offsets[i]))
+    for (i, local_seek, local_start, local_end), cap in zip(segments, prefetch_videos([(video['files'][i], local_seek) for i, local_seek, _, _ in segments])):
+        try:
+            for frame_no, timestamp, frame in grab_range(cap, local_seek, local_start, local_end, step):
+                yield frame_no + offsets[i], timestamp + start_times[i], frame
+        finally:
+            cap.release()
+
+# choose n_samples distinct frame numbers of a video with n_frames frames, sorted, the same for the same seed
+# (all the frames if there are not more than n_samples)
+def sample_frame_numbers(n_frames, n_samples, seed=0):
+    if n_samples >= n_frames:
+        return np.arange(n_frames)
+    return np.sort(np.random.default_rng(seed).choice(n_frames, size=n_samples, replace=False))
+
+# grab the given frames (sorted) of an opened video from its start and yield (frame index, frame)
+# the frames in between are only grabbed; with the keyframe indices, a gap that contains a keyframe is skipped
+# by seeking to the last keyframe before the next frame instead of decoding through it
+def grab_numbers(cap, frame_numbers, keyframes=None):
+    # the index of the frame the next grab returns
+    position = 0
+    last_no, last_frame = None, None
+    for frame_no in frame_numbers:
+        # a frame that was asked for twice
+        if frame_no == last_no:
+            yield frame_no, last_frame
+            continue
+        if keyframes is not None and len(keyframes) > 0:
+            keyframe = keyframes[max(np.searchsorted(keyframes, frame_no, side='right') - 1, 0)]
+            if keyframe > position:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, int(keyframe))
+                position = int(keyframe)
+        # grab through to the frame
+        while position <= frame_no:
+            if not cap.grab():
+                return
+            position += 1
+        ret, frame = cap.retrieve()
+        # check if the frame is valid
+        if not ret or frame is None:
+            continue
+        last_no, last_frame = frame_no, frame
+        yield frame_no, frame
+
+# read the given frames of a video in one forward pass and yield (frame index, frame)
+# the frames in between are only grabbed; with the keyframe indices (see keyframe_indices), a gap that contains a
+# keyframe is skipped by seeking to the last keyframe before the next frame instead of decoding through it
+def read_frame_numbers(video, frame_numbers, keyframes=None):
+    frame_numbers = np.sort(frame_numbers)
+    if not isinstance(video, dict):
+        cap = open_video(video)
+        try:
+            yield from grab_numbers(cap, frame_numbers, keyframes)
+        finally:
+            # release the video
+            cap.release()
+        return
+    offsets = np.asarray(video['offsets'])
+    keyframes = None if keyframes is None else np.asarray(keyframes)
+    # the frames and keyframes of every segment with at least one frame to read, in segment frame indices
+    segments = []
+    for i in range(len(video['files'])):
+        numbers = frame_numbers[(frame_numbers >= offsets[i]) & (frame_numbers < offsets[i+1])] - offsets[i]
+        if len(numbers) > 0:
+            local_keyframes = None if keyframes is None else keyframes[(keyframes >= offsets[i]) & (keyframes < offsets[i+1])] - offsets[i]
+            segments.append((i, numbers, local_keyframes))
+    for (i, numbers, local_keyframes), cap in zip(segments, prefetch_videos([(video['files'][i], 0) for i, _, _ in segments])):
+        try:
+            for frame_no, frame in grab_numbers(cap, numbers, local_keyframes):
+                yield frame_no + offsets[i], frame
+        finally:
+            cap.release()
+
+# get the (presentation order) indices of the keyframes of a video file
+# ffprobe decodes the keyframes only (-skip_frame nokey) and the frame index is the timestamp times the frame rate
+# (the videos have a constant frame rate); returns None if ffprobe is not available or fails
+def file_keyframe_indices(video_file):
+    try:
+        output = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+                                 '-show_entries', 'stream=r_frame_rate,start_time:frame=best_effort_timestamp_time', '-of', 'json', video_file],
+                                capture_output=True, text=True, check=True).stdout
+        info = json.loads(output)
+        numerator, denominator = info['streams'][0]['r_frame_rate'].split('/')
+        fps = int(numerator)/int(denominator)
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError, IndexError, ZeroDivisionError):
+        return None
+    start_time = info['streams'][0].get('start_time', 'N/A')
+    start_time = float(start_time) if start_time != 'N/A' else 0
+    times = [float(frame['best_effort_timestamp_time']) for frame in info.get('frames', []) if frame.get('best_effort_timestamp_time', 'N/A') != 'N/A']
+    if len(times) == 0:
+        return None
+    return np.unique(np.maximum(np.round((np.asarray(times) - start_time)*fps), 0).astype(np.int64))
+
+# get the (presentation order) indices of the keyframes of a video
+# for a virtual video, the keyframes of every segment (at least its first frame) in global frame indices
+# returns None if ffprobe is not available or fails on a video file
+def keyframe_indices(video):
+    if not isinstance(video, dict):
+        return file_keyframe_indices(video)
+    keyframes = []
+    for video_file, offset, end in zip(video['files'], video['offsets'][:-1], video['offsets'][1:]):
+        segment_keyframes = file_keyframe_indices(video_file)
+        segment_keyframes = [0] if segment_keyframes is None else segment_keyframes
+        keyframes.append(np.asarray(segment_keyframes)[np.asarray(segment_keyframes) < end - offset] + offset)
+    return np.unique(np.concatenate(keyframes))
+
+# split [0, n_frames) into chunks of at least chunk_size frames that start on keyframes (or every chunk_size frames
+# if keyframes is None) and return (seek_frame, start_frame, end_frame) for every chunk with at least one frame
+# on the global grid of every skip_frames-th frame
+def plan_chunks(n_frames, chunk_size, skip_frames=1, keyframes=None):
+    if keyframes is None or len(keyframes) == 0:
+        boundaries = list(range(0, n_frames, chunk_size))
+    else:
+        boundaries = [0]
+        for keyframe in keyframes:
+            if keyframe - boundaries[-1] >= chunk_size and keyframe < n_frames:
+                boundaries.append(int(keyframe))
+    boundaries.append(n_frames)
+    chunks = []
+    for seek_frame, end_frame in zip(boundaries[:-1], boundaries[1:]):
+        # the first frame of the chunk on the global skip_frames grid
+        start_frame = int(np.ceil(seek_frame/skip_frames))*skip_frames
+        if start_frame < end_frame:
+            chunks.append((seek_frame, start_frame, end_frame))
+    return chunks
@@ -12,6 +12,8 @@ import matplotlib.pyplot as plt
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from antsymaze.arenas import linear_arena_polygons, rasterize_arenas, save_arena_masks
+
 class MainWindow(QtWidgets.QMainWindow):
 
     ## MAIN WINDOW DESIGN
@@ -489,40 +491,13 @@ class MainWindow(QtWidgets.QMainWindow):
             width = self.image.width()
             height = self.image.height()
 
-            # create an empty dictionary of masks
-            masks = {}
+            # get the rectangle of every arena from the endpoints
+            polygons = [linear_arena_polygons(arena, self.arena_width) for arena in self.labelled_endpoints]
+            # rasterize all the arenas into a single label image
+            labels = rasterize_arenas(polygons, (height, width))
+            # add the arenas to the merged mask (red channel)
             merged = np.zeros((height, width, 4), dtype=np.uint8) # 4 channels: RGBA
-            
-
-            # draw a rectangle for each arena from the endpoints
-            for arena in self.labelled_endpoints:
-                # get the endpoints
-                x1, y1 = arena[0]
-                x2, y2 = arena[1]
-                # define the 4 corners of the rectangle using the width//2 perpendicular to the line joining the endpoints
-                # get the angle of the line joining the endpoints
-                angle = np.arctan2(y2-y1, x2-x1)
-                # get the perpendicular angle
-                perp_angle = angle + np.pi/2
-                # get the x and y offsets
-                x_offset = self.arena_width//2 * np.cos(perp_angle)
-                y_offset = self.arena_width//2 * np.sin(perp_angle)
-                # get the 4 corners
-                c1 = (int(x1+x_offset), int(y1+y_offset))
-                c2 = (int(x1-x_offset), int(y1-y_offset))
-                c3 = (int(x2-x_offset), int(y2-y_offset))
-                c4 = (int(x2+x_offset), int(y2+y_offset))
-                # create a path
-                path = Path([c1, c2, c3, c4])
-                # fill the path
-                x, y = np.mgrid[:width, :height]
-                points = np.transpose((x.ravel(), y.ravel()))
-                grid = path.contains_points(points)
-                grid = grid.reshape(x.shape)
-                # add the grid to the masks
-                masks[f"arena_{len(masks)+1}"] = grid.astype(np.uint8).T*255
-                # add the grid to the merged mask (red channel)
-                merged[:,:,0] += grid.astype(np.uint8).T*255
+            merged[:,:,0] = (labels != 0).astype(np.uint8)*255
 
             # make the merged mask image
             merged_image = Image.fromarray(merged) 
@@ -576,24 +551,8 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.n_pois > 0:
             self.instructionsTextBox.setText("Checking if the POIs are inside the arenas...")
             for i, arena in enumerate(self.labelled_endpoints):
-                # get the endpoints
-                x1, y1 = arena[0]
-                x2, y2 = arena[1]
-                # define the 4 corners of the rectangle using the width//2 perpendicular to the line joining the endpoints
-                # get the angle of the line joining the endpoints
-                angle = np.arctan2(y2-y1, x2-x1)
-                # get the perpendicular angle
-                perp_angle = angle + np.pi/2
-                # get the x and y offsets
-                x_offset = self.arena_width//2 * np.cos(perp_angle)
-                y_offset = self.arena_width//2 * np.sin(perp_angle)
-                # get the 4 corners
-                c1 = (int(x1+x_offset), int(y1+y_offset))
-                c2 = (int(x1-x_offset), int(y1-y_offset))
-                c3 = (int(x2-x_offset), int(y2-y_offset))
-                c4 = (int(x2+x_offset), int(y2+y_offset))
-                # create a path
-                path = Path([c1, c2, c3, c4])
+                # create a path for the arena
+                path = Path(linear_arena_polygons(arena, self.arena_width)[0])
                 # loop through the pois
                 to_pop = []
                 if len(self.labelled_pois[i])>0:
@@ -611,11 +570,9 @@ class MainWindow(QtWidgets.QMainWindow):
                     for j in to_pop[::-1]:
                         self.labelled_pois[i].pop(j)
 
-        # save the masks as a json file
+        # save the masks as a compressed label image along with the arena polygons
         self.instructionsTextBox.setText("Saving the masks...")
-        masks = {k: v.tolist() for k, v in masks.items()}
-        with open(os.path.dirname(self.backgroundTextBox.text()) + "/{}_masks.json".format(os.path.basename(self.backgroundTextBox.text()).split(".")[0]), "w") as f:
-            json.dump(masks, f)
+        save_arena_masks(os.path.dirname(self.backgroundTextBox.text()) + "/{}_masks.npz".format(os.path.basename(self.backgroundTextBox.text()).split(".")[0]), labels, polygons)
 
         # save the endpoints as a json file
         self.instructionsTextBox.setText("Saving the endpoints...")
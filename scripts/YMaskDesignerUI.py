@@ -12,6 +12,8 @@ import matplotlib.pyplot as plt
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from antsymaze.arenas import y_arena_polygons, rasterize_arenas, save_arena_masks
+
 class MainWindow(QtWidgets.QMainWindow):
 
     ## MAIN WINDOW DESIGN
@@ -496,56 +498,13 @@ class MainWindow(QtWidgets.QMainWindow):
             width = self.image.width()
             height = self.image.height()
 
-            # create an empty dictionary of masks
-            masks = {}
+            # get the pentagons of every arm of every arena from the endpoints
+            polygons = [y_arena_polygons(arena, self.arena_width) for arena in self.labelled_endpoints]
+            # rasterize all the arenas into a single label image
+            labels = rasterize_arenas(polygons, (height, width))
+            # add the arenas to the merged mask (red channel)
             merged = np.zeros((height, width, 4), dtype=np.uint8) # 4 channels: RGBA
-            
-
-            # draw a rectangle for each arena from the endpoints
-            for arena in self.labelled_endpoints:
-                # # get the endpoints
-                # x1, y1 = arena[0]
-                # x2, y2 = arena[1]
-                # x3, y3 = arena[2]
-                # get the centroid
-                centroid = np.mean(arena, axis=0)
-                # define the 4 corners of the rectangle using the width//2 perpendicular to the line joining ech endpoint to the centroid
-                arena_arm_masks = []
-                # loop through the endpoints
-                for endpoint in arena:
-                    # get the angle of the line joining the endpoint and the centroid
-                    angle = np.arctan2(centroid[1]-endpoint[1], centroid[0]-endpoint[0])
-                    # get the perpendicular angle
-                    perp_angle = angle + np.pi/2
-                    # get the x and y offsets
-                    x_offset = self.arena_width//2 * np.cos(perp_angle)
-                    y_offset = self.arena_width//2 * np.sin(perp_angle)
-                    # get the corners of the pentagon (rectangl + centroid)
-                    c1 = (int(endpoint[0]+x_offset), int(endpoint[1]+y_offset))
-                    c2 = (int(endpoint[0]-x_offset), int(endpoint[1]-y_offset))
-                    c3 = (int(centroid[0]-x_offset), int(centroid[1]-y_offset))
-                    # centroid is the 4th corner
-                    c4 = (int(centroid[0]), int(centroid[1]))
-                    # the fifth corner is the last corner of the rectangle
-                    c5 = (int(centroid[0]+x_offset), int(centroid[1]+y_offset))
-                    # create a path
-                    path = Path([c1, c2, c3, c4, c5])
-                    # fill the path
-                    x, y = np.mgrid[:width, :height]
-                    points = np.transpose((x.ravel(), y.ravel()))
-                    grid = path.contains_points(points)
-                    grid = grid.reshape(x.shape)
-                    # add the grid to the masks
-                    arena_arm_masks.append(grid.astype(np.uint8).T*255)
-                # merge all the arena arm masks into one mask
-                arena_mask = np.zeros((height, width), dtype=np.uint8)
-                for arm_mask in arena_arm_masks:
-                    # add only where there is no overlap
-                    arena_mask += arm_mask * (arena_mask==0)
-                # add the arena mask to the masks
-                masks[f"arena_{len(masks)+1}"] = arena_mask
-                # add the arena mask to the merged mask (red channel)
-                merged[:,:,0] += arena_mask
+            merged[:,:,0] = (labels != 0).astype(np.uint8)*255
 
             # make the merged mask image
             merged_image = Image.fromarray(merged) 
@@ -600,28 +559,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.instructionsTextBox.setText("Checking if the POIs are inside the arenas...")
             for i, arena in enumerate(self.labelled_endpoints):
                 # create all the paths for the arena
-                paths = []
-                centroid = np.mean(arena, axis=0)
-                # loop through the endpoints
-                for endpoint in arena:
-                    # get the angle of the line joining the endpoint and the centroid
-                    angle = np.arctan2(centroid[1]-endpoint[1], centroid[0]-endpoint[0])
-                    # get the perpendicular angle
-                    perp_angle = angle + np.pi/2
-                    # get the x and y offsets
-                    x_offset = self.arena_width//2 * np.cos(perp_angle)
-                    y_offset = self.arena_width//2 * np.sin(perp_angle)
-                    # get the corners of the pentagon (rectangl + centroid)
-                    c1 = (int(endpoint[0]+x_offset), int(endpoint[1]+y_offset))
-                    c2 = (int(endpoint[0]-x_offset), int(endpoint[1]-y_offset))
-                    c3 = (int(centroid[0]-x_offset), int(centroid[1]-y_offset))
-                    # centroid is the 4th corner
-                    c4 = (int(centroid[0]), int(centroid[1]))
-                    # the fifth corner is the last corner of the rectangle
-                    c5 = (int(centroid[0]+x_offset), int(centroid[1]+y_offset))
-                    # create a path
-                    path = Path([c1, c2, c3, c4, c5])
-                    paths.append(path)
+                paths = [Path(polygon) for polygon in y_arena_polygons(arena, self.arena_width)]
 
                 # loop through the pois
                 to_pop = []
@@ -640,11 +578,9 @@ class MainWindow(QtWidgets.QMainWindow):
                     for j in to_pop[::-1]:
                         self.labelled_pois[i].pop(j)
 
-        # save the masks as a json file
+        # save the masks as a compressed label image along with the arena polygons
         self.instructionsTextBox.setText("Saving the masks...")
-        masks = {k: v.tolist() for k, v in masks.items()}
-        with open(os.path.dirname(self.backgroundTextBox.text()) + "/{}_masks.json".format(os.path.basename(self.backgroundTextBox.text()).split(".")[0]), "w") as f:
-            json.dump(masks, f)
+        save_arena_masks(os.path.dirname(self.backgroundTextBox.text()) + "/{}_masks.npz".format(os.path.basename(self.backgroundTextBox.text()).split(".")[0]), labels, polygons)
 
         # save the endpoints as a json file
         self.instructionsTextBox.setText("Saving the endpoints...")
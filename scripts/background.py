@@ -1,11 +1,20 @@
 import argparse
 import os
+import sys
+import time
+import traceback
+import threading
+import multiprocessing
 import numpy as np
 import json
 import matplotlib.pyplot as plt
 import os
 from tqdm import tqdm
 import cv2
+from joblib import Parallel, delayed
+from antsymaze.background import streaming_median
+from antsymaze.video import find_segments, concatenate_videos, video_info, sample_frame_numbers, read_frame_numbers, keyframe_indices
+from antsymaze.manifest import stage_key, load_manifest, is_up_to_date, record_stage, invalidate_stage
 
 start_string = """
 WELCOME TO THE BACKGROUND CALCULATION SCRIPT
@@ -20,8 +29,15 @@ parser.add_argument('-d', '--data_dir', type=str, default='./data/', help='Path
 parser.add_argument('-o', '--output_dir', type=str, default='./processed_data/', help='Path to the output directory (default: processed_data)')
 parser.add_argument('-m', '--mode', type=str, default='random', help='Mode for background calculation (random/full) (default: random)')
 parser.add_argument('-r', '--random_frames', type=int, default=100, help='Number of random frames to use for background calculation (default: 100)')
+parser.add_argument('-sd', '--seed', type=int, default=0, help='Random seed of the random frames (default: 0)')
 parser.add_argument('-x', '--overwrite', type=bool, default=False, help='Overwrite existing background files (default: False)')
 parser.add_argument('-exp', '--experiment', type=str, default='experiment', help='Experiment name (default: experiment)')
+parser.add_argument('-cam', '--cameras', type=int, nargs='+', default=None, help='Camera numbers to process (default: all cameras)')
+parser.add_argument('-mem', '--memory', type=int, default=1024, help='Memory for the frames or the pixel histograms of the background median in MB (default: 1024)')
+parser.add_argument('-src', '--source', type=str, default='merged', help='Video to read: the merged video or the video files directly without merging them (merged/segments) (default: merged)')
+parser.add_argument('-n', '--n_jobs', type=int, default=1, help='Number of cameras processed at the same time (default: 1)')
+parser.add_argument('-mj', '--merge_jobs', type=int, default=1, help='Number of ffmpeg merges running at the same time (default: 1)')
+parser.add_argument('-st', '--stage', type=str, default='all', help='Stage to run (merge/background/all) (default: all)')
 
 # Parse the arguments
 args = parser.parse_args()
@@ -29,9 +45,35 @@ data_dir = args.data_dir
 original_output_dir = args.output_dir
 mode = args.mode
 n_random_frames = args.random_frames
+seed = args.seed
 overwrite = args.overwrite
 experiment = args.experiment
+cameras = args.cameras
+stage = args.stage
+memory = args.memory
+source = args.source
+n_jobs = args.n_jobs
+merge_jobs = args.merge_jobs
+assert n_jobs>0 and merge_jobs>0, 'Number of jobs and merge jobs must be greater than 0'
+assert source in ['merged', 'segments'], 'Source {} is not valid'.format(source)
+assert stage in ['merge', 'background', 'all'], 'Stage {} is not valid'.format(stage)
 
+## FUNCTIONS
+
+# read the given frames (sorted frame numbers) of a video in one forward pass as grayscale images
+def read_gray_frames(video, frame_numbers, keyframes=None, description=None):
+    for FRAME_NO, frame in tqdm(read_frame_numbers(video, frame_numbers, keyframes), total=len(frame_numbers), desc=description):
+        yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+# keep the frames whose mean difference to the next frame is greater than 76 (the last frame is dropped)
+def changed_frames(frames):
+    previous = None
+    for frame in frames:
+        if previous is not None and np.mean(np.abs(previous - frame)) > 76:
+            yield previous
+        previous = frame
+
+### MAIN SCRIPT
 # find the data
 data_files = os.listdir(data_dir)
 experiment_files = [file for file in data_files if experiment in file]
@@ -61,139 +103,142 @@ experiment_dirs = [dir for dir in experiment_dirs if 'cam' in dir]
 num_cams = len(experiment_dirs)
 print('Number of cameras: {}'.format(num_cams))
 
-# loop through the cameras and find the video files
-for CAM_NO in range(0, num_cams):
+# merge the video files and compute the background of one camera
+# merge_slots is a semaphore that caps the number of ffmpeg merges running at the same time
+# returns the outcome (merged/up to date/done)
+def process_camera(CAM_NO, merge_slots):
+    # prefix the messages with the camera, as cameras can be processed at the same time
+    log = lambda message: print('Camera {}: {}'.format(CAM_NO, message), flush=True)
     # GET THE VIDEO FILE NAMES
     cam_dir = experiment_dir + [dir for dir in experiment_dirs if 'cam_{}'.format(CAM_NO) in dir][0] + '/1_48/'
-    print('Camera {} directory: {}'.format(CAM_NO, cam_dir))
-    cam_files = os.listdir(cam_dir)
-    # filter out the non-video files
-    cam_files = [file for file in cam_files if file.endswith('.mp4')]
-    # sort the files by their number and drop the last file (incomplete)
-    cam_files = sorted(cam_files, key=lambda x: int(x.split('_')[-1].split('.')[0]))
-    cam_files = cam_files[:-1]
-    print('Number of video files: {}'.format(len(cam_files)))
+    log('Directory: {}'.format(cam_dir))
+    # the video files sorted by their number without the last file (incomplete)
+    video_files = find_segments(cam_dir)
+    cam_files = [os.path.basename(file) for file in video_files]
+    log('Number of video files: {}'.format(len(cam_files)))
 
     # MERGE THE VIDEO FILES USING FFMPEG 
     # create the temp directory
     output_dir = original_output_dir + '{}/'.format(cam_dir.split('/')[-4])
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
-
-    # create a list of the video files
-    video_files = []
-    for file in cam_files:
-        video_files.append(cam_dir + file)
-    # create the ffmpeg command
-    ffmpeg_command = 'ffmpeg -f concat -safe 0 -i {} -c copy {}cam{}_merged.mp4'.format(output_dir + 'files.txt', output_dir, CAM_NO)
-    # create the files.txt file
-    with open(output_dir + 'files.txt', 'w') as f:
-        for file in video_files:
-            f.write("file '{}'\n".format(file))
-    # check if the file already exists
-    if os.path.exists(output_dir + 'cam{}_merged.mp4'.format(CAM_NO)):
-        if overwrite:
-            print('Merged video file already exists. Overwriting...')
-            os.remove(output_dir + 'cam{}_merged.mp4'.format(CAM_NO))
-            # run the ffmpeg command
-            os.system(ffmpeg_command)
-            # remove the files.txt file
-            os.remove(output_dir + 'files.txt')
+    os.makedirs(output_dir, exist_ok=True)
+
+    # the manifest records the hashes of the inputs and parameters of every stage, to skip the ones that did not change
+    manifest_file = output_dir + 'cam{}_manifest.json'.format(CAM_NO)
+    merged_file = output_dir + 'cam{}_merged.mp4'.format(CAM_NO)
+
+    # merge unless only the background is computed (from an existing merged video) or the segments are read directly
+    if stage != 'background' and source == 'segments':
+        log('Reading the video files directly. Nothing to merge...')
+    elif stage != 'background':
+        # check if the same video files were already merged
+        merge_key = stage_key(video_files, {'files': cam_files})
+        if is_up_to_date(manifest_file, 'merge', merge_key) and not overwrite:
+            log('Merged video file is up to date. Skipping...')
+        elif os.path.exists(merged_file) and 'merge' not in load_manifest(manifest_file) and not overwrite:
+            # a merged video from before the manifest existed has no parameters to go stale, adopt it
+            log('Merged video file already exists. Recording it in the manifest...')
+            record_stage(manifest_file, 'merge', merge_key, [merged_file], {'files': cam_files})
         else:
-            print('Merged video file already exists. Skipping...')
-            os.remove(output_dir + 'files.txt')
+            if os.path.exists(merged_file):
+                log('Merged video file is out of date or overwritten. Merging again...')
+                os.remove(merged_file)
+            else:
+                log('Merging video files...')
+            invalidate_stage(manifest_file, 'merge')
+            # create the ffmpeg command (one file list per camera, as cameras can be merged at the same time)
+            files_list = output_dir + 'cam{}_files.txt'.format(CAM_NO)
+            ffmpeg_command = 'ffmpeg -f concat -safe 0 -i {} -c copy {}'.format(files_list, merged_file)
+            # create the files.txt file
+            with open(files_list, 'w') as f:
+                for file in video_files:
+                    f.write("file '{}'\n".format(file))
+            # run the ffmpeg command when a merge slot is free, so the merges do not saturate the source disk
+            with merge_slots:
+                status = os.system(ffmpeg_command)
+            # remove the files.txt file
+            os.remove(files_list)
+            assert status == 0 and os.path.exists(merged_file), 'Merging the video files failed'
+            record_stage(manifest_file, 'merge', merge_key, [merged_file], {'files': cam_files})
+
+    # stop here if only merging
+    if stage == 'merge':
+        return 'merged'
+
+    # read the merged video, or the video files as one virtual video with the same frame numbers
+    if source == 'merged':
+        assert os.path.exists(merged_file), 'No merged video file found'
+        video, video_inputs = merged_file, [merged_file]
     else:
-        print('Merging video files...')
-        # run the ffmpeg command
-        os.system(ffmpeg_command)
-        # remove the files.txt file
-        os.remove(output_dir + 'files.txt')    
+        assert len(video_files) > 0, 'No video files found'
+        video, video_inputs = concatenate_videos(video_files), video_files
+    # check if the background was already computed from the same video with the same parameters
+    background_params = {'mode': mode, 'random_frames': n_random_frames, 'seed': seed}
+    background_key = stage_key(video_inputs, background_params)
+    background_files = [output_dir + 'cam{}_background.npy'.format(CAM_NO), output_dir + 'cam{}_background.png'.format(CAM_NO)]
+    if is_up_to_date(manifest_file, 'background', background_key) and not overwrite:
+        log('Background is up to date. Skipping...')
+        return 'up to date'
+    invalidate_stage(manifest_file, 'background')
 
-    frames = []
+    # get the number of frames and the frame size
+    num_frames, _, shape = video_info(video)
     # check mode
     if mode == 'random':
         # GET THE RANDOM FRAMES
-        # open the video file
-        cap = cv2.VideoCapture(output_dir + 'cam{}_merged.mp4'.format(CAM_NO))
-        # get the number of frames
-        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        # get the random frames
-        random_frames = np.random.randint(0, num_frames, size=n_random_frames)
-        random_frames = np.sort(random_frames)
-        # loop through the random frames
-        for FRAME_NO in tqdm(random_frames):
-            # read the frame
-            cap.set(cv2.CAP_PROP_POS_FRAMES, FRAME_NO)
-            ret, frame = cap.read()
-            # check if the frame is valid
-            if ret:
-                # convert to grayscale
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                # convert to numpy array
-                frame = np.array(frame, dtype=np.uint8)
-                # append to frames
-                frames.append(frame)
-            else:
-                Exception('Frame {} is not valid'.format(FRAME_NO))
-        # release the video
-        cap.release()
+        # the same frames for the same seed, read in one forward pass (seeking only to keyframes across long gaps)
+        random_frames = sample_frame_numbers(num_frames, n_random_frames, seed)
+        keyframes = keyframe_indices(video)
+        # with no keyframe past the start of the video files (e.g. without ffprobe) there is nothing to seek to and
+        # every frame up to the last random frame is decoded
+        if keyframes is None or len(keyframes) <= (len(video['files']) if isinstance(video, dict) else 1):
+            log('Warning: no keyframes found (is ffprobe installed?), reading the random frames decodes the whole video')
+        read_frames = lambda: read_gray_frames(video, random_frames, keyframes, 'Camera {}'.format(CAM_NO))
+        n_frames = len(random_frames)
     elif mode == 'full':
         # LOOP THROUGH THE VIDEO AND GET ALL THE FRAMES
-        # open the video file
-        cap = cv2.VideoCapture(output_dir + 'merged_cam{}.mp4'.format(CAM_NO))
-        # get the number of frames
-        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        # MAKE SURE THE MEMORY IS BIG ENOUGH
-        # get the memory size
-        mem_size = os.popen('free -m').readlines()[1].split()[1]
-        # get the n_pixels in each frame
-        frame_size = cap.get(cv2.CAP_PROP_FRAME_WIDTH) * cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
-        # assuming datatype is uint8, get the number of bytes per frame
-        frame_size = frame_size * 8 / 1024 / 1024
-        # get the number of frames that can fit in the memory
-        n_frames = int(mem_size / frame_size)
-        # check if the number of frames is greater than the number of frames in the video
-        if n_frames > num_frames:
-            Exception('Memory size is too small to fit the video')
-        # get the number of frames to skip
-        skip_frames = int(num_frames / n_frames) if int(num_frames / n_frames) > 0 else 1
-        # loop through the frames
-        for FRAME_NO in tqdm(range(0, num_frames, skip_frames)):
-            # read the frame
-            cap.set(cv2.CAP_PROP_POS_FRAMES, FRAME_NO)
-            ret, frame = cap.read()
-            # check if the frame is valid
-            if ret:
-                # convert to grayscale
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                # convert to numpy array
-                frame = np.array(frame, dtype=np.uint8)
-                # append to frames
-                frames.append(frame)
-            else:
-                Exception('Frame {} is not valid'.format(FRAME_NO))
-        # release the video
-        cap.release()
+        read_frames = lambda: read_gray_frames(video, np.arange(num_frames), description='Camera {}'.format(CAM_NO))
+        n_frames = num_frames
     else:
-        Exception('Mode {} is not valid'.format(mode))
+        raise Exception('Mode {} is not valid'.format(mode))
 
     # CALCULATE THE BACKGROUND
-    # calculate the mean difference between each frame and the next frame
-    mean_diff = []
-    for i in range(len(frames)-1):
-        mean_diff.append(np.mean(np.abs(frames[i] - frames[i+1])))
-    # keep only frames with a mean difference greater than 76
-    frames = [frames[i] for i in range(len(frames)-1) if mean_diff[i] > 76]
-    # convert to numpy array
-    frames = np.array(frames)
-    # calculate the background
-    background = np.median(frames, axis=0)
+    # the exact median of the frames, in memory if they fit or from per pixel histograms in two passes otherwise
+    background, n_used = streaming_median(lambda: changed_frames(read_frames()), shape, n_frames, memory)
+    if background is None:
+        log('No frame changed enough from the next one. Using all the frames...')
+        background, n_used = streaming_median(read_frames, shape, n_frames, memory)
+    assert background is not None, 'No valid frames found'
+    log('Background computed from {} frames'.format(n_used))
     # save the background
     np.save(output_dir + 'cam{}_background.npy'.format(CAM_NO), background)
     # save the background as an image
     cv2.imwrite(output_dir + 'cam{}_background.png'.format(CAM_NO), background)
+    record_stage(manifest_file, 'background', background_key, background_files, background_params)
+    return 'done'
 
+# process a camera and report a failure instead of raising it, so the other cameras carry on
+def run_camera(CAM_NO, merge_slots):
+    start_time = time.time()
+    try:
+        outcome = process_camera(CAM_NO, merge_slots)
+    except Exception as error:
+        traceback.print_exc()
+        return CAM_NO, 'failed', '{}: {}'.format(type(error).__name__, error), time.time()-start_time
+    return CAM_NO, outcome, '', time.time()-start_time
 
+# the selected cameras
+CAM_NOs = [CAM_NO for CAM_NO in range(0, num_cams) if cameras is None or CAM_NO in cameras]
+# process the cameras side by side, a manager semaphore is shared with the worker processes
+if n_jobs > 1 and len(CAM_NOs) > 1:
+    merge_slots = multiprocessing.Manager().Semaphore(merge_jobs)
+else:
+    merge_slots = threading.Semaphore(merge_jobs)
+print('Processing {} cameras with {} jobs and {} concurrent merges'.format(len(CAM_NOs), n_jobs, merge_jobs))
+results = Parallel(n_jobs=min(n_jobs, max(len(CAM_NOs), 1)), batch_size=1)(delayed(run_camera)(CAM_NO, merge_slots) for CAM_NO in CAM_NOs)
 
-
-
+# summarize the results
+print('\nSummary:')
+for CAM_NO, outcome, message, elapsed in results:
+    print('Camera {}: {} in {:.1f}s{}'.format(CAM_NO, outcome, elapsed, ' ({})'.format(message) if message else ''))
+if any(outcome == 'failed' for _, outcome, _, _ in results):
+    sys.exit(1)
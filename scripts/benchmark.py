@@ -0,0 +1,229 @@
+import argparse
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import functools
+import numpy as np
+import cv2
+from antsymaze.arenas import y_arena_polygons, linear_arena_polygons, rasterize_arenas
+from antsymaze.background import N_BINS, count_dtype, frames_fit, streaming_median
+from antsymaze.localization import prepare_background, get_ant_locations, make_localizer, allocate_buffers, make_frame_locator
+from antsymaze.trajectories import fill_gaps, project_to_axis
+from antsymaze.synthetic import simulate_trajectory, render_frame
+
+start_string = """
+WELCOME TO THE BENCHMARK SCRIPT
+---------------------------------------------
+This script will time the numeric kernels of the pipeline on synthetic inputs and compare them with a baseline
+"""
+print(start_string)
+
+# Get the arguments
+parser = argparse.ArgumentParser(description='Benchmarks')
+parser.add_argument('-s', '--sizes', type=str, default='quick', help='Input sizes (quick: 1080p, 8 arenas, 10^5 samples / full: 1080p-4K, 8-32 arenas, 10^5-10^7 samples) (default: quick)')
+parser.add_argument('-k', '--filter', type=str, default='', help='Only run the benchmarks whose name contains this string (default: all)')
+parser.add_argument('-r', '--repeats', type=int, default=5, help='Number of timed repeats of every benchmark (default: 5)')
+parser.add_argument('-o', '--output', type=str, default='benchmark.json', help='Path to the results json file (default: benchmark.json)')
+parser.add_argument('-c', '--compare', type=str, default='', help='Path to a baseline results json file to compare with (default: no comparison)')
+parser.add_argument('-t', '--tolerance', type=float, default=0.1, help='Relative slowdown of the median time reported as a regression (default: 0.1)')
+
+# Parse the arguments
+args = parser.parse_args()
+sizes = args.sizes
+assert sizes in ['quick', 'full'], 'Sizes {} is not valid'.format(sizes)
+name_filter = args.filter
+repeats = args.repeats
+assert repeats>0, 'Number of repeats must be greater than 0'
+output = args.output
+compare = args.compare
+tolerance = args.tolerance
+
+# input sizes: (frame height, frame width), number of arenas, number of trajectory samples, number of background frames
+SIZES = {
+    'quick': {'frames': [(1080, 1920)], 'arenas': [8], 'samples': [10**5], 'background_frames': [20]},
+    'full': {'frames': [(1080, 1920), (2160, 3840)], 'arenas': [8, 32], 'samples': [10**5, 10**6, 10**7], 'background_frames': [100]},
+}[sizes]
+
+## FUNCTIONS
+
+# make linear and Y arena endpoints spread over a frame
+def make_endpoints(shape, n_arenas, kind='linear'):
+    height, width = shape
+    spacing = width/n_arenas
+    endpoints = []
+    for i in range(n_arenas):
+        x = spacing*(i+0.5)
+        if kind == 'linear':
+            endpoints.append([(int(x), int(0.1*height)), (int(x), int(0.9*height))])
+        else:
+            endpoints.append([(int(x), int(0.1*height)), (int(x-spacing/3), int(0.9*height)), (int(x+spacing/3), int(0.9*height))])
+    return endpoints, max(int(spacing/4), 4)
+
+# make a background, the masks and a frame with one ant in every arena
+# the inputs are cached for the benchmarks that follow on the same input (one input at a time, so the full sizes fit)
+@functools.lru_cache(maxsize=1)
+def make_scene(shape, n_arenas, seed=0):
+    rng = np.random.default_rng(seed)
+    background = cv2.GaussianBlur(rng.integers(150, 220, shape, dtype=np.uint8), (31, 31), 0)
+    endpoints, width = make_endpoints(shape, n_arenas)
+    labels = rasterize_arenas([linear_arena_polygons(arena, width) for arena in endpoints], shape)
+    positions = np.array([simulate_trajectory(arena, 1, rng=rng)[0][0] for arena in endpoints])
+    frame = render_frame(background, positions, np.full(n_arenas, np.pi/2), ant_size=(20, 10), rng=rng)
+    return background, labels, frame
+
+# make random background frames
+@functools.lru_cache(maxsize=1)
+def make_frames(shape, n_frames, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (n_frames,) + shape, dtype=np.uint8)
+
+# make trajectories with 10% missing samples in gaps of up to 50 samples
+@functools.lru_cache(maxsize=1)
+def make_trajectories(n_samples, n_arenas, seed=0):
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, 1000, (n_samples, n_arenas, 2))
+    n_gaps = n_samples*n_arenas//250
+    starts = rng.integers(0, n_samples, n_gaps)
+    lengths = rng.integers(1, 50, n_gaps)
+    arenas = rng.integers(0, n_arenas, n_gaps)
+    for start, length, arena in zip(starts, lengths, arenas):
+        pos[start:start+length, arena] = np.nan
+    return pos
+
+# the fillna of the original detection script, kept to time it against the vectorized fill_gaps
+# fills one column in place: edges with the first/last valid value, gaps with a linear interpolation
+def baseline_fillna(x):
+    if np.isnan(x).sum()==len(x):
+        return x
+    first_valid = np.where(~np.isnan(x))[0][0]
+    x[:first_valid] = x[first_valid]
+    last_valid = np.where(~np.isnan(x))[0][-1]
+    x[last_valid:] = x[last_valid]
+    i = first_valid + 1
+    while i<last_valid:
+        if np.isnan(x[i]):
+            next_valid = np.where(~np.isnan(x[i:]))[0][0] + i
+            prev_valid = np.where(~np.isnan(x[:i]))[0][-1]
+            x[i:next_valid] = np.linspace(x[prev_valid], x[next_valid], next_valid-prev_valid+1)[1:-1]
+            i = next_valid+1
+        else:
+            i += 1
+    return x
+
+# the per sample projection of the analysis notebook, kept to time it against the vectorized project_to_axis
+def notebook_project_to_axis(distal, proximal, x, y):
+    theta = np.arctan2(distal[1]-proximal[1], distal[0]-proximal[0])
+    phi = np.arctan2(y-proximal[1], x-proximal[0])
+    d = np.sqrt((x-proximal[0])**2 + (y-proximal[1])**2)
+    return d*np.cos(phi-theta) / np.sqrt((distal[0]-proximal[0])**2 + (distal[1]-proximal[1])**2)
+
+# time a function: one warm up call, then repeats timed calls; returns the times in seconds
+def time_function(function, repeats):
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+# the benchmarks of the frame kernels on a scene
+def scene_benchmark(shape, n_arenas, mode=None):
+    background, labels, frame = make_scene(shape, n_arenas)
+    threshold = prepare_background(background)
+    if mode is None:
+        buffers, localizer = allocate_buffers(shape), make_localizer('blob')
+        return lambda: get_ant_locations(frame, threshold, labels, n_arenas, buffers, localizer)
+    locate_frame = make_frame_locator(mode, threshold, labels, n_arenas)
+    return lambda: locate_frame(frame)
+
+# build the benchmarks: name -> (setup, number of items per call, unit of the items)
+# setup builds the inputs and returns the timed function, so only the inputs of the selected benchmarks are built
+def make_benchmarks():
+    benchmarks = {}
+    for shape in SIZES['frames']:
+        for n_arenas in SIZES['arenas']:
+            size = '{}p_{}arenas'.format(shape[0], n_arenas)
+            benchmarks['get_ant_locations[{}]'.format(size)] = (lambda shape=shape, n_arenas=n_arenas: scene_benchmark(shape, n_arenas), 1, 'frames')
+            for mode in ['blob', 'components', 'moments']:
+                benchmarks['frame_locator_{}[{}]'.format(mode, size)] = (lambda shape=shape, n_arenas=n_arenas, mode=mode: scene_benchmark(shape, n_arenas, mode), 1, 'frames')
+            # the geometry and rasterization of the mask designers' generate_masks
+            for kind, arena_polygons in [('linear', linear_arena_polygons), ('y', y_arena_polygons)]:
+                endpoints, width = make_endpoints(shape, n_arenas, kind)
+                benchmarks['generate_masks_{}[{}]'.format(kind, size)] = (lambda endpoints=endpoints, width=width, shape=shape, arena_polygons=arena_polygons:
+                                                                            lambda: rasterize_arenas([arena_polygons(arena, width) for arena in endpoints], shape), n_arenas, 'arenas')
+        for n_frames in SIZES['background_frames']:
+            size = '{}p_{}frames'.format(shape[0], n_frames)
+            benchmarks['background_median[{}]'.format(size)] = (lambda shape=shape, n_frames=n_frames:
+                                                                lambda frames=make_frames(shape, n_frames): np.median(frames, axis=0), n_frames, 'frames')
+            benchmarks['background_streaming_median[{}]'.format(size)] = (lambda shape=shape, n_frames=n_frames:
+                                                                          lambda frames=make_frames(shape, n_frames): streaming_median(lambda: iter(frames), shape, n_frames, verbose=False), n_frames, 'frames')
+            # the two pass histograms used when the frames do not fit in the memory budget (a budget of just the histograms)
+            memory_mb = 2*N_BINS*shape[0]*shape[1]*np.dtype(count_dtype(n_frames)).itemsize/1024**2
+            if not frames_fit(shape, n_frames, memory_mb):
+                benchmarks['background_two_pass_median[{}]'.format(size)] = (lambda shape=shape, n_frames=n_frames, memory_mb=memory_mb:
+                                                                             lambda frames=make_frames(shape, n_frames): streaming_median(lambda: iter(frames), shape, n_frames, memory_mb, verbose=False), n_frames, 'frames')
+    for n_samples in SIZES['samples']:
+        n_arenas = SIZES['arenas'][0]
+        size = '{}samples_{}arenas'.format(n_samples, n_arenas)
+        benchmarks['fill_gaps[{}]'.format(size)] = (lambda n_samples=n_samples, n_arenas=n_arenas:
+                                                    lambda pos=make_trajectories(n_samples, n_arenas): fill_gaps(pos), n_samples*n_arenas, 'samples')
+        benchmarks['project_to_axis[{}samples]'.format(n_samples)] = (lambda n_samples=n_samples, n_arenas=n_arenas:
+                                                                      lambda pos=make_trajectories(n_samples, n_arenas): project_to_axis((500, 50), (500, 950), pos[:,0,0], pos[:,0,1]), n_samples, 'samples')
+    # the baselines loop over the samples in python, time them on at most 10^5 samples
+    n_samples, n_arenas = min(SIZES['samples'][0], 10**5), SIZES['arenas'][0]
+    # the original fillna, run on a copy of every arena and coordinate
+    benchmarks['baseline_fillna[{}samples_{}arenas]'.format(n_samples, n_arenas)] = (lambda:
+        lambda pos=make_trajectories(n_samples, n_arenas): [baseline_fillna(column.copy()) for column in pos.reshape(n_samples, -1).T], n_samples*n_arenas, 'samples')
+    benchmarks['notebook_project_to_axis[{}samples]'.format(n_samples)] = (lambda:
+        lambda pos=make_trajectories(n_samples, n_arenas): [notebook_project_to_axis((500, 50), (500, 950), xi, yi) for xi, yi in zip(pos[:,0,0], pos[:,0,1])], n_samples, 'samples')
+    return benchmarks
+
+### MAIN SCRIPT
+benchmarks = make_benchmarks()
+results = {
+    'meta': {
+        'date': datetime.datetime.now().isoformat(),
+        'sizes': sizes,
+        'repeats': repeats,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    },
+    'results': {},
+}
+for name, (setup, n_items, unit) in benchmarks.items():
+    if name_filter not in name:
+        continue
+    times = time_function(setup(), repeats)
+    median = float(np.median(times))
+    results['results'][name] = {'times': times, 'best': min(times), 'median': median, 'items': n_items, 'unit': unit,
+                                'throughput': n_items/median}
+    print('{:<55s} median {:10.3f} ms  best {:10.3f} ms  {:14.1f} {}/s'.format(name, 1000*median, 1000*min(times), n_items/median, unit))
+with open(output, 'w') as f:
+    json.dump(results, f, indent=4)
+print('Results saved to {}'.format(output))
+
+# compare the median times with the baseline
+if compare != '':
+    baseline = json.load(open(compare))['results']
+    regressions = []
+    print('\nComparison with {} (new/baseline median time):'.format(compare))
+    for name, result in results['results'].items():
+        if name not in baseline:
+            print('{:<55s} not in baseline'.format(name))
+            continue
+        ratio = result['median']/baseline[name]['median']
+        flag = 'REGRESSION' if ratio > 1+tolerance else 'faster' if ratio < 1/(1+tolerance) else ''
+        if ratio > 1+tolerance:
+            regressions.append(name)
+        print('{:<55s} {:6.2f}x {}'.format(name, ratio, flag))
+    if len(regressions) > 0:
+        print('{} regressions beyond {:.0f}%'.format(len(regressions), 100*tolerance))
+        sys.exit(1)
+print('DONE')
@@ -2,14 +2,24 @@ import argparse
 import os
 import numpy as np
 import json
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import cv2
 import time
+import sys
+import subprocess
+import shutil
+import ast
 from joblib import Parallel, delayed
-import pandas as pd
-from matplotlib.colors import ListedColormap
+from antsymaze.arenas import find_mask_file, load_arena_masks
+from antsymaze.localization import LOCALIZATION_MODES, prepare_background, make_frame_locator
+from antsymaze.trajectories import fill_gaps
+from antsymaze.occupancy import occupancy_bins, occupancy_histogram, speed_histogram, filled_histograms, save_occupancy
+from antsymaze.locations import LOCATION_FORMATS, check_location_format, save_locations
+from antsymaze.video import find_segments, concatenate_videos, video_info, read_frames, keyframe_indices, plan_chunks
+from antsymaze.pipeline import run_pipeline, merge_pipeline_stats, format_pipeline_stats
+from antsymaze.shared import make_shared_dir, remove_shared_dir, create_shared_array, open_shared_array
+from antsymaze.manifest import stage_key, is_up_to_date, record_stage, invalidate_stage
+from antsymaze.profiling import make_stopwatch, merge_profiles, peak_rss, make_cprofiler, cprofile_worker, merge_cprofile_dumps, save_profile, format_profile
+from antsymaze.checkpoint import checkpoint_dir, remove_stale_checkpoints, shard_file, save_shard, load_shard
 
 # CLEAR THE CONSOLE
 os.system('cls' if os.name == 'nt' else 'clear')
@@ -28,12 +38,29 @@ parser.add_argument('-d', '--data_dir', type=str, default='./data/', help='Path
 parser.add_argument('-p', '--processed_data_dir', type=str, default='./processed_data/', help='Path to the processed data directory (default: ./processed_data/)')
 parser.add_argument('-o', '--output_dir', type=str, default='', help='Path to the output directory (default: the associated processed data subdirectory)')
 parser.add_argument('-n', '--n_threads', type=int, default=1, help='Number of threads to use (default: 1)')
+parser.add_argument('-ct', '--compute_threads', type=int, default=1, help='Number of localization threads per worker, next to one decoding thread (default: 1)')
+parser.add_argument('-qd', '--queue_depth', type=int, default=8, help='Number of decoded frames buffered between decoding and localization (default: 8)')
+parser.add_argument('-cs', '--chunk_size', type=int, default=2000, help='Minimum number of frames per chunk of work; chunks start on keyframes (default: 2000)')
 parser.add_argument('-s', '--skip_frames', type=int, default=1, help='Number of frames to skip (default: 1)')
 parser.add_argument('-c', '--cut_off', type=int, default=-50, help='Cut off for background subtraction (default: -50)')
+parser.add_argument('-l', '--localizer', type=str, default='blob', help='Localization engine ({}) (default: blob)'.format('/'.join(LOCALIZATION_MODES)))
+parser.add_argument('-bp', '--blob_params', type=str, nargs='+', default=[], help='Blob detector parameters as name=value pairs of cv2.SimpleBlobDetector_Params, e.g. minArea=50 filterByColor=False (default: the opencv defaults)')
+parser.add_argument('-ma', '--min_area', type=int, default=25, help='Minimum ant area in pixels for the components and moments localizers (default: 25)')
+parser.add_argument('-cr', '--crop', type=bool, default=True, help='Only process the bounding boxes of the arenas (default: True)')
 parser.add_argument('-f', '--fill_nan', type=bool, default=True, help='Fill nan values (default: True)')
-parser.add_argument('-pl', '--plot', type=bool, default=True, help='Plot the results (default: True)')
+parser.add_argument('-mg', '--max_gap', type=int, default=None, help='Maximum number of consecutive missing samples to fill (default: no limit)')
+parser.add_argument('-pr', '--profile', type=bool, default=False, help='Save the time per stage, peak memory and FPS of every camera run to cam<N>_profile.json/.csv (default: False)')
+parser.add_argument('-cp', '--cprofile', type=bool, default=False, help='Save the cProfile statistics of the localization to cam<N>_profile.prof, uses one compute thread (default: False)')
+parser.add_argument('-of', '--output_format', type=str, nargs='+', default=['csv'], help='Formats of the ant locations file ({}), several can be given (default: csv)'.format('/'.join(LOCATION_FORMATS)))
+parser.add_argument('-ce', '--csv_extra_columns', action='store_true', help='Add the time and interpolated columns to the csv (default: the frame and position columns only)')
+parser.add_argument('-pl', '--plot', type=bool, default=True, help='Plot the results with plotting.py in the background (default: True)')
+parser.add_argument('--no-plot', dest='plot', action='store_false', help='Do not plot the results (e.g. when the plots are made by a separate stage)')
 parser.add_argument('-n_bins', '--n_bins', type=int, default=100, help='Number of bins for the histogram (default: 100)')
+parser.add_argument('-sb', '--speed_bins', type=int, default=0, help='Number of bins for the per arena speed histograms, 0 to skip them (default: 0)')
+parser.add_argument('-ms', '--max_speed', type=float, default=1000, help='Upper edge of the speed histograms in pixels per second (default: 1000)')
 parser.add_argument('-exp', '--experiment', type=str, default='experiment', help='Experiment name (default: experiment)')
+parser.add_argument('-cam', '--cameras', type=int, nargs='+', default=None, help='Camera numbers to process (default: all cameras)')
+parser.add_argument('-src', '--source', type=str, default='merged', help='Video to read: the merged video or the raw video files directly without merging them (merged/segments) (default: merged)')
 parser.add_argument('-x', '--overwrite', type=bool, default=False, help='Overwrite existing data (default: False)')
 
 
@@ -47,123 +74,113 @@ n_threads = args.n_threads
 # assert the number of threads is greater than 0 and less than the number of cores
 assert n_threads>0, 'Number of threads must be greater than 0'
 assert n_threads<=os.cpu_count(), 'Number of threads must be less than or equal to the number of cores'
+compute_threads = args.compute_threads
+assert compute_threads>0, 'Number of compute threads must be greater than 0'
+queue_depth = args.queue_depth
+assert queue_depth>0, 'Queue depth must be greater than 0'
+chunk_size = args.chunk_size
+assert chunk_size>0, 'Chunk size must be greater than 0'
 skip_frames = args.skip_frames
 # assert the number of frames to skip is greater than 0
 assert skip_frames>0, 'Number of frames to skip must be greater than 0'
 cut_off = args.cut_off
+localizer = args.localizer
+# assert the localizer is valid
+assert localizer in LOCALIZATION_MODES, 'Localizer must be one of {}'.format(LOCALIZATION_MODES)
+min_area = args.min_area
+# parse the blob detector parameters (name=value pairs with python literal values)
+blob_params = {}
+for blob_param in args.blob_params:
+    assert '=' in blob_param, 'Blob detector parameter {} must be given as name=value'.format(blob_param)
+    name, value = blob_param.split('=', 1)
+    blob_params[name] = ast.literal_eval(value)
+assert len(blob_params)==0 or localizer=='blob', 'Blob detector parameters are only used by the blob localizer'
+crop = args.crop
 fill_nan = args.fill_nan
+max_gap = args.max_gap
+output_formats = args.output_format
+csv_extra_columns = args.csv_extra_columns
+profile = args.profile
+cprofile = args.cprofile
+# only one cProfile profiler can be active per process, so the localization runs in one thread per worker
+if cprofile and compute_threads>1:
+    print('cProfile profiles one thread per process, using 1 compute thread instead of {}'.format(compute_threads))
+    compute_threads = 1
+# check the output formats before any work is done
+for output_format in output_formats:
+    check_location_format(output_format)
 plot = args.plot
 n_bins = args.n_bins
+speed_bins = args.speed_bins
+max_speed = args.max_speed
+assert speed_bins>=0, 'Number of speed bins must not be negative'
+speed_edges = np.linspace(0, max_speed, speed_bins+1) if speed_bins>0 else None
 experiment = args.experiment
+cameras = args.cameras
+source = args.source
+assert source in ['merged', 'segments'], 'Source {} is not valid'.format(source)
 
 ## FUNCTIONS
 
-# fill nan values in a array with linear interpolation of the last valid value and the next valid value
-def fillna(x):
-    # check if all the values are nan, if so, return the array
-    if np.isnan(x).sum()==len(x):
-        return x
-    # find the first valid value
-    first_valid = np.where(~np.isnan(x))[0][0]
-    # fill the nan values before the first valid value with the first valid value
-    x[:first_valid] = x[first_valid]
-    # find the last valid value
-    last_valid = np.where(~np.isnan(x))[0][-1]
-    # fill the nan values after the last valid value with the last valid value
-    x[last_valid:] = x[last_valid]
-    # loop through the array, when you find a nan value, find the next valid value and the previous valid value
-    # then linearly interpolate between the two
-    i = first_valid + 1
-    while i<last_valid:
-        if np.isnan(x[i]):
-            # get the next valid value
-            next_valid = np.where(~np.isnan(x[i:]))[0][0] + i
-            # get the previous valid value
-            prev_valid = np.where(~np.isnan(x[:i]))[0][-1]
-            # fill the nan value with the linear interpolation
-            x[i:next_valid] = np.linspace(x[prev_valid], x[next_valid], next_valid-prev_valid+1)[1:-1]
-            # set i to the next valid value
-            i = next_valid+1
-        else:
-            i += 1
-    # make sure there are no nan values
-    if np.isnan(x).sum()>0:
-        print('There are still nan values')
-        print(x)
-    return x
-
-# make a function that combines the entire process given a frame and a background
-def get_ant_locations(frame, background, background_masks, N_ARENAS):
-    # get the only ant mask
-    only_ants = ((frame.mean(axis=2)- background.mean(axis=2))>-50).astype(np.uint8)
-    only_ants = np.array([only_ants, only_ants, only_ants]).transpose(1,2,0)*255
-    # convert to grayscale
-    only_ants = cv2.cvtColor(only_ants, cv2.COLOR_BGR2GRAY)
-    # apply a gaussian blur
-    only_ants = cv2.GaussianBlur(only_ants, (55,55), 0)
-    # apply a blob detector
-    detector = cv2.SimpleBlobDetector_create()
-    keypoints = detector.detect(only_ants)
-    # convert to numpy array and get the positions and areas
-    keypoints = np.array([[kp.pt[0], kp.pt[1], kp.size] for kp in keypoints])
-    pos = np.ones((N_ARENAS, 2))*np.nan
-    arena_sizes = np.zeros(N_ARENAS)
-    for i in keypoints:
-        x,y = int(i[0]), int(i[1])
-        arena_vals = background_masks[:,y,x]
-        # make sure not all the values are 0
-        if arena_vals.sum()==0:
-            continue
-        # check if there are multiple arenas
-        if arena_vals.sum()>255:
-            continue
-        arena_id = arena_vals.argmax()
-        # check if the new keypoint is larger than the previous one
-        if i[2]>arena_sizes[arena_id]:
-            arena_sizes[arena_id] = i[2]
-            pos[arena_id] = [i[0], i[1]]
-        else:
-            continue
-
-    return pos
-
-# make a function that processes the frames
-def process_frames(video_file, frames, background, background_masks, N_ARENAS, verbose=True):
-    positions = []
-    frame_no = []
+# make a function that processes every skip_frames-th frame in [start_frame, end_frame) of a video (file or virtual
+# video of segments, see antsymaze.video), decoding from seek_frame
+# one thread decodes frames ahead into a bounded queue while compute_threads threads localize the ants
+# the inputs are mapped from shared arrays and the results are written in place into the shared output arrays
+# (row frame_no//skip_frames) so nothing but the array specs and the timing statistics crosses process boundaries
+# the occupancy histograms (n_bins rows) and, if speed_edges is given, the speed histograms of the chunk are accumulated on the fly
+# the results of the chunk (with the histograms) are saved to the shard file so an interrupted run can resume
+# with profile=True the time and calls of every stage, the process id and its peak memory are added to the returned
+# statistics; with a cprofile_dir the compute thread (only one, see antsymaze.profiling) also dumps its cProfile statistics there
+def process_frames(video, seek_frame, start_frame, end_frame, skip_frames, shared, N_ARENAS, shard, localizer='blob', min_area=25, crop=True, localizer_params=None, compute_threads=1, queue_depth=8, n_bins=100, speed_edges=None, profile=False, cprofile_dir=None, verbose=True):
     if verbose:
         start_time = time.time()
-    # open the video
-    cap = cv2.VideoCapture(video_file)
-    # load the video into memory
-    start_frame = frames[0]
-    end_frame = frames[-1]
-    skip_frames = frames[1]-frames[0]
-    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-    COUNT = 0
-    for n,i in enumerate(range(end_frame-start_frame)):
-        if skip_frames>1 and n%skip_frames!=0:
-            continue
-        ret, frame = cap.read()
-        # check if the frame is valid
-        if not ret or frame is None:
-            continue
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        positions.append(get_ant_locations(frame, background, background_masks, N_ARENAS))
-        frame_no.append(start_frame+n)
-        COUNT += 1
-        if verbose and COUNT%100==0:
-            print('Processed {}/{}, Time elapsed: {:.2f}s'.format(COUNT, len(frames), time.time()-start_time))
-    # release the video
-    cap.release()
-    return positions, frame_no
-
-def make_cmap(color):
-    # get the color RGB values
-    r,g,b,_ = color
-    # create a linear gradient from black to the color
-    cmap = np.array([np.linspace(0,r,256), np.linspace(0,g,256), np.linspace(0,b,256)]).T
-    return ListedColormap(cmap)
+    threshold = open_shared_array(shared['threshold'])
+    arena_labels = open_shared_array(shared['arena_labels'])
+    n_expected = len(range(start_frame, end_frame, skip_frames))
+    def progress(count):
+        if verbose and count%100==0:
+            print('Processed {}/{}, Time elapsed: {:.2f}s'.format(count, n_expected, time.time()-start_time))
+    # skipped frames are only grabbed, not retrieved
+    frames = read_frames(video, start_frame, end_frame, skip_frames, seek_frame)
+    # every compute thread creates its own localizer, frame buffers and profiles
+    profiles, cprofilers = [], []
+    assert cprofile_dir is None or compute_threads==1, 'cProfile needs a single compute thread'
+    def make_worker():
+        worker_profile = {} if profile else None
+        if profile:
+            profiles.append(worker_profile)
+        locate_frame = make_frame_locator(localizer, threshold, arena_labels, N_ARENAS, min_area, crop, worker_profile, localizer_params)
+        if cprofile_dir is not None:
+            cprofilers.append(make_cprofiler())
+            locate_frame = cprofile_worker(locate_frame, cprofilers[-1])
+        return locate_frame
+    positions, frame_no, timestamps, stats = run_pipeline(frames, make_worker, n_workers=compute_threads, queue_depth=queue_depth, progress=progress)
+    io_profile = {} if profile else None
+    lap = make_stopwatch(io_profile)
+    # write the results into the shared output arrays
+    lap(None)
+    if len(frame_no) > 0:
+        rows = np.array(frame_no)//skip_frames
+        open_shared_array(shared['positions'], writable=True)[rows] = positions
+        open_shared_array(shared['frames'], writable=True)[rows] = frame_no
+        open_shared_array(shared['timestamps'], writable=True)[rows] = timestamps
+    positions = np.array(positions, dtype=np.float64).reshape(-1, N_ARENAS, 2)
+    # summarize the chunk as histograms so the plots never have to rescan every position
+    histograms = {'occupancy': occupancy_histogram(positions, threshold.shape, n_bins).astype(np.int32)}
+    if speed_edges is not None:
+        histograms['speed'] = speed_histogram(positions, timestamps, speed_edges)
+    # checkpoint the chunk (an empty shard marks a chunk without valid frames as done too)
+    save_shard(shard, frames=np.array(frame_no, dtype=np.int32), timestamps=np.array(timestamps, dtype=np.float64), positions=positions, **histograms)
+    lap('io')
+    if profile:
+        stats['profile'] = merge_profiles(profiles + [io_profile, {'decode': [stats['decode_time'], stats['n_frames']]}])
+        stats['pid'] = os.getpid()
+        stats['peak_rss'] = peak_rss()
+    for i, profiler in enumerate(cprofilers):
+        profiler.dump_stats(os.path.join(cprofile_dir, 'chunk_{:09d}_{}.prof'.format(start_frame, i)))
+    if verbose:
+        print(format_pipeline_stats(stats))
+    return stats
 
 ### MAIN SCRIPT
 # find the data
@@ -180,6 +197,7 @@ if experiment_file.endswith('.json'):
         # loop through the Experiment dir options to find the one that exists
         for dir in experiment_dir:
             if os.path.exists(dir):
+                experiment_dir = dir
                 data_dir = processed_data_dir + dir.split('/')[-2]
                 if os.path.exists(data_dir):
                     found = True
@@ -193,6 +211,9 @@ else:
     Exception('Experiment file is not a json file')
 # find all camera directories
 CAM_NOs = list(set([int(x.split('_')[0][3:]) for x in os.listdir(data_dir) if x.startswith('cam')]))
+# keep only the selected cameras
+if cameras is not None:
+    CAM_NOs = [CAM_NO for CAM_NO in CAM_NOs if CAM_NO in cameras]
 # GET THE NUMBER OF CAMERAS
 num_cams = len(CAM_NOs)
 print('Number of cameras: {}'.format(num_cams))
@@ -200,125 +221,185 @@ print('Number of cameras: {}'.format(num_cams))
 if output_dir=='':
     output_dir = data_dir
 
+# plotting processes started for the finished cameras
+plot_processes = []
 # loop through the cameras and find the video files
 for CAM_NO in CAM_NOs:
-    # check if the data has already been processed
-    if os.path.exists(output_dir + '/cam{}_ant_locations.csv'.format(CAM_NO)) and  \
-        os.path.exists(output_dir + '/cam{}_ant_locations.png'.format(CAM_NO)) and \
-        os.path.exists(output_dir + '/cam{}_ant_locations_hist.png'.format(CAM_NO)):
-        if args.overwrite:
-            print('Overwriting existing data')
-        else:
-            print('Data already exists, skipping')
-            continue
     print('Processing camera {}'.format(CAM_NO))
     # get all the files in the data directory with the correct camera number
     data_files = os.listdir(data_dir)
     data_files = [file for file in data_files if 'cam{}'.format(CAM_NO) in file]
-    # make sure there is (1) merged.mp4 file (2) background.png file (3) background_endpoints.json file (4) background_pois.json file
-    assert 'cam{}_merged.mp4'.format(CAM_NO) in data_files, 'No merged.mp4 file found'
+    # make sure there is (1) merged.mp4 file or raw video files (2) background.png file (3) background_endpoints.json file (4) background_pois.json file
+    if source == 'merged':
+        assert 'cam{}_merged.mp4'.format(CAM_NO) in data_files, 'No merged.mp4 file found'
+        video, video_inputs = data_dir + '/cam{}_merged.mp4'.format(CAM_NO), [data_dir + '/cam{}_merged.mp4'.format(CAM_NO)]
+    else:
+        # read the video files of the camera as one virtual video with the frame numbers of the merged video
+        video_inputs = find_segments(os.path.join(experiment_dir, 'cam_{}'.format(CAM_NO), '1_48'))
+        assert len(video_inputs) > 0, 'No video files found'
+        video = concatenate_videos(video_inputs)
     assert 'cam{}_background.png'.format(CAM_NO) in data_files, 'No background.png file found'
     assert 'cam{}_background_endpoints.json'.format(CAM_NO) in data_files, 'No background_endpoints.json file found'
     assert 'cam{}_background_pois.json'.format(CAM_NO) in data_files, 'No background_pois.json file found'
     print('All Camera and Metadata files found')
+    # check if the data has already been processed from the same inputs with the same parameters
+    manifest_file = output_dir + '/cam{}_manifest.json'.format(CAM_NO)
+    mask_file = find_mask_file(data_dir + '/cam{}_background'.format(CAM_NO))
+    detection_inputs = video_inputs + [data_dir + '/cam{}_background.png'.format(CAM_NO), mask_file, data_dir + '/cam{}_background_pois.json'.format(CAM_NO)]
+    # the parameters that change the results of a chunk (positions and histograms), then the post-processing and output ones
+    chunk_params = {'skip_frames': skip_frames, 'cut_off': cut_off, 'localizer': localizer, 'min_area': min_area, 'crop': crop,
+                    'blob_params': blob_params, 'n_bins': n_bins, 'speed_bins': speed_bins, 'max_speed': max_speed}
+    detection_params = dict(chunk_params, fill_nan=fill_nan, max_gap=max_gap, output_formats=output_formats,
+                             csv_extra_columns=csv_extra_columns)
+    detection_key = stage_key(detection_inputs, detection_params)
+    detection_outputs = [output_dir + '/cam{}_ant_locations.{}'.format(CAM_NO, output_format) for output_format in output_formats]
+    detection_outputs += [output_dir + '/cam{}_occupancy.npz'.format(CAM_NO)]
+    if is_up_to_date(manifest_file, 'detection', detection_key):
+        if args.overwrite:
+            print('Overwriting existing data')
+        else:
+            print('Data is up to date, skipping')
+            continue
+    invalidate_stage(manifest_file, 'detection')
     # get the background image
     print('Loading background image')
     background = cv2.imread(data_dir + '/cam{}_background.png'.format(CAM_NO))
     background = cv2.cvtColor(background, cv2.COLOR_BGR2RGB)
+    # precompute the foreground threshold from the background luminance
+    threshold = prepare_background(cv2.cvtColor(background, cv2.COLOR_RGB2GRAY), cut_off)
     # get the background masks
     print('Loading background masks')
     background_endpoints = json.load(open(data_dir + '/cam{}_background_endpoints.json'.format(CAM_NO)))
     background_pois = json.load(open(data_dir + '/cam{}_background_pois.json'.format(CAM_NO)))
-    background_masks = json.load(open(data_dir + '/cam{}_background_masks.json'.format(CAM_NO)))
-    background_masks = np.array([background_masks[key] for key in background_masks.keys()])
+    # load the masks as a single label image (0: no arena, -1: shared pixels, i: arena i)
+    # from the npz mask file or the legacy json dump of older processed data
+    arena_labels, N_ARENAS = load_arena_masks(mask_file)
     # get the number of arenas
-    N_ARENAS = background_masks.shape[0]
     print('Number of arenas: {}'.format(N_ARENAS))
     # get the video file
     print('Loading video to set up frames')
-    cap = cv2.VideoCapture(data_dir + '/cam{}_merged.mp4'.format(CAM_NO))
-    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    n_frames_per_thread = int(np.ceil(n_frames/n_threads))
-    frames_per_thread = [np.arange(i*n_frames_per_thread, (i+1)*n_frames_per_thread, skip_frames) for i in range(n_threads)]
-    cap.release()
-    # process the frames
-    print('Running processing in parallel with {} threads'.format(n_threads))
-    processed_data = Parallel(n_jobs=n_threads)(delayed(process_frames)(data_dir + '/cam{}_merged.mp4'.format(CAM_NO), frames, background, background_masks, N_ARENAS) for frames in frames_per_thread)
-    pos = np.concatenate([processed_data[i][0] for i in range(len(processed_data))])
-    t = np.concatenate([processed_data[i][1] for i in range(len(processed_data))])
+    n_frames = video_info(video)[0]
+    # split the video into many small chunks that start on keyframes so that every chunk decodes from its own keyframe
+    print('Planning keyframe-aligned chunks')
+    chunks = plan_chunks(n_frames, chunk_size, skip_frames, keyframe_indices(video))
+    # put the inputs and a preallocated output for every sample on the skip_frames grid in shared memory
+    shared_dir = make_shared_dir()
+    n_samples = len(range(0, n_frames, skip_frames))
+    shared = {}
+    _, shared['threshold'] = create_shared_array(shared_dir, 'threshold', threshold.shape, np.int16, data=threshold)
+    _, shared['arena_labels'] = create_shared_array(shared_dir, 'arena_labels', arena_labels.shape, np.int16, data=arena_labels)
+    shared_positions, shared['positions'] = create_shared_array(shared_dir, 'positions', (n_samples, N_ARENAS, 2), np.float64, fill_value=np.nan)
+    shared_frames, shared['frames'] = create_shared_array(shared_dir, 'frames', (n_samples,), np.int32, fill_value=-1)
+    shared_timestamps, shared['timestamps'] = create_shared_array(shared_dir, 'timestamps', (n_samples,), np.float64, fill_value=np.nan)
+    # every finished chunk is saved as a shard, restore the chunks of an interrupted run with the same inputs, chunk
+    # parameters and chunks (the shards are keyed without the post-processing and output parameters, so a run that
+    # only changes those resumes too)
+    checkpoint_prefix = output_dir + '/cam{}'.format(CAM_NO)
+    shard_key = stage_key(detection_inputs, dict(chunk_params, chunks=chunks))
+    remove_stale_checkpoints(checkpoint_prefix, shard_key)
+    shard_dir = checkpoint_dir(checkpoint_prefix, shard_key)
+    remaining_chunks = []
+    for seek_frame, start_frame, end_frame in chunks:
+        shard = load_shard(shard_file(shard_dir, start_frame, end_frame))
+        if shard is None:
+            remaining_chunks.append((seek_frame, start_frame, end_frame))
+        elif len(shard['frames']) > 0:
+            rows = shard['frames']//skip_frames
+            shared_positions[rows] = shard['positions']
+            shared_frames[rows] = shard['frames']
+            shared_timestamps[rows] = shard['timestamps']
+    if len(remaining_chunks) < len(chunks):
+        print('Resuming from {} of {} chunks saved in {}'.format(len(chunks)-len(remaining_chunks), len(chunks), shard_dir))
+    # process the frames, chunks are handed out one at a time to whichever worker is free
+    print('Running processing in parallel with {} threads on {} chunks'.format(n_threads, len(remaining_chunks)))
+    cprofile_dir = None
+    if cprofile:
+        cprofile_dir = output_dir + '/cam{}_cprofile'.format(CAM_NO)
+        os.makedirs(cprofile_dir, exist_ok=True)
+    start_time = time.time()
+    try:
+        processed_data = Parallel(n_jobs=n_threads, batch_size=1, verbose=5)(delayed(process_frames)(video, seek_frame, start_frame, end_frame, skip_frames, shared, N_ARENAS, shard_file(shard_dir, start_frame, end_frame), localizer, min_area, crop, blob_params, compute_threads, queue_depth, n_bins, speed_edges, profile, cprofile_dir, verbose=False) for seek_frame, start_frame, end_frame in remaining_chunks)
+        # keep the samples that were decoded
+        valid = shared_frames >= 0
+        pos = np.array(shared_positions[valid])
+        t = np.array(shared_frames[valid])
+        timestamps = np.array(shared_timestamps[valid])
+    finally:
+        del shared_positions, shared_frames, shared_timestamps
+        remove_shared_dir(shared_dir)
+    pipeline_stats = merge_pipeline_stats(processed_data, time.time()-start_time)
+    print('Pipeline summary: ' + format_pipeline_stats(pipeline_stats))
+    # save the profile of the run
+    if profile:
+        run_profile = {'camera': CAM_NO, 'n_threads': n_threads, 'compute_threads': compute_threads, 'localizer': localizer, 'crop': crop,
+                       'n_chunks': len(remaining_chunks), 'pipeline': pipeline_stats, 'fps': pipeline_stats['fps'], 'main_peak_rss_mb': peak_rss(), 'workers': {}}
+        for stats in processed_data:
+            worker = run_profile['workers'].setdefault('pid{}'.format(stats['pid']), {'profile': {}, 'n_chunks': 0, 'n_frames': 0, 'peak_rss_mb': 0})
+            worker['profile'] = merge_profiles([worker['profile'], stats['profile']])
+            worker['n_chunks'] += 1
+            worker['n_frames'] += stats['n_frames']
+            worker['peak_rss_mb'] = max(worker['peak_rss_mb'], stats['peak_rss'])
+        run_profile['total'] = merge_profiles([stats['profile'] for stats in processed_data])
+        save_profile(output_dir + '/cam{}_profile'.format(CAM_NO), run_profile)
+        print('Profile: ' + format_profile(run_profile['total']))
+    if cprofile_dir is not None:
+        merge_cprofile_dumps(cprofile_dir, output_dir + '/cam{}_profile.prof'.format(CAM_NO))
+        shutil.rmtree(cprofile_dir, ignore_errors=True)
+    # flag the samples with a detection in every arena
+    detected = ~np.isnan(pos).any(axis=2)
+    # merge the histograms of the chunks
+    print('Merging histograms')
+    occupancy = np.zeros((N_ARENAS,) + occupancy_bins(threshold.shape, n_bins), dtype=np.int64)
+    speed = None if speed_edges is None else np.zeros((N_ARENAS, len(speed_edges)-1), dtype=np.int64)
+    for seek_frame, start_frame, end_frame in chunks:
+        shard = load_shard(shard_file(shard_dir, start_frame, end_frame))
+        occupancy += shard['occupancy']
+        if speed is not None:
+            speed += shard['speed']
+    if speed is not None:
+        # add the speeds between the last sample of every chunk and the first sample of the next one
+        for i in np.searchsorted(t, [start_frame for _, start_frame, _ in chunks[1:]]):
+            if 0 < i < len(t):
+                speed += speed_histogram(pos[i-1:i+1], timestamps[i-1:i+1], speed_edges)
     # fill in the nan values
+    interpolated = None
     if fill_nan:
         print('Filling nan values')
-        for i in range(pos.shape[1]):
-            pos[:,i,0] = fillna(pos[:,i,0])
-            pos[:,i,1] = fillna(pos[:,i,1])
+        pos, interpolated = fill_gaps(pos, max_gap=max_gap)
+        # flag a sample as interpolated if either coordinate was filled
+        interpolated = interpolated.any(axis=2)
+        # add the filled samples to the histograms, so they describe the same trajectory as the locations files
+        filled_occupancy, filled_speed = filled_histograms(pos, timestamps, interpolated, threshold.shape, n_bins, speed_edges)
+        occupancy += filled_occupancy
+        if speed is not None:
+            speed += filled_speed
+    save_occupancy(output_dir + '/cam{}_occupancy.npz'.format(CAM_NO), occupancy, threshold.shape, speed, speed_edges)
     # save the data
     print('Saving data')
     if not os.path.exists(output_dir):
         os.mkdir(output_dir)
-    # make into pandas dataframe
-    columns = ['frame'] + ['arena_{}_x'.format(i+1) for i in range(N_ARENAS)] + ['arena_{}_y'.format(i+1) for i in range(N_ARENAS)]
-    data = np.zeros((pos.shape[0], pos.shape[1]*2+1))
-    data[:,0] = t
-    for i in range(N_ARENAS):
-        data[:,i+1] = pos[:,i,0]
-        data[:,i+1+N_ARENAS] = pos[:,i,1]
-    # data = np.zeros((pos.shape[0]*pos.shape[1], pos.shape[2]+2))    
-    # data[:,0] = np.repeat(t, pos.shape[1])
-    # data[:,1] = np.tile(np.arange(pos.shape[1]), pos.shape[0])
-    # data[:,2:] = pos.reshape(-1, pos.shape[2])
-    data = pd.DataFrame(data, columns=columns)
-    data.to_csv(output_dir + '/cam{}_ant_locations.csv'.format(CAM_NO), index=False)
-    # plot the results
+    metadata = dict(detection_params, camera=CAM_NO, n_arenas=N_ARENAS, n_frames=n_frames, key=detection_key)
+    for output_format in output_formats:
+        save_locations(output_dir + '/cam{}_ant_locations'.format(CAM_NO), output_format, t, timestamps, pos, detected, interpolated, metadata, csv_extra_columns)
+    # remove the locations files of the formats not written by this run, so no reader picks up a stale one
+    for output_format in LOCATION_FORMATS:
+        if output_format not in output_formats and os.path.exists(output_dir + '/cam{}_ant_locations.{}'.format(CAM_NO, output_format)):
+            os.remove(output_dir + '/cam{}_ant_locations.{}'.format(CAM_NO, output_format))
+    record_stage(manifest_file, 'detection', detection_key, detection_outputs, detection_params)
+    # the outputs are complete, the shards are no longer needed
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    # plot the results in a separate process while the next camera is processed
     if plot:
-        print('Plotting results...')
-        # TIME SERIES
-        fig, ax = plt.subplots(1,1,figsize=(10,10))
-        plt.imshow(background)
-        for arena_id in range(N_ARENAS):
-            # check if any of the values are nan
-            if np.isnan(pos[:,arena_id,0]).sum()>0 or np.isnan(pos[:,arena_id,1]).sum()>0:
-                continue
-            plt.scatter(pos[:,arena_id,0], pos[:,arena_id,1], s=10, c=t, cmap=make_cmap(plt.cm.rainbow(arena_id/N_ARENAS)), alpha=0.3)
-            # plot the POIs
-            pois = np.array(background_pois["arena_{}_original".format(arena_id+1)])
-            for i in range(pois.shape[0]):
-                plt.scatter(pois[i,0], pois[i,1], s=100, c='k', marker='x')
-        # hide the axes
-        ax.get_xaxis().set_visible(False)
-        ax.get_yaxis().set_visible(False)
-        plt.savefig(output_dir + '/cam{}_ant_locations.png'.format(CAM_NO), bbox_inches='tight', pad_inches=0)
-        plt.close()
-        # HISTOGRAM
-        background_small = cv2.resize(background, (int(n_bins*background.shape[1]/background.shape[0]), n_bins))
-        plt.imshow(background_small)
-        for arena_id in range(N_ARENAS):
-            # check if any of the values are nan
-            if np.isnan(pos[:,arena_id,0]).sum()>0 or np.isnan(pos[:,arena_id,1]).sum()>0:
-                continue
-            # get the positions for the arena
-            x = pos[:,arena_id,0]
-            y = pos[:,arena_id,1]
-            # create the 2d histogram
-
-            H, xedges, yedges = np.histogram2d(y, x, bins=(n_bins,int(n_bins*background.shape[1]/background.shape[0])),range=[[0, background.shape[0]], [0, background.shape[1]]])
-            # log transform the histogram
-            H = np.log(H+1)
-            # plot the 2d histogram (make 0 values transparent)
-
-            masked_array = np.ma.masked_where(H == 0, H)
-            plt.imshow(masked_array, cmap=make_cmap(plt.cm.rainbow(arena_id/N_ARENAS)), interpolation='nearest', vmin=0, vmax=H[H>0].max(), alpha=0.5)
-            # plot the POIs
-            pois = np.array(background_pois["arena_{}_original".format(arena_id+1)])
-            for i in range(pois.shape[0]):
-                plt.scatter(pois[i,0]*n_bins/background.shape[0], pois[i,1]*n_bins/background.shape[0], s=100, c='k', marker='x')
-        # hide the axes
-        plt.gca().get_xaxis().set_visible(False)
-        plt.gca().get_yaxis().set_visible(False)
-        plt.savefig(output_dir + '/cam{}_ant_locations_hist.png'.format(CAM_NO), bbox_inches='tight', pad_inches=0)
-        plt.close()
-    
+        print('Plotting results in the background...')
+        plot_processes.append(subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plotting.py'),
+                                                '-d', args.data_dir, '-p', processed_data_dir, '-o', output_dir, '-exp', experiment, '-cam', str(CAM_NO)],
+                                               stdout=subprocess.DEVNULL))
     print('Finished processing camera {}'.format(CAM_NO))
+# wait for the plots
+if len(plot_processes) > 0:
+    print('Waiting for the plots')
+    for process in plot_processes:
+        process.wait()
 print('DONE')
 
 
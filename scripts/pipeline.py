@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import json
+import shlex
+from antsymaze.arenas import find_mask_file
+from antsymaze.scheduler import make_task, run_task_graph
+
+start_string = """
+WELCOME TO THE ANTSYMAZE PIPELINE SCRIPT
+---------------------------------------------
+This script will merge the videos, calculate the backgrounds, detect the ants and plot the results of every camera,
+running the stages of different cameras side by side
+"""
+print(start_string)
+
+# Get the arguments
+parser = argparse.ArgumentParser(description='AntsYMaze Pipeline')
+parser.add_argument('-d', '--data_dir', type=str, default='./data/', help='Path to the data directory (default: ./data/)')
+parser.add_argument('-p', '--processed_data_dir', type=str, default='./processed_data/', help='Path to the processed data directory (default: ./processed_data/)')
+parser.add_argument('-exp', '--experiment', type=str, default='experiment', help='Experiment name (default: experiment)')
+parser.add_argument('-cam', '--cameras', type=int, nargs='+', default=None, help='Camera numbers to process (default: all cameras)')
+parser.add_argument('-st', '--stages', type=str, nargs='+', default=['merge', 'background', 'detection', 'plot'], help='Stages to run (merge/background/detection/plot) (default: all stages)')
+parser.add_argument('-src', '--source', type=str, default='merged', help='Video read by the background and detection: the merged video or the raw video files directly, which skips the merge stage (merged/segments) (default: merged)')
+parser.add_argument('-cpu', '--cpu_budget', type=int, default=os.cpu_count(), help='Number of cores used by the running tasks (default: all cores)')
+parser.add_argument('-io', '--io_budget', type=int, default=1, help='Number of disk heavy tasks (video merges) running at the same time (default: 1)')
+parser.add_argument('-n', '--detection_threads', type=int, default=1, help='Number of worker processes of every detection task (default: 1)')
+parser.add_argument('-ct', '--compute_threads', type=int, default=1, help='Number of localization threads per detection worker, next to its decoding thread (default: 1)')
+parser.add_argument('-ba', '--background_args', type=str, default='', help='Extra arguments for background.py, e.g. "-r 200" (default: none)')
+parser.add_argument('-da', '--detection_args', type=str, default='', help='Extra arguments for detection.py, e.g. "-s 5 -l components" (default: none)')
+
+# Parse the arguments
+args = parser.parse_args()
+data_dir = args.data_dir
+processed_data_dir = args.processed_data_dir
+experiment = args.experiment
+cameras = args.cameras
+stages = args.stages
+cpu_budget = args.cpu_budget
+io_budget = args.io_budget
+detection_threads = args.detection_threads
+compute_threads = args.compute_threads
+background_args = shlex.split(args.background_args)
+detection_args = shlex.split(args.detection_args)
+source = args.source
+for stage in stages:
+    assert stage in ['merge', 'background', 'detection', 'plot'], 'Stage {} is not valid'.format(stage)
+assert source in ['merged', 'segments'], 'Source {} is not valid'.format(source)
+# the raw video files are read directly, there is nothing to merge
+if source == 'segments' and 'merge' in stages:
+    print('Reading the raw video files directly, skipping the merge stage')
+    stages = [stage for stage in stages if stage != 'merge']
+assert detection_threads <= cpu_budget, 'Number of detection threads must be less than or equal to the cpu budget'
+assert compute_threads > 0, 'Number of compute threads must be greater than 0'
+assert '-ct' not in detection_args and '--compute_threads' not in detection_args, 'Give the compute threads with --compute_threads, not in the detection arguments'
+# every detection worker runs its compute threads, a decoding thread and, on the raw video files, a thread that
+# opens the next file ahead; the detection task holds a core for each of them
+detection_cpu = detection_threads*(compute_threads + 1 + (1 if source == 'segments' else 0))
+
+# find the data
+data_files = os.listdir(data_dir)
+experiment_files = [file for file in data_files if experiment in file]
+assert len(experiment_files) == 1, 'More than one or no experiment files found'
+experiment_file = experiment_files[0]
+assert experiment_file.endswith('.json'), 'Experiment file is not a json file'
+experiment_file = json.load(open(data_dir + experiment_file))
+# loop through the experiment dir options to find the one that exists
+experiment_dirs = [dir for dir in experiment_file['dir'] if os.path.exists(dir)]
+assert len(experiment_dirs) > 0, 'Experiment directory does not exist'
+experiment_dir = experiment_dirs[0]
+print('Experiment directory: {}'.format(experiment_dir))
+output_dir = processed_data_dir + experiment_dir.split('/')[-2] + '/'
+# find all cam directories in the experiment directory
+CAM_NOs = sorted(int(dir.split('_')[1]) for dir in os.listdir(experiment_dir) if dir.startswith('cam_'))
+if cameras is not None:
+    CAM_NOs = [CAM_NO for CAM_NO in CAM_NOs if CAM_NO in cameras]
+print('Cameras: {}'.format(CAM_NOs))
+
+# build the task graph: merge -> background -> detection -> plot for every camera
+# the scripts are run for one camera each, so the stages of different cameras can overlap
+script_dir = os.path.dirname(os.path.abspath(__file__))
+common_args = ['-d', data_dir, '-exp', experiment]
+source_args = ['-src', source]
+
+# detection needs the arena masks, which are drawn with the mask designers after the background is computed
+def has_masks(CAM_NO):
+    def check():
+        try:
+            find_mask_file(output_dir + 'cam{}_background'.format(CAM_NO))
+        except FileNotFoundError:
+            return 'no arena masks, run a mask designer on the background first'
+        return None
+    return check
+
+tasks = {}
+# later stages first, so a camera that is ready for detection gets the cores before new merges start
+for CAM_NO in CAM_NOs:
+    if 'plot' in stages:
+        tasks['cam{}_plot'.format(CAM_NO)] = make_task(
+            [sys.executable, os.path.join(script_dir, 'plotting.py')] + common_args + ['-p', processed_data_dir, '-cam', CAM_NO],
+            cpu=1, deps=['cam{}_detection'.format(CAM_NO)] if 'detection' in stages else [])
+for CAM_NO in CAM_NOs:
+    if 'detection' in stages:
+        tasks['cam{}_detection'.format(CAM_NO)] = make_task(
+            [sys.executable, os.path.join(script_dir, 'detection.py')] + common_args + ['-p', processed_data_dir, '-cam', CAM_NO, '-n', detection_threads, '-ct', compute_threads] + source_args + detection_args + (['--no-plot'] if 'plot' in stages else []),
+            cpu=detection_cpu, deps=['cam{}_background'.format(CAM_NO)] if 'background' in stages else [], check=has_masks(CAM_NO))
+for CAM_NO in CAM_NOs:
+    if 'background' in stages:
+        tasks['cam{}_background'.format(CAM_NO)] = make_task(
+            [sys.executable, os.path.join(script_dir, 'background.py')] + common_args + ['-o', processed_data_dir, '-cam', CAM_NO, '-st', 'background'] + source_args + background_args,
+            cpu=1, deps=['cam{}_merge'.format(CAM_NO)] if 'merge' in stages else [])
+for CAM_NO in CAM_NOs:
+    if 'merge' in stages:
+        tasks['cam{}_merge'.format(CAM_NO)] = make_task(
+            [sys.executable, os.path.join(script_dir, 'background.py')] + common_args + ['-o', processed_data_dir, '-cam', CAM_NO, '-st', 'merge'] + background_args,
+            cpu=1, io=1)
+
+# run the tasks
+print('Running {} tasks with {} cores and {} io slots'.format(len(tasks), cpu_budget, io_budget))
+print('Task logs: {}'.format(output_dir + 'logs/'))
+status = run_task_graph(tasks, cpu_budget, io_budget, log_dir=output_dir + 'logs/')
+
+# summarize the results
+print('\nSummary:')
+for CAM_NO in CAM_NOs:
+    print('Camera {}: {}'.format(CAM_NO, ', '.join('{} {}'.format(stage, status['cam{}_{}'.format(CAM_NO, stage)])
+                                                   for stage in ['merge', 'background', 'detection', 'plot'] if stage in stages)))
+if any(state == 'failed' for state in status.values()):
+    sys.exit(1)
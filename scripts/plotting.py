@@ -0,0 +1,96 @@
+import argparse
+import os
+import json
+import matplotlib
+matplotlib.use('Agg')
+import cv2
+from joblib import Parallel, delayed
+from antsymaze.locations import find_locations_file, load_locations
+from antsymaze.occupancy import load_occupancy
+from antsymaze.plotting import plot_trajectories, plot_occupancy
+from antsymaze.manifest import stage_key, is_up_to_date, record_stage, invalidate_stage
+
+start_string = """
+WELCOME TO THE ANT PLOTTING SCRIPT
+---------------------------------------------
+This script will take the detected ant locations and plot the trajectories and occupancy of every camera
+"""
+print(start_string)
+
+# Get the arguments
+parser = argparse.ArgumentParser(description='Ant Plotting')
+parser.add_argument('-d', '--data_dir', type=str, default='./data/', help='Path to the data directory (default: ./data/)')
+parser.add_argument('-p', '--processed_data_dir', type=str, default='./processed_data/', help='Path to the processed data directory (default: ./processed_data/)')
+parser.add_argument('-o', '--output_dir', type=str, default='', help='Path to the directory of the detection outputs (default: the associated processed data subdirectory)')
+parser.add_argument('-n', '--n_jobs', type=int, default=1, help='Number of cameras plotted in parallel (default: 1)')
+parser.add_argument('-exp', '--experiment', type=str, default='experiment', help='Experiment name (default: experiment)')
+parser.add_argument('-cam', '--cameras', type=int, nargs='+', default=None, help='Camera numbers to plot (default: all cameras)')
+parser.add_argument('-x', '--overwrite', type=bool, default=False, help='Overwrite existing plots (default: False)')
+
+# Parse the arguments
+args = parser.parse_args()
+data_dir = args.data_dir
+processed_data_dir = args.processed_data_dir
+output_dir = args.output_dir
+n_jobs = args.n_jobs
+assert n_jobs>0, 'Number of jobs must be greater than 0'
+experiment = args.experiment
+cameras = args.cameras
+overwrite = args.overwrite
+
+## FUNCTIONS
+
+# plot the trajectories and the occupancy of one camera, skipping the plots that are up to date
+def plot_camera(data_dir, output_dir, CAM_NO, overwrite=False):
+    # the workers do not run this script, so select the non-interactive backend here too
+    matplotlib.use('Agg')
+    locations_file = find_locations_file(output_dir + '/cam{}_ant_locations'.format(CAM_NO))
+    occupancy_file = output_dir + '/cam{}_occupancy.npz'.format(CAM_NO)
+    background_file = data_dir + '/cam{}_background.png'.format(CAM_NO)
+    pois_file = data_dir + '/cam{}_background_pois.json'.format(CAM_NO)
+    # check if the plots were made from the same inputs
+    manifest_file = output_dir + '/cam{}_manifest.json'.format(CAM_NO)
+    plot_key = stage_key([locations_file, occupancy_file, background_file, pois_file], {})
+    plot_files = [output_dir + '/cam{}_ant_locations.png'.format(CAM_NO), output_dir + '/cam{}_ant_locations_hist.png'.format(CAM_NO)]
+    if is_up_to_date(manifest_file, 'plot', plot_key) and not overwrite:
+        return 'Camera {}: plots are up to date, skipping'.format(CAM_NO)
+    invalidate_stage(manifest_file, 'plot')
+    background = cv2.cvtColor(cv2.imread(background_file), cv2.COLOR_BGR2RGB)
+    pois = json.load(open(pois_file))
+    # TIME SERIES
+    locations, _ = load_locations(locations_file)
+    N_ARENAS = len([column for column in locations.columns if column.endswith('_x')])
+    positions = locations[['arena_{}_{}'.format(i+1, axis) for i in range(N_ARENAS) for axis in 'xy']].to_numpy(dtype=float).reshape(-1, N_ARENAS, 2)
+    plot_trajectories(plot_files[0], background, positions, locations['frame'].to_numpy(), pois)
+    # HISTOGRAM
+    plot_occupancy(plot_files[1], background, load_occupancy(occupancy_file)['occupancy'], pois)
+    record_stage(manifest_file, 'plot', plot_key, plot_files)
+    return 'Camera {}: plots saved'.format(CAM_NO)
+
+### MAIN SCRIPT
+# find the data
+data_files = os.listdir(data_dir)
+experiment_files = [file for file in data_files if experiment in file]
+assert len(experiment_files) == 1, 'More than one or no experiment files found'
+experiment_file = experiment_files[0]
+assert experiment_file.endswith('.json'), 'Experiment file is not a json file'
+experiment_file = json.load(open(data_dir + experiment_file))
+# loop through the experiment dir options to find the one with processed data
+processed_dirs = [processed_data_dir + dir.split('/')[-2] for dir in experiment_file['dir'] if os.path.exists(processed_data_dir + dir.split('/')[-2])]
+assert len(processed_dirs) > 0, 'Processed Data directory does not exist'
+data_dir = processed_dirs[0]
+print('Processed Data directory: {}'.format(data_dir))
+# check if the output directory is specified
+if output_dir=='':
+    output_dir = data_dir
+# find all cameras with detection outputs
+CAM_NOs = sorted(set([int(x.split('_')[0][3:]) for x in os.listdir(output_dir) if x.startswith('cam') and '_ant_locations.' in x]))
+if cameras is not None:
+    CAM_NOs = [CAM_NO for CAM_NO in CAM_NOs if CAM_NO in cameras]
+print('Cameras to plot: {}'.format(CAM_NOs))
+
+# plot the cameras in parallel processes
+messages = Parallel(n_jobs=n_jobs, verbose=5)(delayed(plot_camera)(data_dir, output_dir, CAM_NO, overwrite) for CAM_NO in CAM_NOs)
+for message in messages:
+    print(message)
+print('DONE')
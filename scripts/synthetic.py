@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+import json
+import time
+import numpy as np
+import cv2
+from tqdm import tqdm
+from antsymaze.arenas import y_arena_polygons, linear_arena_polygons, rasterize_arenas, save_arena_masks
+from antsymaze.locations import save_locations, load_locations, find_locations_file
+from antsymaze.synthetic import simulate_trajectory, render_frame, illumination_gains, localization_error
+
+start_string = """
+WELCOME TO THE SYNTHETIC DATA SCRIPT
+---------------------------------------------
+This script will render synthetic ant videos with known trajectories in the layout of the recorded experiments,
+or compare the detected ant locations of a synthetic experiment with its ground truth
+"""
+print(start_string)
+
+# Get the arguments
+parser = argparse.ArgumentParser(description='Synthetic Ant Videos')
+parser.add_argument('-m', '--mode', type=str, default='generate', help='Mode (generate/evaluate) (default: generate)')
+parser.add_argument('-b', '--background', type=str, default='', help='Path to a background image (required to generate)')
+parser.add_argument('-e', '--endpoints', type=str, default='', help='Path to an endpoints json file written by a mask designer (required to generate)')
+parser.add_argument('-d', '--data_dir', type=str, default='./data/', help='Path to the data directory for the experiment file (default: ./data/)')
+parser.add_argument('-r', '--raw_data_dir', type=str, default='./raw_data/', help='Path to the directory for the raw videos (default: ./raw_data/)')
+parser.add_argument('-p', '--processed_data_dir', type=str, default='./processed_data/', help='Path to the processed data directory for the masks and ground truth (default: ./processed_data/)')
+parser.add_argument('-exp', '--experiment', type=str, default='synthetic', help='Experiment name (default: synthetic)')
+parser.add_argument('-nc', '--n_cameras', type=int, default=1, help='Number of cameras (default: 1)')
+parser.add_argument('-nf', '--n_frames', type=int, default=3000, help='Number of frames per camera (default: 3000)')
+parser.add_argument('-sl', '--segment_length', type=int, default=1000, help='Number of frames per video segment (default: 1000)')
+parser.add_argument('-fps', '--fps', type=float, default=30, help='Frame rate (default: 30)')
+parser.add_argument('-sp', '--speed', type=float, default=2.0, help='Mean ant speed in pixels per frame (default: 2.0)')
+parser.add_argument('-as', '--ant_size', type=int, nargs=2, default=[20, 10], help='Ant length and width in pixels (default: 20 10)')
+parser.add_argument('-ai', '--ant_intensity', type=int, default=30, help='Gray level of the ants (default: 30)')
+parser.add_argument('-no', '--noise', type=float, default=3.0, help='Standard deviation of the sensor noise in gray levels (default: 3.0)')
+parser.add_argument('-dr', '--drift', type=float, default=0.05, help='Relative amplitude of the illumination drift (default: 0.05)')
+parser.add_argument('-sd', '--seed', type=int, default=0, help='Random seed (default: 0)')
+
+# Parse the arguments
+args = parser.parse_args()
+mode = args.mode
+assert mode in ['generate', 'evaluate'], 'Mode {} is not valid'.format(mode)
+data_dir = args.data_dir
+raw_data_dir = args.raw_data_dir
+processed_data_dir = args.processed_data_dir
+experiment = args.experiment
+n_cameras = args.n_cameras
+n_frames = args.n_frames
+segment_length = args.segment_length
+assert n_frames>0 and segment_length>0, 'Number of frames and segment length must be greater than 0'
+fps = args.fps
+
+experiment_dir = os.path.abspath(raw_data_dir + experiment) + '/'
+output_dir = processed_data_dir + experiment + '/'
+
+if mode == 'evaluate':
+    # compare the detections of every camera with the ground truth
+    for CAM_NO in range(n_cameras):
+        truth, _ = load_locations(output_dir + 'cam{}_ground_truth.npz'.format(CAM_NO))
+        detected, _ = load_locations(find_locations_file(output_dir + 'cam{}_ant_locations'.format(CAM_NO)))
+        N_ARENAS = len([column for column in truth.columns if column.endswith('_x')])
+        columns = ['arena_{}_{}'.format(i+1, axis) for i in range(N_ARENAS) for axis in 'xy']
+        results = localization_error(truth['frame'].to_numpy(), truth[columns].to_numpy(dtype=float).reshape(-1, N_ARENAS, 2),
+                                     detected['frame'].to_numpy(), detected[columns].to_numpy(dtype=float).reshape(-1, N_ARENAS, 2))
+        with open(output_dir + 'cam{}_evaluation.json'.format(CAM_NO), 'w') as f:
+            json.dump(results, f, indent=4)
+        print('Camera {}: {} frames, detection rate {:.3f}, error mean {:.2f}px / median {:.2f}px'.format(
+            CAM_NO, results['n_frames'], results['detection_rate'], results['mean_error'], results['median_error']))
+    print('DONE')
+    sys.exit()
+
+# load the background and the arenas
+assert os.path.exists(args.background), 'Background image {} not found'.format(args.background)
+assert os.path.exists(args.endpoints), 'Endpoints file {} not found'.format(args.endpoints)
+background = cv2.imread(args.background, cv2.IMREAD_GRAYSCALE)
+endpoints = json.load(open(args.endpoints))
+width = endpoints['width']
+arenas = [endpoints['arena_{}_original'.format(i+1)] for i in range(len([key for key in endpoints.keys() if key.startswith('arena_')]))]
+N_ARENAS = len(arenas)
+print('Number of arenas: {}'.format(N_ARENAS))
+# get the masks of the arenas like the mask designers do
+polygons = [y_arena_polygons(arena, width) if len(arena) == 3 else linear_arena_polygons(arena, width) for arena in arenas]
+labels = rasterize_arenas(polygons, background.shape)
+
+# write the experiment file
+if not os.path.exists(data_dir):
+    os.makedirs(data_dir)
+with open(data_dir + experiment + '.json', 'w') as f:
+    json.dump({'dir': [experiment_dir]}, f)
+print('Experiment file: {}'.format(data_dir + experiment + '.json'))
+
+rng = np.random.default_rng(args.seed)
+for CAM_NO in range(n_cameras):
+    print('Rendering camera {}'.format(CAM_NO))
+    start_time = time.time()
+    cam_dir = experiment_dir + 'cam_{}/1_48/'.format(CAM_NO)
+    os.makedirs(cam_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    # simulate the ants; the merge drops the last segment (the one being recorded), so a short extra segment is rendered
+    # after the requested frames and the ground truth covers exactly the merged video
+    n_total = n_frames + min(segment_length, 10)
+    trajectories = [simulate_trajectory(arena, n_total, args.speed, width, rng=rng) for arena in arenas]
+    positions = np.stack([trajectory[0] for trajectory in trajectories], axis=1)
+    headings = np.stack([trajectory[1] for trajectory in trajectories], axis=1)
+    gains = illumination_gains(n_total, args.drift, rng=rng)
+    # render the segments
+    writer, segment = None, 0
+    for frame_no in tqdm(range(n_total)):
+        if (frame_no % segment_length == 0 and frame_no < n_frames) or frame_no == n_frames:
+            if writer is not None:
+                writer.release()
+            writer = cv2.VideoWriter(cam_dir + 'cam{}_{}.mp4'.format(CAM_NO, segment), cv2.VideoWriter_fourcc(*'mp4v'), fps, background.shape[::-1])
+            segment += 1
+        writer.write(render_frame(background, positions[frame_no], headings[frame_no], gains[frame_no], args.ant_size, args.ant_intensity, args.noise, rng))
+    writer.release()
+    # save the ground truth and the arena files the mask designers would write for this camera
+    save_locations(output_dir + 'cam{}_ground_truth'.format(CAM_NO), 'npz', np.arange(n_frames), np.arange(n_frames)/fps, positions[:n_frames],
+                   metadata=dict(vars(args), camera=CAM_NO))
+    save_arena_masks(output_dir + 'cam{}_background_masks.npz'.format(CAM_NO), labels, polygons)
+    with open(output_dir + 'cam{}_background_endpoints.json'.format(CAM_NO), 'w') as f:
+        json.dump(endpoints, f)
+    with open(output_dir + 'cam{}_background_pois.json'.format(CAM_NO), 'w') as f:
+        json.dump({'arena_{}_original'.format(i+1): [np.mean(arena, axis=0).tolist()] for i, arena in enumerate(arenas)}, f)
+    print('Camera {} rendered in {:.1f}s ({:.1f} FPS)'.format(CAM_NO, time.time()-start_time, n_total/(time.time()-start_time)))
+print('DONE')
@@ -0,0 +1,140 @@
+import json
+import numpy as np
+import pytest
+from matplotlib.path import Path
+from antsymaze.arenas import (OVERLAP, NO_ARENA, masks_to_labels, assign_arenas, select_largest, save_arena_masks, load_arena_masks,
+                              load_arena_polygons, load_json_masks, find_mask_file, rasterize_arenas, y_arena_polygons,
+                              linear_arena_polygons)
+
+def test_select_largest_keeps_the_largest_point_of_every_arena():
+    points = [[1, 1], [2, 2], [3, 3], [4, 4]]
+    sizes = [5, 9, 7, 1]
+    arena_ids = [1, 1, 2, 2]
+    pos = select_largest(points, sizes, arena_ids, 3)
+    assert pos.shape == (3, 2)
+    assert np.array_equal(pos[:2], [[2, 2], [3, 3]])
+    # an arena without points is nan
+    assert np.isnan(pos[2]).all()
+
+def test_select_largest_breaks_ties_with_the_earliest_point():
+    points = [[1, 1], [2, 2], [3, 3]]
+    pos = select_largest(points, [4, 4, 4], [1, 1, 1], 1)
+    assert np.array_equal(pos[0], [1, 1])
+
+def test_select_largest_ignores_points_outside_and_in_overlap_pixels():
+    points = [[1, 1], [2, 2], [3, 3]]
+    sizes = [100, 50, 1]
+    arena_ids = [OVERLAP, NO_ARENA, 1]
+    pos = select_largest(points, sizes, arena_ids, 2)
+    assert np.array_equal(pos[0], [3, 3])
+    assert np.isnan(pos[1]).all()
+
+def test_select_largest_batches_frames():
+    points = [[1, 1], [2, 2], [3, 3], [4, 4]]
+    sizes = [1, 2, 3, 3]
+    arena_ids = [1, 1, 2, 2]
+    frame_ids = [0, 0, 2, 2]
+    pos = select_largest(points, sizes, arena_ids, 2, frame_ids, n_frames=3)
+    assert pos.shape == (3, 2, 2)
+    assert np.array_equal(pos[0, 0], [2, 2])
+    assert np.array_equal(pos[2, 1], [3, 3])
+    assert np.isnan(pos[1]).all() and np.isnan(pos[0, 1]).all() and np.isnan(pos[2, 0]).all()
+
+def test_select_largest_without_points():
+    pos = select_largest(np.zeros((0, 2)), [], [], 2)
+    assert pos.shape == (2, 2) and np.isnan(pos).all()
+
+def test_select_largest_compares_sizes_within_an_arena_only():
+    # the same size in two arenas does not change the winner of either
+    points = [[1, 1], [2, 2], [3, 3]]
+    pos = select_largest(points, [4, 4, 2], [2, 1, 1], 2)
+    assert np.array_equal(pos, [[2, 2], [1, 1]])
+
+def test_masks_to_labels_marks_shared_pixels():
+    masks = np.zeros((2, 4, 4), dtype=np.uint8)
+    masks[0, :2] = 1
+    masks[1, 1:3] = 1
+    labels = masks_to_labels(masks)
+    assert labels.dtype == np.int16
+    assert (labels[0] == 1).all() and (labels[1] == OVERLAP).all() and (labels[2] == 2).all() and (labels[3] == NO_ARENA).all()
+
+def test_assign_arenas_looks_up_the_label_of_every_point():
+    labels = np.array([[0, 1, 1], [0, 2, -1]], dtype=np.int16)
+    points = [[1.5, 0.2], [1.9, 1.9], [2, 1], [0, 0], [-1, 0], [3, 0], [np.nan, 1]]
+    assert assign_arenas(points, labels).tolist() == [1, 2, OVERLAP, NO_ARENA, NO_ARENA, NO_ARENA, NO_ARENA]
+
+def test_assign_arenas_keeps_the_leading_shape():
+    labels = np.ones((4, 4), dtype=np.int16)
+    assert assign_arenas(np.zeros((3, 5, 2)), labels).shape == (3, 5)
+
+# two overlapping square arenas on a 6x8 image, as binary masks and as polygons
+def make_masks():
+    polygons = [[[(0, 0), (4, 0), (4, 3), (0, 3)]], [[(3, 2), (7, 2), (7, 5), (3, 5)]]]
+    masks = np.zeros((2, 6, 8), dtype=np.uint8)
+    masks[0, 0:4, 0:5] = 1
+    masks[1, 2:6, 3:8] = 1
+    return masks, polygons
+
+def test_arena_masks_npz_round_trip(tmp_path):
+    masks, polygons = make_masks()
+    labels = masks_to_labels(masks)
+    mask_file = str(tmp_path / 'cam0_background_masks.npz')
+    save_arena_masks(mask_file, labels, polygons)
+    loaded, n_arenas = load_arena_masks(mask_file)
+    assert n_arenas == 2
+    assert loaded.dtype == np.int16 and np.array_equal(loaded, labels)
+    assert [polygon.tolist() for polygon in load_arena_polygons(mask_file)] == [[[list(p) for p in arena[0]]] for arena in polygons]
+
+def test_legacy_json_masks_give_the_same_labels(tmp_path):
+    masks, _ = make_masks()
+    mask_file = str(tmp_path / 'cam0_background_masks.json')
+    with open(mask_file, 'w') as f:
+        json.dump({'arena_{}'.format(i+1): mask.tolist() for i, mask in enumerate(masks)}, f)
+    labels, n_arenas = load_json_masks(mask_file)
+    assert n_arenas == 2 and np.array_equal(labels, masks_to_labels(masks))
+    assert np.array_equal(load_arena_masks(mask_file)[0], labels)
+
+def test_find_mask_file_prefers_npz_and_falls_back_to_json(tmp_path):
+    prefix = str(tmp_path / 'cam0_background')
+    with pytest.raises(FileNotFoundError):
+        find_mask_file(prefix)
+    masks, polygons = make_masks()
+    with open(prefix + '_masks.json', 'w') as f:
+        json.dump({'arena_{}'.format(i+1): mask.tolist() for i, mask in enumerate(masks)}, f)
+    assert find_mask_file(prefix) == prefix + '_masks.json'
+    save_arena_masks(prefix + '_masks.npz', masks_to_labels(masks), polygons)
+    assert find_mask_file(prefix) == prefix + '_masks.npz'
+
+def test_rasterize_arenas_fills_the_polygons_with_their_labels():
+    labels = rasterize_arenas([[[(1, 1), (4, 1), (4, 3), (1, 3)]], [[(6, 0), (8, 0), (8, 2), (6, 2)]]], (6, 10))
+    assert labels.dtype == np.int16
+    expected = np.zeros((6, 10), dtype=np.int16)
+    expected[1:4, 1:5] = 1
+    expected[0:3, 6:9] = 2
+    assert np.array_equal(labels, expected)
+
+def test_rasterize_arenas_marks_shared_pixels_and_clips_to_the_image():
+    polygons = [[[(0, 0), (5, 0), (5, 5), (0, 5)]], [[(4, 4), (12, 4), (12, 12), (4, 12)]], [[(20, 20), (25, 20), (25, 25)]]]
+    labels = rasterize_arenas(polygons, (8, 8))
+    assert (labels[4:6, 4:6] == OVERLAP).all()
+    assert (labels[6:, 6:] == 2).all()
+    assert labels[0, 0] == 1 and labels[7, 0] == NO_ARENA
+    # an arena outside the image has no pixels
+    assert not (labels == 3).any()
+
+def test_rasterize_arenas_matches_the_polygon_contains_test():
+    shape = (200, 240)
+    polygons = [y_arena_polygons([(60, 20), (20, 180), (110, 180)], 24), linear_arena_polygons([(150, 30), (220, 170)], 20)]
+    labels = rasterize_arenas(polygons, shape)
+    y, x = np.mgrid[:shape[0], :shape[1]]
+    pixels = np.column_stack([x.ravel(), y.ravel()])
+    for i, arena_polygons in enumerate(polygons):
+        inside = np.zeros(shape[0]*shape[1], dtype=bool)
+        for polygon in arena_polygons:
+            inside |= Path(polygon).contains_points(pixels)
+        inside = inside.reshape(shape)
+        # the arms of the y arena overlap around the centroid and are filled as a union, not cancelled out
+        assert (labels[inside] == i+1).all()
+        # the scanline fill only adds the pixels on the polygon edges
+        extra = (labels == i+1) & ~inside
+        assert extra.sum() <= 0.1*inside.sum()
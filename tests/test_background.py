@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from antsymaze.background import count_dtype, frames_fit, streaming_median
+
+SHAPE = (37, 53)
+
+# frames with values spread over all the levels, in a narrow range and on the edges of the histogram bins
+def make_frames(n_frames, kind, seed=0):
+    rng = np.random.default_rng(seed)
+    if kind == 'uniform':
+        return rng.integers(0, 256, (n_frames,) + SHAPE, dtype=np.uint8)
+    if kind == 'narrow':
+        return rng.integers(100, 120, (n_frames,) + SHAPE, dtype=np.uint8)
+    return rng.choice(np.array([0, 15, 16, 31, 240, 255], dtype=np.uint8), (n_frames,) + SHAPE)
+
+def test_the_budgets_select_both_medians():
+    assert frames_fit(SHAPE, 1300, 1024)
+    assert not frames_fit(SHAPE, 1300, 0.15)
+
+def test_count_dtype_holds_the_number_of_frames():
+    assert count_dtype(255) == np.uint8 and count_dtype(256) == np.uint16 and count_dtype(10**6) == np.uint32
+
+# a budget that holds the frames, and one that only holds the histograms so the two pass median is used
+@pytest.mark.parametrize('memory_mb', [1024, 0.15])
+@pytest.mark.parametrize('kind', ['uniform', 'narrow', 'edges'])
+@pytest.mark.parametrize('n_frames', [1, 2, 7, 100, 300])
+def test_streaming_median_equals_np_median(n_frames, kind, memory_mb):
+    frames = make_frames(n_frames, kind)
+    background, count = streaming_median(lambda: iter(frames), SHAPE, n_frames + 1000, memory_mb, verbose=False)
+    assert count == n_frames
+    assert background.dtype == np.float64
+    assert np.array_equal(background, np.median(frames, axis=0))
+
+@pytest.mark.parametrize('memory_mb', [1024, 0.15])
+def test_streaming_median_without_frames(memory_mb):
+    assert streaming_median(lambda: iter([]), SHAPE, 1000, memory_mb, verbose=False) == (None, 0)
+
+def test_streaming_median_checks_the_number_of_frames():
+    frames = make_frames(5, 'uniform')
+    with pytest.raises(AssertionError):
+        streaming_median(lambda: iter(frames), SHAPE, 4, verbose=False)
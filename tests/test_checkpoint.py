@@ -0,0 +1,30 @@
+import os
+import numpy as np
+from antsymaze.checkpoint import checkpoint_dir, remove_stale_checkpoints, shard_file, save_shard, load_shard
+
+def test_shards_round_trip(tmp_path):
+    shard = shard_file(checkpoint_dir(str(tmp_path / 'cam0'), 'a'*40), 0, 100)
+    assert load_shard(shard) is None
+    positions = np.random.default_rng(0).uniform(0, 100, (10, 3, 2))
+    save_shard(shard, frames=np.arange(10, dtype=np.int32), positions=positions)
+    loaded = load_shard(shard)
+    assert sorted(loaded.keys()) == ['frames', 'positions']
+    assert np.array_equal(loaded['frames'], np.arange(10)) and np.array_equal(loaded['positions'], positions)
+    # the shard is written to a temporary file and renamed
+    assert os.listdir(os.path.dirname(shard)) == [os.path.basename(shard)]
+
+def test_a_broken_shard_is_recomputed(tmp_path):
+    shard = shard_file(str(tmp_path), 0, 100)
+    with open(shard, 'wb') as f:
+        f.write(b'not a shard')
+    assert load_shard(shard) is None
+
+def test_resume_keeps_the_shards_of_the_same_key_only(tmp_path):
+    prefix = str(tmp_path / 'cam0')
+    for key in ['a'*40, 'b'*40]:
+        save_shard(shard_file(checkpoint_dir(prefix, key), 0, 100), frames=np.arange(3))
+    # an interrupted run with the same key finds its finished chunks, the shards of other keys are removed
+    remove_stale_checkpoints(prefix, 'a'*40)
+    assert os.listdir(str(tmp_path)) == [os.path.basename(checkpoint_dir(prefix, 'a'*40))]
+    assert np.array_equal(load_shard(shard_file(checkpoint_dir(prefix, 'a'*40), 0, 100))['frames'], np.arange(3))
+    assert load_shard(shard_file(checkpoint_dir(prefix, 'a'*40), 100, 200)) is None
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+import cv2
+from antsymaze.arenas import linear_arena_polygons, rasterize_arenas
+from antsymaze.localization import (LOCALIZATION_MODES, prepare_background, make_frame_locator, allocate_buffers, foreground_mask,
+                                    get_ant_locations, make_localizer, blob_localizer, components_localizer,
+                                    get_ant_moments, arena_rois)
+from antsymaze.synthetic import render_frame
+
+SHAPE = (240, 320)
+ENDPOINTS = [[(60, 60), (60, 180)], [(160, 60), (160, 180)], [(260, 60), (260, 180)]]
+# the first two ants stick out of the ends of their arena boxes, the third out of its side
+POSITIONS = np.array([[60, 64], [160, 176], [266, 120]], dtype=np.float64)
+HEADINGS = np.array([np.pi/2, np.pi/2, 0])
+
+# a flat background, the label image of three linear arenas and a frame with one 20x10 ant per arena
+def make_scene():
+    background = np.full(SHAPE, 200, dtype=np.uint8)
+    labels = rasterize_arenas([linear_arena_polygons(arena, 20) for arena in ENDPOINTS], SHAPE)
+    frame = render_frame(background, POSITIONS, HEADINGS, ant_size=(20, 10), noise=0)
+    return prepare_background(background), labels, frame
+
+@pytest.mark.parametrize('mode', LOCALIZATION_MODES)
+def test_crop_gives_the_full_frame_positions(mode):
+    threshold, labels, frame = make_scene()
+    full = make_frame_locator(mode, threshold, labels, len(ENDPOINTS), crop=False)(frame)
+    crop = make_frame_locator(mode, threshold, labels, len(ENDPOINTS), crop=True)(frame)
+    assert not np.isnan(full).any()
+    assert np.allclose(crop, full, atol=1e-3)
+
+def test_foreground_mask_thresholds_the_gray_frame_against_the_background():
+    rng = np.random.default_rng(0)
+    background = rng.integers(60, 256, SHAPE, dtype=np.uint8)
+    frame = rng.integers(0, 256, SHAPE + (3,), dtype=np.uint8)
+    threshold = prepare_background(cv2.cvtColor(background, cv2.COLOR_GRAY2BGR), cut_off=-50)
+    mask = foreground_mask(frame, threshold, allocate_buffers(SHAPE))
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).astype(np.int16)
+    assert mask.dtype == np.uint8 and set(np.unique(mask)) <= {0, 255}
+    assert np.array_equal(mask == 255, gray - background > -50)
+
+def test_get_ant_locations_on_color_and_gray_frames():
+    threshold, labels, frame = make_scene()
+    buffers = allocate_buffers(SHAPE)
+    color = get_ant_locations(frame, threshold, labels, len(ENDPOINTS), buffers)
+    gray = get_ant_locations(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), threshold, labels, len(ENDPOINTS), buffers)
+    assert np.allclose(color, POSITIONS, atol=0.5)
+    assert np.array_equal(color, gray)
+    # the buffers are reused from frame to frame
+    assert np.array_equal(get_ant_locations(frame, threshold, labels, len(ENDPOINTS), buffers), color)
+
+def test_components_localizer_returns_the_dark_components_above_min_area():
+    image = np.full((40, 60), 255, dtype=np.uint8)
+    image[5:15, 10:30] = 0
+    image[30:33, 40:43] = 0
+    points, sizes = components_localizer(min_area=25)(image, allocate_buffers(image.shape))
+    assert np.allclose(points, [[19.5, 9.5]]) and sizes.tolist() == [200]
+    points, sizes = components_localizer(min_area=5)(image, allocate_buffers(image.shape))
+    assert sorted(sizes.tolist()) == [9, 200]
+
+def test_components_localizer_finds_small_ants():
+    threshold, labels, frame = make_scene()
+    pos = make_frame_locator('components', threshold, labels, len(ENDPOINTS), crop=False)(frame)
+    assert np.allclose(pos, POSITIONS, atol=0.5)
+
+def test_make_localizer_checks_the_method_and_the_blob_parameters():
+    with pytest.raises(AssertionError):
+        make_localizer('unknown')
+    with pytest.raises(AssertionError):
+        blob_localizer(notAParameter=1)
+
+def test_frame_locator_passes_the_localizer_parameters():
+    threshold, labels, frame = make_scene()
+    # blobs larger than the frame are never found
+    pos = make_frame_locator('blob', threshold, labels, len(ENDPOINTS), localizer_params={'minArea': 1e6, 'maxArea': 1e7})(frame)
+    assert np.isnan(pos).all()
+
+def test_moments_give_the_centroid_of_the_dark_pixels_of_every_arena():
+    labels = np.zeros((20, 30), dtype=np.int16)
+    labels[:, :10] = 1
+    labels[:, 10:20] = 2
+    labels[:, 20:] = -1
+    frame = np.full((20, 30), 200, dtype=np.uint8)
+    frame[2:8, 1:6] = 10
+    # too few pixels in arena 2, and the pixels shared by two arenas are not counted
+    frame[5:7, 12:14] = 10
+    frame[:, 20:] = 10
+    threshold = prepare_background(np.full((20, 30), 200, dtype=np.uint8))
+    pos = get_ant_moments(frame, threshold, labels, 2, min_area=25)
+    assert np.allclose(pos[0], [3, 4.5])
+    assert np.isnan(pos[1]).all()
+    assert np.allclose(get_ant_moments(frame, threshold, labels, 2, min_area=4)[1], [12.5, 5.5])
+
+def test_moments_mode_finds_one_ant_per_arena():
+    threshold, labels, frame = make_scene()
+    pos = make_frame_locator('moments', threshold, labels, len(ENDPOINTS), crop=False)(frame)
+    # the ants that stick out of their arena are pulled towards the arena
+    assert np.allclose(pos[:, 0], POSITIONS[:, 0], atol=3) and np.allclose(pos[:, 1], POSITIONS[:, 1], atol=3)
+
+def test_arena_rois_pads_clips_and_merges_the_arena_boxes():
+    labels = np.zeros((100, 100), dtype=np.int16)
+    labels[10:20, 10:20] = 1
+    labels[15:30, 60:70] = 2
+    labels[80:90, 0:5] = 3
+    # the first two boxes share rows and are merged into one strip, the third is clipped to the frame
+    assert arena_rois(labels, margin=0) == [(10, 30, 10, 70), (80, 90, 0, 5)]
+    assert arena_rois(labels, margin=5) == [(5, 35, 5, 75), (75, 95, 0, 10)]
+    # strips that overlap once padded are merged too
+    assert arena_rois(labels, margin=30) == [(0, 100, 0, 100)]
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from antsymaze.locations import save_locations, find_locations_file, load_locations
+
+# a short trajectory in two arenas with a missed detection and a filled sample
+def trajectory():
+    frames = np.arange(0, 50, 10)
+    timestamps = frames/25
+    positions = np.random.default_rng(0).uniform(0, 500, (5, 2, 2))
+    positions[1,0] = np.nan
+    valid = ~np.isnan(positions).any(axis=2)
+    valid[3,1] = False
+    interpolated = np.zeros_like(valid)
+    interpolated[3,1] = True
+    return frames, timestamps, positions, valid, interpolated
+
+def test_the_csv_keeps_the_original_columns(tmp_path):
+    frames, timestamps, positions, valid, interpolated = trajectory()
+    path = save_locations(str(tmp_path / 'cam0_ant_locations'), 'csv', frames, timestamps, positions, valid, interpolated)
+    data, metadata = load_locations(path)
+    assert list(data.columns) == ['frame', 'arena_1_x', 'arena_2_x', 'arena_1_y', 'arena_2_y']
+    assert metadata == {}
+    assert np.array_equal(data['frame'], frames)
+    # float64 text, the same values as the positions
+    assert np.allclose(data[['arena_1_x', 'arena_2_x']], positions[:,:,0], equal_nan=True)
+    assert np.allclose(data[['arena_1_y', 'arena_2_y']], positions[:,:,1], equal_nan=True)
+
+def test_the_csv_extra_columns_are_opt_in(tmp_path):
+    frames, timestamps, positions, valid, interpolated = trajectory()
+    path = save_locations(str(tmp_path / 'cam0_ant_locations'), 'csv', frames, timestamps, positions, valid, interpolated,
+                          csv_extra_columns=True)
+    data, _ = load_locations(path)
+    assert list(data.columns) == ['frame', 'time', 'arena_1_x', 'arena_2_x', 'arena_1_y', 'arena_2_y',
+                                  'arena_1_interpolated', 'arena_2_interpolated']
+    assert np.allclose(data['time'], timestamps)
+    assert np.array_equal(data[['arena_1_interpolated', 'arena_2_interpolated']], interpolated)
+
+@pytest.mark.parametrize('output_format', ['parquet', 'npz'])
+def test_columnar_formats_round_trip(tmp_path, output_format):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    frames, timestamps, positions, valid, interpolated = trajectory()
+    metadata = {'skip_frames': 10, 'localizer': 'blob'}
+    path = save_locations(str(tmp_path / 'cam0_ant_locations'), output_format, frames, timestamps, positions, valid, interpolated, metadata)
+    data, loaded_metadata = load_locations(path)
+    assert loaded_metadata == metadata
+    assert list(data.columns[:2]) == ['frame', 'time']
+    assert np.array_equal(data['frame'], frames) and np.allclose(data['time'], timestamps)
+    # positions are stored as float32
+    assert np.allclose(data[['arena_1_x', 'arena_2_x']], positions[:,:,0].astype(np.float32), equal_nan=True)
+    assert np.allclose(data[['arena_1_y', 'arena_2_y']], positions[:,:,1].astype(np.float32), equal_nan=True)
+    assert np.array_equal(data[['arena_1_valid', 'arena_2_valid']], valid)
+    assert np.array_equal(data[['arena_1_interpolated', 'arena_2_interpolated']], interpolated)
+
+def test_find_locations_file_prefers_the_columnar_formats(tmp_path):
+    prefix = str(tmp_path / 'cam0_ant_locations')
+    with pytest.raises(FileNotFoundError):
+        find_locations_file(prefix)
+    frames, timestamps, positions, valid, interpolated = trajectory()
+    save_locations(prefix, 'csv', frames, timestamps, positions)
+    assert find_locations_file(prefix) == prefix + '.csv'
+    save_locations(prefix, 'npz', frames, timestamps, positions)
+    assert find_locations_file(prefix) == prefix + '.npz'
+
+def test_invalid_formats_are_rejected(tmp_path):
+    frames, timestamps, positions, valid, interpolated = trajectory()
+    with pytest.raises(AssertionError):
+        save_locations(str(tmp_path / 'cam0_ant_locations'), 'xlsx', frames, timestamps, positions)
@@ -0,0 +1,52 @@
+import os
+import antsymaze.manifest as manifest
+from antsymaze.manifest import file_digest, stage_key, load_manifest, is_up_to_date, record_stage, invalidate_stage
+
+def write(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+def test_stage_key_changes_with_the_inputs_and_the_parameters(tmp_path):
+    video = write(tmp_path / 'video.mp4', b'frames')
+    key = stage_key([video], {'skip_frames': 1})
+    assert stage_key([video], {'skip_frames': 1}) == key
+    assert stage_key([video], {'skip_frames': 2}) != key
+    write(tmp_path / 'video.mp4', b'other frames')
+    assert stage_key([video], {'skip_frames': 1}) != key
+
+def test_large_files_are_hashed_from_samples(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, 'FULL_HASH_LIMIT', 1000)
+    monkeypatch.setattr(manifest, 'SAMPLE_SIZE', 100)
+    content = bytearray(5000)
+    path = write(tmp_path / 'video.mp4', bytes(content))
+    digest = file_digest(path)
+    # a change in a sampled block (the start) changes the digest, one between the samples does not
+    content[1000] = 1
+    assert file_digest(write(path, bytes(content))) == digest
+    content[0] = 1
+    assert file_digest(write(path, bytes(content))) != digest
+
+def test_a_recorded_stage_is_up_to_date_until_its_key_or_outputs_change(tmp_path):
+    manifest_file = str(tmp_path / 'cam0_manifest.json')
+    output = write(tmp_path / 'cam0_ant_locations.csv', b'frame')
+    assert not is_up_to_date(manifest_file, 'detection', 'key')
+    record_stage(manifest_file, 'detection', 'key', [output], {'skip_frames': 1})
+    assert load_manifest(manifest_file)['detection'] == {'key': 'key', 'outputs': ['cam0_ant_locations.csv'], 'params': {'skip_frames': 1}}
+    assert is_up_to_date(manifest_file, 'detection', 'key')
+    assert not is_up_to_date(manifest_file, 'detection', 'other key')
+    os.remove(output)
+    assert not is_up_to_date(manifest_file, 'detection', 'key')
+
+def test_invalidate_stage_keeps_the_other_stages(tmp_path):
+    manifest_file = str(tmp_path / 'cam0_manifest.json')
+    record_stage(manifest_file, 'background', 'a', [])
+    record_stage(manifest_file, 'detection', 'b', [])
+    invalidate_stage(manifest_file, 'detection')
+    assert list(load_manifest(manifest_file).keys()) == ['background']
+    assert is_up_to_date(manifest_file, 'background', 'a')
+
+def test_an_invalid_manifest_is_ignored(tmp_path):
+    manifest_file = write(tmp_path / 'cam0_manifest.json', b'{not json')
+    assert load_manifest(manifest_file) == {}
+    assert not is_up_to_date(manifest_file, 'detection', 'key')
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from antsymaze.occupancy import occupancy_bins, occupancy_histogram, speed_histogram, filled_histograms, save_occupancy, load_occupancy
+from antsymaze.trajectories import fill_gaps
+
+FRAME_SHAPE = (240, 320)
+N_BINS = 8
+SPEED_EDGES = np.linspace(0, 2000, 11)
+
+# a random walk in three arenas with missed detections, sampled every 3 frames at 30 fps
+def trajectory(n_samples=200, seed=0):
+    rng = np.random.default_rng(seed)
+    positions = np.cumsum(rng.normal(0, 5, (n_samples, 3, 2)), axis=0) + [160, 120]
+    positions = np.clip(positions, 0, [FRAME_SHAPE[1], FRAME_SHAPE[0]])
+    positions[rng.uniform(size=(n_samples, 3)) < 0.2] = np.nan
+    timestamps = np.arange(n_samples)*3/30
+    return positions, timestamps
+
+def test_occupancy_matches_histogram2d():
+    positions, _ = trajectory()
+    occupancy = occupancy_histogram(positions, FRAME_SHAPE, N_BINS)
+    rows, columns = occupancy_bins(FRAME_SHAPE, N_BINS)
+    assert occupancy.shape == (3, rows, columns)
+    for i in range(3):
+        found = ~np.isnan(positions[:,i]).any(axis=1)
+        expected = np.histogram2d(positions[found,i,1], positions[found,i,0], bins=[rows, columns], range=[[0, FRAME_SHAPE[0]], [0, FRAME_SHAPE[1]]])[0]
+        assert np.array_equal(occupancy[i], expected)
+
+# the histograms of the chunks plus the speeds across the chunk boundaries, as merged by detection
+def merge_chunks(positions, timestamps, starts):
+    bounds = list(starts) + [len(positions)]
+    occupancy = sum(occupancy_histogram(positions[a:b], FRAME_SHAPE, N_BINS) for a, b in zip(bounds[:-1], bounds[1:]))
+    speed = sum(speed_histogram(positions[a:b], timestamps[a:b], SPEED_EDGES) for a, b in zip(bounds[:-1], bounds[1:]))
+    for i in starts[1:]:
+        speed += speed_histogram(positions[i-1:i+1], timestamps[i-1:i+1], SPEED_EDGES)
+    return occupancy, speed
+
+@pytest.mark.parametrize('starts', [[0], [0, 50, 100, 150], [0, 1, 7, 120, 199]])
+def test_chunk_histograms_merge_into_the_full_histograms(starts):
+    positions, timestamps = trajectory()
+    occupancy, speed = merge_chunks(positions, timestamps, starts)
+    assert np.array_equal(occupancy, occupancy_histogram(positions, FRAME_SHAPE, N_BINS))
+    assert np.array_equal(speed, speed_histogram(positions, timestamps, SPEED_EDGES))
+
+@pytest.mark.parametrize('max_gap', [None, 2])
+def test_filled_histograms_complete_the_histograms_of_the_filled_trajectory(max_gap):
+    positions, timestamps = trajectory()
+    occupancy, speed = merge_chunks(positions, timestamps, [0, 50, 100, 150])
+    filled_positions, filled = fill_gaps(positions, max_gap=max_gap)
+    filled_occupancy, filled_speed = filled_histograms(filled_positions, timestamps, filled.any(axis=2), FRAME_SHAPE, N_BINS, SPEED_EDGES)
+    assert filled_occupancy.sum() > 0 and filled_speed.sum() > 0
+    assert np.array_equal(occupancy + filled_occupancy, occupancy_histogram(filled_positions, FRAME_SHAPE, N_BINS))
+    assert np.array_equal(speed + filled_speed, speed_histogram(filled_positions, timestamps, SPEED_EDGES))
+
+def test_occupancy_round_trip(tmp_path):
+    positions, timestamps = trajectory()
+    occupancy = occupancy_histogram(positions, FRAME_SHAPE, N_BINS)
+    speed = speed_histogram(positions, timestamps, SPEED_EDGES)
+    save_occupancy(str(tmp_path / 'cam0_occupancy.npz'), occupancy, FRAME_SHAPE, speed, SPEED_EDGES)
+    data = load_occupancy(str(tmp_path / 'cam0_occupancy.npz'))
+    assert np.array_equal(data['occupancy'], occupancy) and np.array_equal(data['speed'], speed)
+    assert data['x_edges'][-1] == FRAME_SHAPE[1] and data['y_edges'][-1] == FRAME_SHAPE[0]
@@ -0,0 +1,36 @@
+import threading
+import numpy as np
+import pytest
+from antsymaze.pipeline import run_pipeline, merge_pipeline_stats
+
+def make_frames(n_frames):
+    return ((i, i/10, np.full((4, 4), i)) for i in range(n_frames))
+
+@pytest.mark.parametrize('n_workers', [1, 3])
+def test_run_pipeline_returns_the_results_in_frame_order(n_workers):
+    outputs, frame_no, timestamps, stats = run_pipeline(make_frames(50), lambda: lambda frame: int(frame.sum()), n_workers, queue_depth=2)
+    assert frame_no == list(range(50))
+    assert timestamps == [i/10 for i in range(50)]
+    assert outputs == [16*i for i in range(50)]
+    assert stats['n_frames'] == 50 and stats['queue_depth_max'] <= 2
+
+def test_run_pipeline_makes_one_worker_per_thread():
+    workers = []
+    def make_worker():
+        workers.append(threading.get_ident())
+        return lambda frame: threading.get_ident()
+    outputs, _, _, _ = run_pipeline(make_frames(20), make_worker, n_workers=3)
+    assert len(set(workers)) == 3 and set(outputs) <= set(workers)
+
+def test_run_pipeline_raises_the_errors_of_the_workers():
+    def worker(frame):
+        if frame[0, 0] == 7:
+            raise ValueError('bad frame')
+        return 0
+    with pytest.raises(ValueError):
+        run_pipeline(make_frames(20), lambda: worker, n_workers=2)
+
+def test_merge_pipeline_stats_adds_the_counts():
+    stats = [run_pipeline(make_frames(n), lambda: lambda frame: 0)[3] for n in [5, 7]]
+    merged = merge_pipeline_stats(stats, wall_time=2.0)
+    assert merged['n_frames'] == 12 and merged['fps'] == 6.0
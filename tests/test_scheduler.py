@@ -0,0 +1,35 @@
+import sys
+from antsymaze.scheduler import make_task, run_task_graph
+
+# a task that appends its name to a file when it starts and again when it ends
+def log_task(path, name, cpu=1, deps=(), exit_code=0, check=None):
+    code = 'import sys, time; f = open({!r}, "a"); f.write("{}\\n"); f.flush(); time.sleep(0.2); f.write("{}\\n"); f.close(); sys.exit({})'.format(
+        str(path), name, name, exit_code)
+    return make_task([sys.executable, '-c', code], cpu=cpu, deps=deps, check=check)
+
+def run(tasks, cpu_budget):
+    return run_task_graph(tasks, cpu_budget, poll_interval=0.02, verbose=False)
+
+def test_tasks_run_after_their_dependencies(tmp_path):
+    path = tmp_path / 'log.txt'
+    status = run({'b': log_task(path, 'b', deps=['a']), 'a': log_task(path, 'a')}, cpu_budget=4)
+    assert status == {'a': 'done', 'b': 'done'}
+    assert path.read_text().split() == ['a', 'a', 'b', 'b']
+
+def test_tasks_never_use_more_than_the_cpu_budget(tmp_path):
+    path = tmp_path / 'log.txt'
+    # every task holds the whole budget (or more), so they run one after the other
+    status = run({'a': log_task(path, 'a', cpu=2), 'b': log_task(path, 'b', cpu=3)}, cpu_budget=2)
+    assert set(status.values()) == {'done'}
+    order = path.read_text().split()
+    assert order[0] == order[1] and order[2] == order[3]
+
+def test_a_failed_task_skips_its_dependents_only(tmp_path):
+    path = tmp_path / 'log.txt'
+    tasks = {
+        'a': log_task(path, 'a', exit_code=1),
+        'b': log_task(path, 'b', deps=['a']),
+        'c': log_task(path, 'c'),
+        'd': log_task(path, 'd', check=lambda: 'not ready'),
+    }
+    assert run(tasks, cpu_budget=4) == {'a': 'failed', 'b': 'skipped', 'c': 'done', 'd': 'skipped'}
@@ -0,0 +1,39 @@
+import os
+import numpy as np
+import pytest
+from joblib import Parallel, delayed
+from antsymaze.shared import make_shared_dir, remove_shared_dir, create_shared_array, open_shared_array
+
+@pytest.fixture
+def shared_dir():
+    shared_dir = make_shared_dir()
+    yield shared_dir
+    remove_shared_dir(shared_dir)
+
+def test_shared_arrays_are_created_from_data_or_a_fill_value(shared_dir):
+    data = np.arange(12, dtype=np.int16).reshape(3, 4)
+    _, spec = create_shared_array(shared_dir, 'data', data.shape, np.int16, data=data)
+    _, filled_spec = create_shared_array(shared_dir, 'filled', (5, 2), np.float64, fill_value=np.nan)
+    assert spec['shape'] == (3, 4) and np.array_equal(open_shared_array(spec), data)
+    assert np.isnan(open_shared_array(filled_spec)).all()
+
+def test_shared_arrays_are_read_only_unless_writable(shared_dir):
+    array, spec = create_shared_array(shared_dir, 'output', (4,), np.int32, fill_value=-1)
+    with pytest.raises(ValueError):
+        open_shared_array(spec)[0] = 1
+    open_shared_array(spec, writable=True)[1:3] = 7
+    assert array.tolist() == [-1, 7, 7, -1]
+
+# write the row of a worker into the shared output
+def write_row(spec, row):
+    open_shared_array(spec, writable=True)[row] = row
+
+def test_worker_processes_write_into_the_shared_output(shared_dir):
+    array, spec = create_shared_array(shared_dir, 'output', (6,), np.int64, fill_value=-1)
+    Parallel(n_jobs=2)(delayed(write_row)(spec, row) for row in range(6))
+    assert array.tolist() == list(range(6))
+
+def test_remove_shared_dir(shared_dir):
+    create_shared_array(shared_dir, 'data', (2,), np.uint8, fill_value=0)
+    remove_shared_dir(shared_dir)
+    assert not os.path.exists(shared_dir)
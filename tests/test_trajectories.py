@@ -0,0 +1,67 @@
+import numpy as np
+from antsymaze.trajectories import fill_gaps
+
+# a single column trajectory of shape (n, 1, 1)
+def column(values):
+    return np.array(values, dtype=np.float64).reshape(-1, 1, 1)
+
+def test_fill_gaps_interpolates_interior_gaps():
+    filled, interpolated = fill_gaps(column([0, np.nan, np.nan, 3, 4, np.nan, 6]))
+    assert np.allclose(filled.ravel(), [0, 1, 2, 3, 4, 5, 6])
+    assert interpolated.ravel().tolist() == [False, True, True, False, False, True, False]
+
+def test_fill_gaps_extends_the_edges():
+    filled, interpolated = fill_gaps(column([np.nan, 1, 2, np.nan, 4, np.nan, np.nan]))
+    assert np.allclose(filled.ravel(), [1, 1, 2, 3, 4, 4, 4])
+    assert interpolated.ravel().tolist() == [True, False, False, True, False, True, True]
+
+def test_fill_gaps_leaves_gaps_longer_than_max_gap():
+    pos = column([np.nan, 1, np.nan, np.nan, 4, np.nan, 6, np.nan, np.nan])
+    filled, interpolated = fill_gaps(pos, max_gap=1)
+    assert np.allclose(filled.ravel(), [1, 1, np.nan, np.nan, 4, 5, 6, np.nan, np.nan], equal_nan=True)
+    assert interpolated.ravel().tolist() == [True, False, False, False, False, True, False, False, False]
+    filled, _ = fill_gaps(pos, max_gap=2)
+    assert np.allclose(filled.ravel(), [1, 1, 2, 3, 4, 5, 6, 6, 6])
+
+def test_fill_gaps_fills_every_column_independently():
+    pos = np.full((4, 2, 2), np.nan)
+    pos[0, 0] = [0, 10]
+    pos[3, 0] = [3, 40]
+    pos[1, 1] = [5, 5]
+    filled, interpolated = fill_gaps(pos)
+    assert np.allclose(filled[:, 0, 0], [0, 1, 2, 3])
+    assert np.allclose(filled[:, 0, 1], [10, 20, 30, 40])
+    assert np.allclose(filled[:, 1], 5)
+    assert interpolated[:, 1].sum() == 6
+
+def test_fill_gaps_keeps_all_nan_columns():
+    filled, interpolated = fill_gaps(np.full((5, 1, 2), np.nan))
+    assert np.isnan(filled).all()
+    assert not interpolated.any()
+
+def test_fill_gaps_returns_empty_input_unchanged():
+    filled, interpolated = fill_gaps(np.zeros((0, 3, 2)))
+    assert filled.shape == (0, 3, 2)
+    assert interpolated.shape == (0, 3, 2) and interpolated.dtype == bool
+
+# the per column loop of the original detection script, as the reference of the vectorized fill
+def reference_fillna(x):
+    x = x.copy()
+    if np.isnan(x).all():
+        return x
+    valid = np.flatnonzero(~np.isnan(x))
+    x[:valid[0]] = x[valid[0]]
+    x[valid[-1]:] = x[valid[-1]]
+    for prev_valid, next_valid in zip(valid[:-1], valid[1:]):
+        if next_valid - prev_valid > 1:
+            x[prev_valid:next_valid+1] = np.linspace(x[prev_valid], x[next_valid], next_valid-prev_valid+1)
+    return x
+
+def test_fill_gaps_matches_the_per_column_loop():
+    rng = np.random.default_rng(0)
+    pos = rng.uniform(0, 100, (500, 4, 2))
+    pos[rng.random(pos.shape[:2]) < 0.3] = np.nan
+    filled, _ = fill_gaps(pos)
+    for i in range(pos.shape[1]):
+        for j in range(2):
+            assert np.allclose(filled[:, i, j], reference_fillna(pos[:, i, j]))
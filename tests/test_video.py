@@ -0,0 +1,122 @@
+import json
+import subprocess
+import cv2
+import numpy as np
+import pytest
+import antsymaze.video as video_module
+from antsymaze.video import concatenate_videos, read_frames, read_frame_numbers, plan_chunks, file_keyframe_indices, keyframe_indices
+
+N_BITS = 6
+BLOCK = 10
+FPS = 10
+
+# a frame that shows its index as black and white blocks, one per bit, so it survives the lossy encoding
+def index_frame(index):
+    frame = np.zeros((48, N_BITS*BLOCK, 3), dtype=np.uint8)
+    for bit in range(N_BITS):
+        if index >> bit & 1:
+            frame[:, bit*BLOCK:(bit+1)*BLOCK] = 255
+    return frame
+
+# read the index back from the middle of the blocks
+def frame_index(frame):
+    return sum(int(frame[:, bit*BLOCK+2:(bit+1)*BLOCK-2].mean() > 127) << bit for bit in range(N_BITS))
+
+def write_video(path, indices):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), FPS, (N_BITS*BLOCK, 48))
+    for index in indices:
+        writer.write(index_frame(index))
+    writer.release()
+    return str(path)
+
+@pytest.mark.parametrize('start_frame, end_frame, step', [(0, None, 1), (0, 45, 4), (7, 30, 3), (40, 100, 2)])
+def test_read_frames_steps_through_the_range(tmp_path, start_frame, end_frame, step):
+    video = write_video(tmp_path / 'video.mp4', range(45))
+    read = []
+    for frame_no, timestamp, frame in read_frames(video, start_frame, end_frame, step):
+        assert frame_index(frame) == frame_no
+        assert timestamp == pytest.approx(frame_no/FPS, abs=1e-3)
+        read.append(frame_no)
+    assert read == list(range(start_frame, min(45, end_frame or 45), step))
+
+def test_read_frames_decodes_from_the_seek_frame(tmp_path):
+    video = write_video(tmp_path / 'video.mp4', range(45))
+    read = [(frame_no, frame_index(frame)) for frame_no, _, frame in read_frames(video, 20, 30, 5, seek_frame=12)]
+    assert read == [(20, 20), (25, 25)]
+
+# the frames of the skip grid in [0, n_frames) are read once each, in order
+def check_chunks(chunks, n_frames, skip_frames):
+    frames = []
+    for seek_frame, start_frame, end_frame in chunks:
+        assert seek_frame <= start_frame < end_frame
+        assert start_frame % skip_frames == 0
+        frames.extend(range(start_frame, end_frame, skip_frames))
+    assert frames == list(range(0, n_frames, skip_frames))
+
+@pytest.mark.parametrize('skip_frames', [1, 3, 7])
+@pytest.mark.parametrize('chunk_size', [1, 10, 45, 100])
+def test_plan_chunks_covers_the_skip_grid(chunk_size, skip_frames):
+    check_chunks(plan_chunks(45, chunk_size, skip_frames), 45, skip_frames)
+
+@pytest.mark.parametrize('skip_frames', [1, 4])
+def test_plan_chunks_starts_on_keyframes(skip_frames):
+    keyframes = [0, 12, 15, 24, 36, 50]
+    chunks = plan_chunks(45, 10, skip_frames, keyframes)
+    assert [seek_frame for seek_frame, _, _ in chunks] == [0, 12, 24, 36]
+    check_chunks(chunks, 45, skip_frames)
+
+@pytest.mark.parametrize('skip_frames', [1, 3])
+def test_read_frames_of_chunks_align_with_the_frame_indices(tmp_path, skip_frames):
+    video = write_video(tmp_path / 'video.mp4', range(45))
+    read = []
+    for seek_frame, start_frame, end_frame in plan_chunks(45, 10, skip_frames):
+        for frame_no, timestamp, frame in read_frames(video, start_frame, end_frame, skip_frames, seek_frame):
+            assert frame_index(frame) == frame_no
+            read.append(frame_no)
+    assert read == list(range(0, 45, skip_frames))
+
+# three segment files of 15 frames each, played one after the other
+def write_segments(tmp_path):
+    return concatenate_videos([write_video(tmp_path / 'cam0_{}.mp4'.format(i), range(15*i, 15*(i+1))) for i in range(3)])
+
+@pytest.mark.parametrize('skip_frames', [1, 4])
+def test_read_frames_of_segments_align_with_the_global_indices(tmp_path, skip_frames):
+    video = write_segments(tmp_path)
+    assert video['offsets'] == [0, 15, 30, 45]
+    read = []
+    for seek_frame, start_frame, end_frame in plan_chunks(45, 10, skip_frames, keyframes=[0, 15, 30]):
+        for frame_no, timestamp, frame in read_frames(video, start_frame, end_frame, skip_frames, seek_frame):
+            assert frame_index(frame) == frame_no
+            assert timestamp == pytest.approx(frame_no/FPS, abs=1e-3)
+            read.append(frame_no)
+    assert read == list(range(0, 45, skip_frames))
+
+def test_read_frame_numbers_of_segments(tmp_path):
+    video = write_segments(tmp_path)
+    numbers = [3, 14, 15, 16, 40, 44]
+    assert [(frame_no, frame_index(frame)) for frame_no, frame in read_frame_numbers(video, numbers, keyframes=[0, 15, 30])] == list(zip(numbers, numbers))
+
+def test_keyframe_indices_of_segments_fall_back_to_the_segment_starts(tmp_path, monkeypatch):
+    video = write_segments(tmp_path)
+    monkeypatch.setattr(video_module, 'file_keyframe_indices', lambda video_file: None)
+    assert keyframe_indices(video).tolist() == [0, 15, 30]
+
+# answer the ffprobe call of file_keyframe_indices with the keyframe timestamps of a 25 fps video
+def fake_ffprobe(stream, times):
+    def run(command, **kwargs):
+        assert command[0] == 'ffprobe' and '-skip_frame' in command and 'nokey' in command
+        return subprocess.CompletedProcess(command, 0, stdout=json.dumps({'frames': [{'best_effort_timestamp_time': t} for t in times], 'streams': [stream]}))
+    return run
+
+def test_file_keyframe_indices_converts_the_keyframe_timestamps(monkeypatch):
+    stream = {'r_frame_rate': '25/1', 'start_time': '0.500000'}
+    monkeypatch.setattr(video_module.subprocess, 'run', fake_ffprobe(stream, ['0.500000', '2.500000', '4.540000', 'N/A']))
+    assert file_keyframe_indices('video.mp4').tolist() == [0, 50, 101]
+    monkeypatch.setattr(video_module.subprocess, 'run', fake_ffprobe(stream, []))
+    assert file_keyframe_indices('video.mp4') is None
+
+def test_file_keyframe_indices_without_ffprobe(monkeypatch):
+    def run(command, **kwargs):
+        raise FileNotFoundError(command[0])
+    monkeypatch.setattr(video_module.subprocess, 'run', run)
+    assert file_keyframe_indices('video.mp4') is None